@@ -1,6 +1,7 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 import jwt
+import json
 import os
 from dotenv import load_dotenv
 
@@ -13,7 +14,10 @@ from modules.knowledge_graph import KnowledgeGraph
 from modules.study_plan_generator import StudyPlanGenerator
 from modules.interaction_logger import InteractionLogger
 from modules.affective_analyzer import AffectiveAnalyzer
+from modules.affective_stream import AffectiveStream
 from modules.intervention_engine import InterventionEngine
+from modules.progress_manager import ProgressManager
+from modules.cohort_risk import CohortRiskScorer
 
 from models import db, User, Interaction, EmotionalFeedback
 
@@ -34,13 +38,17 @@ db.init_app(app)
 # Create tables within app context
 with app.app_context():
     db.create_all()
+    # create_all() skips indexes on tables that already exist
+    for index in Interaction.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
 
 # Auth Decorator REMOVED
 
 # Helper to get a default user for now
-def get_default_user():
+# Profile only unless the caller asks for (a window of) the interaction log
+def get_default_user(with_interactions=False, last_n=None):
     # 1. Try fetching by ID
-    user = lp_manager.get_learner("guest_user")
+    user = lp_manager.get_learner("guest_user", with_interactions=with_interactions, last_n=last_n)
     if user:
         return user
 
@@ -61,22 +69,35 @@ def get_default_user():
         print(f"Error creating guest user: {e}")
         return None
 
-from modules.ai_tutor import AITutor
+from modules.ai_tutor import AITutor, LESSON_FALLBACK, content_hash
 from modules.assistant import AIAssistant
+from modules.llm_client import LLMClient, LLMError
+from modules.content_cache import ContentCache
 
 # Initialize Modules
 # We pass 'db' to LearnerProfile to use models
 lp_manager = LearnerProfile(db)
-interaction_logger = InteractionLogger(lp_manager)
 affective_analyzer = AffectiveAnalyzer()
+# Live affective state per learner, rehydrated from the last few interactions
+affective_stream = AffectiveStream(affective_analyzer, lp_manager.get_interactions,
+                                   version=lp_manager.get_interaction_count)
+interaction_logger = InteractionLogger(lp_manager, affective_stream=affective_stream)
+if os.getenv("INTERACTION_WRITE_BEHIND") == "1":
+    interaction_logger.enable_write_behind(app)
 intervention_engine = InterventionEngine()
-ai_tutor = AITutor(api_key=os.getenv("GEMINI_API_KEY"))
-assistant = AIAssistant(api_key=os.getenv("GEMINI_API_KEY"))
+progress_manager = ProgressManager(lp_manager)
+cohort_risk_scorer = CohortRiskScorer(db, affective_analyzer)
+# One pooled, concurrency-limited LLM client shared by every Gemini caller
+llm_client = LLMClient(api_key=os.getenv("GEMINI_API_KEY"))
+# Generated lessons, in memory and on disk under data/cache
+content_cache = ContentCache(path=os.getenv("CONTENT_CACHE_PATH"))
+ai_tutor = AITutor(api_key=os.getenv("GEMINI_API_KEY"), llm_client=llm_client, cache=content_cache)
+assistant = AIAssistant(api_key=os.getenv("GEMINI_API_KEY"), llm_client=llm_client)
 
 # Create default guest user on startup
 with app.app_context():
     try:
-        if not lp_manager.get_learner("guest_user"):
+        if not lp_manager.get_learner("guest_user", with_interactions=False):
              lp_manager.create_learner({"name": "Guest", "email": "guest@example.com", "password": "guest"})
     except Exception as e:
         print(f"Guest user setup warning: {e}")
@@ -89,34 +110,205 @@ def get_tutor_content():
     if not topic:
         return jsonify({'message': 'Topic is required'}), 400
     
-    content = ai_tutor.generate_content(topic, current_user.get('skill_level', 'intermediate'))
-    return jsonify({'content': content})
+    difficulty = current_user.get('skill_level', 'intermediate')
+    if wants_async(data):
+        return job_accepted(job_queue.submit('tutor_content', {'topic': topic, 'difficulty': difficulty},
+                                             key=ai_tutor.lesson_key(topic, difficulty)))
+    
+    content = ai_tutor.generate_content(topic, difficulty)
+    # Quiz and evaluate requests refer to the lesson by content_id
+    return jsonify({'content': content, 'content_id': ai_tutor.store_lesson(content)})
+
+def lesson_from_request(data):
+    """
+    Returns (lesson text, error response). Clients send content_id; the full
+    content is still accepted from older clients.
+    """
+    content_id = data.get('content_id')
+    if content_id:
+        content = ai_tutor.get_lesson(content_id)
+        if content is None:
+            return None, (jsonify({'message': 'Unknown content_id, request the lesson again'}), 404)
+        return content, None
+    content = data.get('content')
+    if not content:
+        return None, (jsonify({'message': 'Content is required'}), 400)
+    return content, None
+
+def sse_event(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.route('/api/tutor/content/stream', methods=['GET', 'POST'])
+def stream_tutor_content():
+    # GET ?topic= for EventSource clients, POST {"topic": ...} for fetch()
+    current_user = get_default_user()
+    data = request.get_json(silent=True) or {}
+    topic = data.get('topic') or request.args.get('topic')
+    if not topic:
+        return jsonify({'message': 'Topic is required'}), 400
+
+    chunks = ai_tutor.stream_content(topic, current_user.get('skill_level', 'intermediate'))
+
+    def events():
+        sent = []
+        try:
+            for chunk in chunks:
+                sent.append(chunk)
+                yield sse_event({'delta': chunk})
+        except LLMError as e:
+            print(f"Tutor stream error: {e}")
+            # The client shows the fallback text; `partial` says a lesson was cut short
+            yield sse_event({'message': LESSON_FALLBACK, 'partial': bool(sent)}, event='error')
+            return
+        yield sse_event({'content_id': ai_tutor.store_lesson("".join(sent))}, event='done')
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no' # Don't let a reverse proxy buffer the stream
+    })
+
+@app.route('/api/tutor/content/cache', methods=['DELETE'])
+def invalidate_tutor_content():
+    # No topic drops every cached lesson
+    data = request.get_json(silent=True) or {}
+    removed = ai_tutor.invalidate_content(data.get('topic'), data.get('difficulty'))
+    return jsonify({'message': 'Lesson cache invalidated', 'removed': removed})
 
 @app.route('/api/tutor/quiz', methods=['POST'])
 def get_tutor_quiz():
-    data = request.json
-    content = data.get('content')
-    if not content:
-        return jsonify({'message': 'Content is required'}), 400
+    data = request.json or {}
+    content, error = lesson_from_request(data)
+    if error:
+        return error
+    
+    if wants_async(data):
+        return job_accepted(job_queue.submit('tutor_quiz', {'content': content}, key=ai_tutor.quiz_key(content)))
     
     quiz = ai_tutor.generate_quiz(content)
-    return jsonify({'quiz': quiz})
+    return jsonify({'quiz': quiz, 'content_id': ai_tutor.store_lesson(content)})
 
 @app.route('/api/tutor/evaluate', methods=['POST'])
 def evaluate_tutor_quiz():
-    data = request.json
-    content = data.get('content')
+    data = request.json or {}
+    content, error = lesson_from_request(data)
+    if error:
+        return error
     user_answers = data.get('user_answers')
-    quiz_questions = data.get('quiz_questions')
+    # The quiz is known server-side for a lesson, so clients may leave it out
+    quiz_questions = data.get('quiz_questions') or ai_tutor.get_cached_quiz(content)
     
-    if not all([content, user_answers, quiz_questions]):
+    if not all([user_answers, quiz_questions]):
         return jsonify({'message': 'Missing data for evaluation'}), 400
     
+    if wants_async(data):
+        payload = {'content': content, 'user_answers': user_answers, 'quiz_questions': quiz_questions}
+        return job_accepted(job_queue.submit('tutor_evaluate', payload, key=content_hash(json.dumps(payload))))
+    
     feedback = ai_tutor.evaluate_quiz(content, user_answers, quiz_questions)
     return jsonify({'feedback': feedback})
 
-from modules.emotional_agent import EmotionalAgent
-emotional_agent = EmotionalAgent(api_key=os.getenv("GEMINI_API_KEY"))
+@app.route('/api/tutor/evaluations/<evaluation_id>', methods=['GET'])
+def get_tutor_evaluation(evaluation_id):
+    # Poll while explanations_pending is true
+    feedback = ai_tutor.get_evaluation(evaluation_id)
+    if feedback is None:
+        return jsonify({'message': 'Evaluation not found'}), 404
+    return jsonify({'feedback': feedback})
+
+from modules.emotional_agent import EmotionalAgent, POOL_PATH, PROMPTS_VERSION
+from modules.response_pool import ResponsePool
+from modules.content_pregeneration import concept_names
+emotional_pool = ResponsePool(path=os.getenv("EMOTIONAL_POOL_PATH", POOL_PATH), version=PROMPTS_VERSION)
+# Only catalogued concepts get pools; free-form topics can't each trigger a refill
+emotional_agent = EmotionalAgent(api_key=os.getenv("GEMINI_API_KEY"), llm_client=llm_client, pool=emotional_pool,
+                                 pooled_topics=concept_names())
+
+# --- Async Jobs ---
+# LLM-backed endpoints take ?async=1 (or "async": true) and answer 202 with a
+# job to poll, so a slow upstream doesn't hold web workers. A job's result is
+# the body the endpoint would have returned.
+from modules.job_queue import JobQueue, RetryableJobError
+
+job_queue = JobQueue(path=os.getenv("JOB_QUEUE_PATH"), workers=int(os.getenv("JOB_WORKERS", "4")))
+
+def run_lesson_job(payload):
+    content = ai_tutor.generate_content(payload['topic'], payload['difficulty'])
+    result = {'content': content, 'content_id': ai_tutor.store_lesson(content)}
+    if content == LESSON_FALLBACK:
+        raise RetryableJobError('Lesson generation failed', fallback=result)
+    return result
+
+def run_quiz_job(payload):
+    quiz = ai_tutor.generate_quiz(payload['content'])
+    result = {'quiz': quiz, 'content_id': ai_tutor.store_lesson(payload['content'])}
+    if not quiz:
+        raise RetryableJobError('Quiz generation failed', fallback=result)
+    return result
+
+def run_evaluate_job(payload):
+    return {'feedback': ai_tutor.evaluate_quiz(payload['content'], payload['user_answers'], payload['quiz_questions'])}
+
+def run_feedback_job(payload):
+    # Off the request path there's time to generate a response the pool doesn't have yet
+    return {'agent_response': emotional_agent.get_response(payload['emotion'], payload['topic'], wait=True)}
+
+job_queue.register('tutor_content', run_lesson_job)
+job_queue.register('tutor_quiz', run_quiz_job)
+job_queue.register('tutor_evaluate', run_evaluate_job)
+job_queue.register('feedback', run_feedback_job)
+
+@app.before_request
+def start_job_workers():
+    # Workers run only in processes that serve requests, not e.g. in manage.py
+    job_queue.start()
+
+def wants_async(data):
+    return request.args.get('async') == '1' or data.get('async') is True
+
+def job_accepted(job, **extra):
+    response = jsonify({
+        **extra,
+        'job_id': job['id'],
+        'status': job['status'],
+        'status_url': f"/api/jobs/{job['id']}",
+        'events_url': f"/api/jobs/{job['id']}/events"
+    })
+    response.status_code = 202
+    response.headers['Location'] = f"/api/jobs/{job['id']}"
+    return response
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    # Poll until status is 'done' (result set) or 'failed' (error set)
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'message': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'message': 'Job not found'}), 404
+
+    def events():
+        current = job
+        yield sse_event({'status': current['status']}, event='status')
+        while True:
+            if current['status'] in (JobQueue.DONE, JobQueue.FAILED):
+                yield sse_event(current, event='done')
+                return
+            yield ": keepalive\n\n" # Keeps proxies from closing an idle stream
+            current = job_queue.wait(job_id, timeout=15)
+            if current is None:
+                yield sse_event({'message': 'Job expired'}, event='error')
+                return
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 @app.route('/api/feedback', methods=['POST'])
 def save_feedback():
@@ -141,6 +333,10 @@ def save_feedback():
         db.session.add(feedback)
         db.session.commit()
         
+        if wants_async(data):
+            job = job_queue.submit('feedback', {'emotion': emotion, 'topic': topic}, key=f"{emotion}|{topic}")
+            return job_accepted(job, id=feedback.id)
+        
         # Get Emotional Agent Response
         agent_response = emotional_agent.get_response(emotion, topic)
         
@@ -176,20 +372,53 @@ def log_interaction():
     # Check for completion (e.g., passing a quiz)
     if action == 'quiz_completed' and is_correct:
         print(f"DEBUG: Marking concept {concept_id} as completed for user {current_user['id']}")
-        # Update learner profile
-        completed = set(current_user.get('completed_concepts', []))
-        if concept_id not in completed:
-            completed.add(concept_id)
-            lp_manager.update_learner(current_user['id'], {'completed_concepts': list(completed)})
+        lp_manager.mark_completed(current_user['id'], [concept_id])
             
-    return jsonify({'message': 'Interaction logged successfully'})
+    return jsonify({
+        'message': 'Interaction logged successfully',
+        'affective_state': affective_stream.analyze_state(current_user['id'])
+    })
+
+MAX_INTERACTION_BATCH = 500
+
+@app.route('/api/interactions/batch', methods=['POST'])
+def log_interactions_batch():
+    current_user = get_default_user()
+    data = request.json or {}
+    interactions = data.get('interactions')
+
+    if not isinstance(interactions, list) or not interactions:
+        return jsonify({'message': 'A non-empty list of interactions is required'}), 400
+    if len(interactions) > MAX_INTERACTION_BATCH:
+        return jsonify({'message': f'At most {MAX_INTERACTION_BATCH} interactions per batch'}), 413
+    for i, item in enumerate(interactions):
+        if not isinstance(item, dict) or not item.get('concept_id') or not item.get('action'):
+            return jsonify({'message': f'Interaction {i}: Concept ID and action are required'}), 400
+
+    try:
+        rows, duplicates = interaction_logger.log_interactions(current_user['id'], interactions)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+
+    # Completion check once for the whole batch (e.g., passing a quiz)
+    lp_manager.mark_completed(
+        current_user['id'],
+        [row['concept_id'] for row in rows if row['action'] == 'quiz_completed' and row['is_correct']]
+    )
+
+    return jsonify({
+        'message': 'Interactions logged successfully',
+        'accepted': len(rows),
+        'duplicates': duplicates
+    })
 
 # --- Learner Routes ---
 @app.route('/api/learners/<learner_id>', methods=['GET'])
 def get_learner(learner_id):
     current_user = get_default_user()
-    # Dynamic Analysis
-    risk_score = affective_analyzer.get_risk_score(current_user['interaction_log'])
+    # Dynamic Analysis, answered from memory
+    risk_score = affective_stream.get_risk_score(current_user['id'])
     recommendation = intervention_engine.get_recommendation(risk_score, current_user['current_domain'])
     
     response = current_user.copy()
@@ -198,6 +427,23 @@ def get_learner(learner_id):
     
     return jsonify(response)
 
+@app.route('/api/learners/<learner_id>/affective-state', methods=['GET'])
+def get_affective_state(learner_id):
+    return jsonify({
+        'affective_state': affective_stream.analyze_state(learner_id),
+        'risk_score': affective_stream.get_risk_score(learner_id)
+    })
+
+MAX_RISK_PAGE_SIZE = 1000
+
+@app.route('/api/analytics/risk', methods=['GET'])
+def get_cohort_risk():
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 100, type=int)
+    if page < 1 or not 1 <= per_page <= MAX_RISK_PAGE_SIZE:
+        return jsonify({'message': f'page must be >= 1 and per_page between 1 and {MAX_RISK_PAGE_SIZE}'}), 400
+    return jsonify(cohort_risk_scorer.score_page(page, per_page))
+
 @app.route('/api/learners/<learner_id>/switch-domain', methods=['POST'])
 def switch_domain(learner_id):
     data = request.get_json()
@@ -252,8 +498,8 @@ def update_settings(learner_id):
     allowed_fields = ['name', 'email', 'learning_goal', 'skill_level', 'theme', 'notifications']
     updates = {k: v for k, v in data.items() if k in allowed_fields}
     
-    lp_manager.update_learner(learner_id, updates)
-    return jsonify({'message': 'Settings updated successfully', 'user': lp_manager.get_learner(learner_id)})
+    user = lp_manager.update_learner(learner_id, updates)
+    return jsonify({'message': 'Settings updated successfully', 'user': user})
 
 @app.route('/api/learners/<learner_id>/progress', methods=['GET'])
 def get_progress(learner_id):
@@ -277,5 +523,16 @@ def chat_assistant():
     response = assistant.chat(message, context)
     return jsonify(response)
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    return jsonify({
+        'llm': llm_client.metrics(),
+        'content_cache': content_cache.metrics(),
+        'tutor_single_flight': ai_tutor.flights.metrics(),
+        'assistant_router': assistant.router.metrics(),
+        'emotional_pool': emotional_pool.metrics(),
+        'jobs': job_queue.metrics()
+    })
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
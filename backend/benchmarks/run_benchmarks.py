@@ -0,0 +1,318 @@
+"""
+In-process benchmark suite for the study plan and learner analytics paths.
+
+Builds synthetic knowledge graphs (both graph file formats) and synthetic
+learners in a throwaway SQLite database, times the hot code paths (plus
+single-row vs batched interaction ingest, and intervention policy lookups
+over contextual state spaces), and
+writes the results as JSON so runs from different commits can be compared.
+
+Usage (from backend/):
+    python -m benchmarks.run_benchmarks --profile quick --output bench.json
+    python -m benchmarks.run_benchmarks --compare bench.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import random
+import time
+from datetime import datetime
+
+import numpy as np
+from flask import Flask
+
+from models import db
+from modules.knowledge_graph import GraphRegistry, KnowledgeGraph
+from modules.learner_profile import LearnerProfile
+from modules.study_plan_generator import StudyPlanGenerator
+from modules.affective_analyzer import AffectiveAnalyzer
+from modules.affective_stream import AffectiveStream
+from modules.progress_manager import ProgressManager
+from modules.interaction_logger import InteractionLogger
+from modules.learner_profile import SKILL_LEVELS
+from modules.rl_agent import RLAgent
+from modules.state_encoding import STATES, StateEncoder
+
+from benchmarks import synthetic
+
+PROFILES = {
+    "quick": {"graph_sizes": [10, 1000], "history_sizes": [0, 1000], "ingest_events": 200,
+              "policy_states": [1000000]},
+    "default": {"graph_sizes": [10, 1000, 10000], "history_sizes": [0, 1000, 100000], "ingest_events": 1000,
+                "policy_states": [1000000]},
+    "full": {"graph_sizes": [10, 100, 1000, 10000, 100000], "history_sizes": [0, 1000, 10000, 100000, 1000000],
+             "ingest_events": 5000, "policy_states": [1000000, 10000000]},
+}
+
+
+def make_app(db_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def measure(fn, repeat, budget_s):
+    """
+    Runs fn up to `repeat` times (at least once), stopping early once
+    `budget_s` seconds have been spent. Returns wall times in milliseconds.
+    """
+    timings = []
+    spent = 0.0
+    while len(timings) < repeat and (not timings or spent < budget_s):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed * 1000)
+        spent += elapsed
+    return timings
+
+
+class Suite:
+    def __init__(self, repeat, budget_s, verbose=True):
+        self.repeat = repeat
+        self.budget_s = budget_s
+        self.verbose = verbose
+        self.results = []
+
+    def run(self, name, params, fn, ops=None):
+        """
+        Times fn. If `ops` is given, fn performs that many operations per call
+        and the result also reports a throughput.
+        """
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            timings = measure(fn, self.repeat, self.budget_s)
+        result = {
+            "name": name,
+            "params": params,
+            "runs": len(timings),
+            "min_ms": round(min(timings), 4),
+            "median_ms": round(statistics.median(timings), 4),
+            "mean_ms": round(statistics.fmean(timings), 4),
+            "max_ms": round(max(timings), 4)
+        }
+        if ops:
+            result["ops_per_s"] = round(ops / (result["median_ms"] / 1000), 1)
+        self.results.append(result)
+        if self.verbose:
+            print(f"{case_key(result):<70} median {result['median_ms']:>12.3f} ms  ({result['runs']} runs)", file=sys.stderr)
+        return result
+
+
+def case_key(result):
+    params = ",".join(f"{k}={v}" for k, v in sorted(result["params"].items()))
+    return f"{result['name']}[{params}]"
+
+
+def run_graph_benchmarks(suite, app, lp_manager, data_dir, graph_sizes, plan_history):
+    registry = GraphRegistry(data_dir)
+    for n in graph_sizes:
+        for fmt in synthetic.GRAPH_FORMATS:
+            domain = synthetic.graph_domain(n, fmt)
+            synthetic.write_graph(data_dir, domain, synthetic.generate_graph(n, fmt))
+            params = {"concepts": n, "format": fmt}
+
+            def load_cold():
+                registry.invalidate()
+                KnowledgeGraph(domain, registry)
+            suite.run("graph_load_cold", params, load_cold)
+            suite.run("graph_load_warm", params, lambda: KnowledgeGraph(domain, registry))
+
+            kg = KnowledgeGraph(domain, registry)
+            suite.run("graph_to_json", params, kg.to_json)
+            suite.run("graph_to_json_serialized", params, lambda: json.dumps(kg.to_json()))
+
+            user_id = f"plan_{n}_{fmt}"
+            concept_ids = [synthetic.concept_id(i) for i in range(n)]
+            with app.app_context():
+                synthetic.seed_learner(db.session, user_id, plan_history, concept_ids,
+                                       completed=concept_ids[:n // 10], current_domain=domain)
+
+                def plan():
+                    learner = lp_manager.get_learner(user_id, with_interactions=False)
+                    StudyPlanGenerator(learner, kg, lp_manager).generate_plan(user_id, domain)
+                suite.run("generate_plan", dict(params, history=plan_history), plan)
+
+
+def run_learner_benchmarks(suite, app, lp_manager, history_sizes):
+    analyzer = AffectiveAnalyzer()
+    stream = AffectiveStream(analyzer, lp_manager.get_interactions)
+    progress_manager = ProgressManager(lp_manager)
+    concept_ids = [synthetic.concept_id(i) for i in range(100)]
+    for n in history_sizes:
+        user_id = f"history_{n}"
+        params = {"interactions": n}
+        with app.app_context():
+            synthetic.seed_learner(db.session, user_id, n, concept_ids, completed=concept_ids[:10])
+
+            def risk():
+                learner = lp_manager.get_learner(user_id, last_n=AffectiveAnalyzer.RISK_WINDOW)
+                analyzer.get_risk_score(learner['interaction_log'])
+            suite.run("risk_score", params, risk)
+            suite.run("risk_score_stream", params, lambda: stream.get_risk_score(user_id))
+            suite.run("progress_stats", params, lambda: progress_manager.get_progress_stats(user_id))
+
+
+def run_ingest_benchmarks(suite, app, lp_manager, events, batch_sizes=(10, 100, 500)):
+    """
+    Compares logging `events` interactions one request at a time against the
+    batch path and the write-behind queue. Each call writes fresh rows; the database is on disk, so
+    every commit pays for a real sync.
+    """
+    logger = InteractionLogger(lp_manager)
+    concept_ids = [synthetic.concept_id(i) for i in range(100)]
+    user_id = "ingest"
+    with app.app_context():
+        synthetic.seed_learner(db.session, user_id, 0, concept_ids)
+        sample = [
+            {k: row[k] for k in ('concept_id', 'action', 'is_correct', 'response_time_ms')}
+            for row in synthetic.generate_interactions(user_id, events, concept_ids)
+        ]
+
+        def single():
+            for item in sample:
+                logger.log_interaction(user_id, item)
+        suite.run("ingest_single", {"events": events}, single, ops=events)
+
+        for batch_size in batch_sizes:
+            def batched():
+                for start in range(0, events, batch_size):
+                    logger.log_interactions(user_id, sample[start:start + batch_size])
+            suite.run("ingest_batch", {"events": events, "batch_size": batch_size}, batched, ops=events)
+
+    # Request-path cost with write-behind enabled: enqueue only, the
+    # background writer commits in groups
+    async_logger = InteractionLogger(LearnerProfile(db))
+    writer = async_logger.enable_write_behind(app)
+
+    def enqueue_only():
+        for item in sample:
+            async_logger.log_interaction(user_id, item)
+    suite.run("ingest_write_behind", {"events": events}, enqueue_only, ops=events)
+    writer.close()
+
+
+def run_policy_benchmarks(suite, workdir, state_counts, lookups=10000):
+    """
+    Greedy action selection for random learner contexts, with the default
+    mixed-radix state space and hashed spaces of `state_counts` rows, plus
+    the cost of loading a saved policy of that size.
+    """
+    rng = random.Random(0)
+    contexts = [
+        {"affective_state": rng.choice(STATES), "concept_level": rng.choice(SKILL_LEVELS),
+         "errors": rng.randint(0, 5), "hour": rng.randint(0, 23), "skill_level": rng.choice(SKILL_LEVELS),
+         "concept_id": synthetic.concept_id(rng.randint(0, 9999))}
+        for _ in range(lookups)
+    ]
+    encoders = [("mixed_radix", StateEncoder())]
+    encoders += [("hashed", StateEncoder(hash_buckets=n, extra_features=("concept_id",))) for n in state_counts]
+    for encoding, encoder in encoders:
+        params = {"encoding": encoding, "states": encoder.n_states}
+        path = os.path.join(workdir, f'policy_{encoding}_{encoder.n_states}.npy')
+        agent = RLAgent(model_path=path, encoder=encoder)
+        agent.q_table[:] = np.random.default_rng(0).random(agent.q_table.shape)
+        agent.save_model()
+        agent.epsilon = 0 # Time the exploit path
+
+        def choose():
+            for context in contexts:
+                agent.choose_action(context)
+        suite.run("policy_choose_action", params, choose, ops=lookups)
+
+        digits = np.array([encoder.digits(context) for context in contexts])
+        extra = np.array([encoder.extra_hash(context) for context in contexts], dtype=np.uint64)
+
+        def choose_batch():
+            agent.q_table[encoder.encode_batch(digits, extra)].argmax(axis=1)
+        suite.run("policy_choose_batch", params, choose_batch, ops=lookups)
+
+        suite.run("policy_load", params, lambda: RLAgent(model_path=path, encoder=encoder))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current):
+    """
+    Prints the median ratio (current / baseline) for every case present in both runs.
+    """
+    previous = {case_key(r): r for r in baseline["results"]}
+    print(f"{'case':<70} {'baseline':>12} {'current':>12} {'ratio':>8}")
+    for result in current["results"]:
+        key = case_key(result)
+        if key not in previous:
+            continue
+        before = previous[key]["median_ms"]
+        after = result["median_ms"]
+        ratio = after / before if before else float('inf')
+        print(f"{key:<70} {before:>12.3f} {after:>12.3f} {ratio:>8.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='quick')
+    parser.add_argument('--graph-sizes', type=int, nargs='*', help="Override the profile's concept counts")
+    parser.add_argument('--history-sizes', type=int, nargs='*', help="Override the profile's interaction counts")
+    parser.add_argument('--plan-history', type=int, default=1000, help="Interactions held by the plan benchmark learner")
+    parser.add_argument('--ingest-events', type=int, help="Override the profile's ingest event count (0 skips ingest)")
+    parser.add_argument('--policy-states', type=int, nargs='*', help="Override the profile's hashed policy sizes")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--budget', type=float, default=5.0, help="Max seconds spent timing one case")
+    parser.add_argument('--output', help="Write JSON results here (default: stdout)")
+    parser.add_argument('--compare', help="Previous JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    profile = PROFILES[args.profile]
+    graph_sizes = args.graph_sizes if args.graph_sizes is not None else profile["graph_sizes"]
+    history_sizes = args.history_sizes if args.history_sizes is not None else profile["history_sizes"]
+    ingest_events = args.ingest_events if args.ingest_events is not None else profile["ingest_events"]
+    policy_states = args.policy_states if args.policy_states is not None else profile["policy_states"]
+
+    suite = Suite(args.repeat, args.budget)
+    with tempfile.TemporaryDirectory(prefix='bench_') as workdir:
+        app = make_app(os.path.join(workdir, 'bench.db'))
+        lp_manager = LearnerProfile(db)
+        run_graph_benchmarks(suite, app, lp_manager, workdir, graph_sizes, args.plan_history)
+        run_learner_benchmarks(suite, app, lp_manager, history_sizes)
+        if ingest_events:
+            run_ingest_benchmarks(suite, app, lp_manager, ingest_events)
+        run_policy_benchmarks(suite, workdir, policy_states)
+
+    report = {
+        "suite": "backend",
+        "commit": git_commit(),
+        "created_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "profile": args.profile,
+        "results": suite.results
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Synthetic curricula and learners for the benchmark suite.
+
+Everything here is deterministic for a given seed so results from
+different commits are comparable.
+"""
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from models import db, User, Interaction
+from modules.interaction_rollups import InteractionRollups
+
+LEVELS = ('beginner', 'intermediate', 'advanced')
+GRAPH_FORMATS = ('nodes_edges', 'concepts_prerequisites')
+
+
+def concept_id(i):
+    return f'syn_c{i}'
+
+
+def generate_graph(n_concepts, fmt='nodes_edges', max_prereqs=3, window=50, seed=0):
+    """
+    Builds a random DAG in one of the two supported graph file formats.
+
+    Prerequisites of concept i are drawn from the `window` concepts before it,
+    which keeps the graph acyclic and its depth proportional to its size.
+    """
+    if fmt not in GRAPH_FORMATS:
+        raise ValueError(f"Unknown graph format: {fmt}")
+
+    rng = random.Random(seed)
+    concepts = []
+    edges = []
+    for i in range(n_concepts):
+        lo = max(0, i - window)
+        k = min(rng.randint(0, max_prereqs), i - lo)
+        prereqs = [concept_id(j) for j in rng.sample(range(lo, i), k)]
+        concept = {
+            "id": concept_id(i),
+            "name": f"Synthetic Concept {i}",
+            "level": LEVELS[min(i * len(LEVELS) // max(n_concepts, 1), len(LEVELS) - 1)],
+            "time_estimate": rng.randint(20, 90)
+        }
+        if fmt == 'concepts_prerequisites':
+            concept["prerequisites"] = prereqs
+        else:
+            edges.extend({"source": p, "target": concept["id"]} for p in prereqs)
+        concepts.append(concept)
+
+    if fmt == 'concepts_prerequisites':
+        return {"domain": "Synthetic", "concepts": concepts}
+    return {"nodes": concepts, "edges": edges}
+
+
+def graph_domain(n_concepts, fmt):
+    return f'synthetic {n_concepts} {fmt}'
+
+
+def write_graph(data_dir, domain, data):
+    """
+    Writes a graph where KnowledgeGraph(domain) will find it.
+    """
+    path = os.path.join(data_dir, f'{domain.lower().replace(" ", "_")}_graph.json')
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    return path
+
+
+def generate_interactions(user_id, n_interactions, concept_ids, days=365, error_rate=0.3, seed=0):
+    """
+    Yields interaction rows in timestamp order, spread over the last `days` days.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    span = timedelta(days=days).total_seconds()
+    step = span / max(n_interactions, 1)
+    start = now - timedelta(seconds=span)
+    for i in range(n_interactions):
+        yield {
+            "user_id": user_id,
+            "concept_id": rng.choice(concept_ids),
+            "action": "submit_answer",
+            "is_correct": rng.random() >= error_rate,
+            "response_time_ms": rng.randint(2000, 90000),
+            "timestamp": start + timedelta(seconds=i * step),
+            "details": "{}"
+        }
+
+
+def seed_learner(session, user_id, n_interactions, concept_ids, completed=(), current_domain='Programming Basics',
+                 chunk_size=50000, seed=0):
+    """
+    Inserts a learner and their interaction history using bulk inserts,
+    then builds the learner's rollups from it.
+    """
+    session.add(User(
+        id=user_id,
+        name=f"Benchmark {user_id}",
+        email=f"{user_id}@bench.local",
+        password_hash="bench",
+        skill_level="intermediate",
+        current_domain=current_domain,
+        completed_concepts=json.dumps(list(completed))
+    ))
+    session.commit()
+
+    chunk = []
+    for row in generate_interactions(user_id, n_interactions, concept_ids, seed=seed):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            session.execute(insert(Interaction), chunk)
+            chunk = []
+    if chunk:
+        session.execute(insert(Interaction), chunk)
+    session.commit()
+    InteractionRollups(db).backfill(user_id=user_id)
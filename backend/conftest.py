@@ -0,0 +1,165 @@
+"""
+Shared fixtures for the in-process tests (test_api.py, test_plan.py,
+test_quiz.py and test_tutor.py are scripts against a running server).
+"""
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from flask import Flask
+
+from models import db
+from modules.interaction_logger import InteractionLogger
+from modules.learner_profile import LearnerProfile
+
+
+class StubGemini(BaseHTTPRequestHandler):
+    """
+    Answers generateContent like Gemini. The prompt decides the reply:
+    'status:NNN' fails with that status, 'slow' sleeps past the read timeout.
+    """
+    protocol_version = 'HTTP/1.1' # keep-alive
+    connections = set()
+    delay = 0
+    requests = 0
+
+    def do_POST(self):
+        StubGemini.connections.add(self.client_address)
+        StubGemini.requests += 1
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        prompt = body['contents'][0]['parts'][0]['text']
+
+        if 'status:' in prompt:
+            return self._send(int(prompt.split('status:')[1][:3]), {"error": "stub"})
+        if ':streamGenerateContent' in self.path:
+            return self._stream(["```markdown\n# Les", "son\nBo", "dy\n``", "`"])
+        if 'slow' in prompt:
+            time.sleep(1)
+        time.sleep(StubGemini.delay)
+        if 'Neon Guide' in prompt:
+            text = '{"message": "Opening settings", "action": "navigate", "target": "/settings"}'
+        elif 'already been graded' in prompt:
+            text = json.dumps({"explanations": {"1": "A is right."}, "next_steps": "Practice more."})
+        elif 'multiple-choice quiz' in prompt:
+            text = json.dumps([{"id": 1, "question": "Q?", "options": ["A", "B"], "correct_answer": "A"}])
+        else:
+            text = "```markdown\n# Lesson\nBody\n```"
+        self._send(200, {
+            "candidates": [{"content": {"parts": [{"text": text}]}}],
+            "usageMetadata": {"promptTokenCount": 7, "candidatesTokenCount": 3, "totalTokenCount": 10}
+        })
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, texts):
+        # Server-sent events over chunked encoding, like streamGenerateContent?alt=sse
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i, text in enumerate(texts):
+            event = {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+            if i == len(texts) - 1:
+                event["usageMetadata"] = {"promptTokenCount": 7, "candidatesTokenCount": 4}
+            data = f"data: {json.dumps(event)}\r\n\r\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+            time.sleep(StubGemini.delay)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        pass # Clients hanging up after a timeout are expected
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # AITutor writes debug_tutor.log to the working directory
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture(scope='session')
+def gemini_url():
+    """
+    Base URL of a stub Gemini API for LLMClient(base_url=...).
+    """
+    server = StubServer(('127.0.0.1', 0), StubGemini)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/v1beta"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def stub_gemini(gemini_url):
+    StubGemini.delay = 0
+    StubGemini.connections.clear()
+    yield StubGemini
+    StubGemini.delay = 0
+
+
+@pytest.fixture
+def app(tmp_path):
+    """
+    A Flask app on a fresh SQLite database with every table created; the
+    test runs inside its app context.
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'test.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def lp_manager(app):
+    return LearnerProfile(db)
+
+
+def add_learner(lp_manager, user_id, **fields):
+    """
+    Creates a learner through LearnerProfile; returns its id.
+    """
+    lp_manager.create_learner(dict({
+        "id": user_id, "name": user_id, "email": f"{user_id}@test.local", "password": "pw", "dob": "2000-01-01"
+    }, **fields))
+    return user_id
+
+
+def seed_learners(lp_manager, n_learners=40, seed=0):
+    """
+    Learners with 0-25 interactions each, with error rates and latencies
+    spread so every affective state occurs; returns the logger used.
+    """
+    rng = random.Random(seed)
+    logger = InteractionLogger(lp_manager)
+    for n in range(n_learners):
+        learner_id = add_learner(lp_manager, f"u{n:03d}")
+        error_rate, latency = rng.random(), rng.choice([5000, 35000, 90000])
+        logger.log_interactions(learner_id, [
+            {"concept_id": "c", "action": "submit_answer",
+             "is_correct": None if rng.random() < 0.05 else rng.random() >= error_rate,
+             "response_time_ms": rng.randint(0, latency),
+             # Same-second timestamps make the id the tie-breaker
+             "timestamp": (datetime(2024, 1, 1) + timedelta(seconds=i // 2)).isoformat()}
+            for i in range(rng.randint(0, 25))
+        ])
+    return logger
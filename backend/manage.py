@@ -0,0 +1,143 @@
+"""
+Maintenance commands for the backend.
+
+Usage (from backend/):
+    python manage.py backfill-rollups [--user USER_ID]
+    python manage.py migrate-completions
+    python manage.py purge-receipts [--days N]
+    python manage.py cohort-risk [--format csv|json] [--min-risk N] [--output FILE]
+    python manage.py pregenerate [--domain DOMAIN ...] [--workers N] [--limit N] [--dry-run]
+    python manage.py train-policy [--workers N] [--epochs N] [--horizon N]
+"""
+import argparse
+import csv
+import json
+import sys
+
+
+def backfill_rollups(args):
+    from app import app, interaction_logger
+
+    with app.app_context():
+        interaction_logger.rollups.backfill(user_id=args.user)
+    print(f"Rebuilt interaction rollups for {args.user or 'all learners'}")
+
+
+def migrate_completions(args):
+    from app import app, lp_manager
+
+    with app.app_context():
+        migrated = lp_manager.migrate_legacy_completions()
+    print(f"Moved completed concepts of {migrated} learners to concept_completions")
+
+
+def purge_receipts(args):
+    from app import app, interaction_logger
+    from modules.interaction_logger import RECEIPT_RETENTION_DAYS
+
+    days = RECEIPT_RETENTION_DAYS if args.days is None else args.days
+    with app.app_context():
+        purged = interaction_logger.purge_receipts(retention_days=days)
+    print(f"Deleted {purged} idempotency receipts older than {days} days")
+
+
+def cohort_risk(args):
+    from app import app, cohort_risk_scorer
+
+    fields = ['learner_id', 'name', 'affective_state', 'risk_score', 'recent_interactions']
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        with app.app_context():
+            learners = [row for row in cohort_risk_scorer.iter_all(per_page=args.page_size)
+                        if row['risk_score'] >= args.min_risk]
+        learners.sort(key=lambda row: row['risk_score'], reverse=True)
+        if args.format == 'json':
+            json.dump(learners, out, indent=2)
+            out.write('\n')
+        else:
+            writer = csv.DictWriter(out, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(learners)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Scored {len(learners)} learners", file=sys.stderr)
+
+
+def pregenerate(args):
+    from app import ai_tutor
+    from modules.content_pregeneration import ContentPregenerator
+
+    pregenerator = ContentPregenerator(ai_tutor)
+    if args.dry_run:
+        items = pregenerator.catalog(args.domain)
+        missing = [item for item in items if not pregenerator.is_done(*item)]
+        for topic, level in missing:
+            print(f"missing: {level} '{topic}'")
+        print(f"{len(items)} lessons in catalog, {len(missing)} missing")
+        return
+
+    counts = pregenerator.run(args.domain, workers=args.workers, limit=args.limit,
+                              ttl=args.ttl_days * 24 * 3600)
+    print(f"Done: {counts}")
+    if counts["failed"]:
+        print("Some lessons failed; run the command again to retry only those")
+
+
+def train_policy(args):
+    from app import app
+    from modules.rl_agent import RLAgent
+    from modules.replay_trainer import ReplayTrainer
+
+    # Trains a private table; workers sharing the policy reseed from the saved model
+    agent = RLAgent(shared=False)
+    trainer = ReplayTrainer(agent, app.config['SQLALCHEMY_DATABASE_URI'], horizon=args.horizon,
+                            learners_per_chunk=args.chunk_size)
+    counts = trainer.run(workers=args.workers, epochs=args.epochs)
+    print(f"Done: {counts}; saved the policy to {agent.model_path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backend maintenance commands")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    backfill = commands.add_parser('backfill-rollups', help="Rebuild learner rollup tables from the interactions table")
+    backfill.add_argument('--user', help="Only rebuild this learner's rollups")
+    backfill.set_defaults(func=backfill_rollups)
+
+    migrate = commands.add_parser('migrate-completions', help="Move legacy completed_concepts JSON into concept_completions")
+    migrate.set_defaults(func=migrate_completions)
+
+    purge = commands.add_parser('purge-receipts', help="Delete batch-ingest idempotency receipts past retention")
+    purge.add_argument('--days', type=float,
+                       help="Keep receipts this recent (default 7); older batches can no longer be retried safely")
+    purge.set_defaults(func=purge_receipts)
+
+    risk = commands.add_parser('cohort-risk', help="Affective state and risk score for every learner, highest risk first")
+    risk.add_argument('--format', choices=['csv', 'json'], default='csv')
+    risk.add_argument('--min-risk', type=int, default=0, help="Only report learners at or above this risk score")
+    risk.add_argument('--output', help="Write to this file instead of stdout")
+    risk.add_argument('--page-size', type=int, default=1000, help="Learners scored per query")
+    risk.set_defaults(func=cohort_risk)
+
+    pregen = commands.add_parser('pregenerate', help="Generate and cache the lesson and quiz for every concept and skill level")
+    pregen.add_argument('--domain', action='append', help="Graph to walk, e.g. programming (repeatable; default all)")
+    pregen.add_argument('--workers', type=int, default=4, help="Concepts generated in parallel")
+    pregen.add_argument('--limit', type=int, help="Generate at most this many lessons")
+    pregen.add_argument('--ttl-days', type=float, default=365, help="How long pre-generated content stays cached")
+    pregen.add_argument('--dry-run', action='store_true', help="Only list what is missing")
+    pregen.set_defaults(func=pregenerate)
+
+    train = commands.add_parser('train-policy', help="Train the intervention policy by replaying the interactions table")
+    train.add_argument('--workers', type=int, default=4, help="Processes extracting transitions (1 runs in-process)")
+    train.add_argument('--epochs', type=int, default=1, help="Passes over the history")
+    train.add_argument('--horizon', type=int, default=3, help="Answers after an intervention that determine its reward")
+    train.add_argument('--chunk-size', type=int, default=500, help="Learners per worker task")
+    train.set_defaults(func=train_policy)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -17,11 +17,18 @@ class User(db.Model):
     learning_goal = db.Column(db.String(200), nullable=True)
     preferred_style = db.Column(db.String(20), default='visual')
     current_domain = db.Column(db.String(50), default='Programming Basics')
-    completed_concepts = db.Column(db.Text, default='[]') # Stored as JSON string
+    completed_concepts = db.Column(db.Text, default='[]') # Legacy JSON list, new completions go to concept_completions
     theme = db.Column(db.String(20), default='dark')
     notifications = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    completions = db.relationship('ConceptCompletion', order_by='ConceptCompletion.completed_at', lazy='select')
+
+    def completed_concept_ids(self):
+        legacy = json.loads(self.completed_concepts) if self.completed_concepts else []
+        seen = set(legacy)
+        return legacy + [c.concept_id for c in self.completions if c.concept_id not in seen]
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -33,14 +40,26 @@ class User(db.Model):
             "learning_goal": self.learning_goal,
             "preferred_style": self.preferred_style,
             "current_domain": self.current_domain,
-            "completed_concepts": json.loads(self.completed_concepts) if self.completed_concepts else [],
+            "completed_concepts": self.completed_concept_ids(),
             "theme": self.theme,
             "notifications": self.notifications,
             "interaction_log": [] # Fetched separately usually, but kept for compatibility
         }
 
+class ConceptCompletion(db.Model):
+    """Append-only record of the concepts a learner has completed."""
+    __tablename__ = 'concept_completions'
+
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    concept_id = db.Column(db.String(50), primary_key=True)
+    completed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Interaction(db.Model):
     __tablename__ = 'interactions'
+    __table_args__ = (
+        db.Index('ix_interactions_user_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_interactions_user_concept', 'user_id', 'concept_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
@@ -61,6 +80,17 @@ class Interaction(db.Model):
             "details": json.loads(self.details) if self.details else {}
         }
 
+class InteractionReceipt(db.Model):
+    """Idempotency keys of interactions already ingested through the batch endpoint."""
+    __tablename__ = 'interaction_receipts'
+    __table_args__ = (
+        db.Index('ix_interaction_receipts_received_at', 'received_at'), # For purging old receipts
+    )
+
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    idempotency_key = db.Column(db.String(64), primary_key=True)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class EmotionalFeedback(db.Model):
     __tablename__ = 'emotional_feedback'
 
@@ -80,3 +110,53 @@ class EmotionalFeedback(db.Model):
             "note": self.note,
             "timestamp": self.timestamp.isoformat()
         }
+
+class LearnerStats(db.Model):
+    """Per-learner interaction totals, maintained by InteractionRollups."""
+    __tablename__ = 'learner_stats'
+
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    interaction_count = db.Column(db.Integer, nullable=False, default=0)
+    incorrect_count = db.Column(db.Integer, nullable=False, default=0)
+    total_response_time_ms = db.Column(db.BigInteger, nullable=False, default=0)
+    first_interaction_at = db.Column(db.DateTime, nullable=True)
+    last_interaction_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "interaction_count": self.interaction_count,
+            "incorrect_count": self.incorrect_count,
+            "total_response_time_ms": self.total_response_time_ms,
+            "first_interaction_at": self.first_interaction_at.isoformat() if self.first_interaction_at else None,
+            "last_interaction_at": self.last_interaction_at.isoformat() if self.last_interaction_at else None
+        }
+
+class ConceptStats(db.Model):
+    """Per-(learner, concept) attempt and error counters, maintained by InteractionRollups."""
+    __tablename__ = 'learner_concept_stats'
+
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    concept_id = db.Column(db.String(50), primary_key=True)
+    attempt_count = db.Column(db.Integer, nullable=False, default=0)
+    error_count = db.Column(db.Integer, nullable=False, default=0)
+    last_seen_at = db.Column(db.DateTime, nullable=True)
+
+class DailyActivity(db.Model):
+    """Interactions per learner per (UTC) day, maintained by InteractionRollups."""
+    __tablename__ = 'learner_daily_activity'
+
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    interaction_count = db.Column(db.Integer, nullable=False, default=0)
+    total_response_time_ms = db.Column(db.BigInteger, nullable=False, default=0)
+
+def dialect_insert(table):
+    """
+    Returns an INSERT for `table` that supports on_conflict_do_update() and
+    on_conflict_do_nothing() on the bound database (PostgreSQL or SQLite).
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
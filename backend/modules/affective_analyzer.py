@@ -1,6 +1,19 @@
 from datetime import datetime
 
+
+def is_error(is_correct):
+    """
+    Whether an interaction's is_correct marks a wrong answer: any falsy
+    value does, but a missing or NULL one (nothing was graded) doesn't.
+    """
+    return is_correct is not None and not is_correct
+
+
 class AffectiveAnalyzer:
+    # Number of most recent interactions each signal looks at
+    STATE_WINDOW = 5
+    RISK_WINDOW = 10
+
     def __init__(self):
         pass
 
@@ -17,15 +30,23 @@ class AffectiveAnalyzer:
         if not interaction_log:
             return "neutral"
 
-        recent_logs = interaction_log[-5:] # Analyze last 5 interactions
+        recent_logs = interaction_log[-self.STATE_WINDOW:] # Analyze last 5 interactions
         
         # 1. Calculate Error Rate Score (0-1)
-        incorrect_count = sum(1 for log in recent_logs if not log.get('is_correct', True))
-        error_rate = incorrect_count / len(recent_logs)
+        incorrect_count = sum(1 for log in recent_logs if is_error(log.get('is_correct')))
+        total_latency = sum(log.get('response_time_ms', 0) for log in recent_logs)
+        return self.classify_state(incorrect_count, total_latency, len(recent_logs))
+
+    def classify_state(self, incorrect_count, total_latency_ms, n):
+        """
+        Decision rule behind analyze_state, on counts over the last n (> 0)
+        interactions. Shared with the streaming engine so both agree exactly.
+        """
+        error_rate = incorrect_count / n
         
         # 2. Calculate Latency Score (Normalized)
         # Assume average expected time is 30s (30000ms). >60s is high latency.
-        avg_latency = sum(log.get('response_time_ms', 0) for log in recent_logs) / len(recent_logs)
+        avg_latency = total_latency_ms / n
         latency_score = min(avg_latency / 60000, 1.0) # Cap at 1.0 (60s)
 
         # 3. Detect Boredom/Fatigue (Fast clicking + High Errors OR Very Long Idle)
@@ -55,14 +76,17 @@ class AffectiveAnalyzer:
         if not interaction_log:
             return 0
         
-        recent_logs = interaction_log[-10:] # Look at last 10
+        recent_logs = interaction_log[-self.RISK_WINDOW:] # Look at last 10
         
         # Factors increasing risk
-        struggle_count = sum(1 for log in recent_logs if not log.get('is_correct', True))
+        struggle_count = sum(1 for log in recent_logs if is_error(log.get('is_correct')))
         fatigue_indicators = 0 # Placeholder for more complex logic
         
+        return self.risk_from_counts(struggle_count, len(recent_logs))
+
+    def risk_from_counts(self, struggle_count, n):
         # Simple heuristic: Risk is proportional to error rate
-        risk = (struggle_count / len(recent_logs)) * 100
+        risk = (struggle_count / n) * 100
         
         # Cap at 100
         return min(round(risk), 100)
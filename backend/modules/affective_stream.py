@@ -0,0 +1,177 @@
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from .affective_analyzer import is_error
+
+
+class InteractionWindow:
+    """
+    Fixed-size ring buffer over a learner's most recent interactions.
+
+    Keeps running error counts (and a latency sum) for the state and risk
+    windows, so both signals are answered in O(1) without re-scanning.
+    """
+    __slots__ = ('state_size', 'capacity', 'errors', 'latency', 'head', 'count',
+                 'state_errors', 'state_latency', 'risk_errors', 'version', 'checked_at')
+
+    def __init__(self, state_size, risk_size):
+        self.state_size = state_size
+        self.capacity = max(state_size, risk_size)
+        self.errors = array('b', bytes(self.capacity))
+        self.latency = array('q', bytes(8 * self.capacity))
+        self.head = 0 # Next slot to write
+        self.count = 0
+        self.state_errors = 0
+        self.state_latency = 0
+        self.risk_errors = 0
+        self.version = None # Interactions the window reflects, as counted by AffectiveStream.version
+        self.checked_at = 0.0
+
+    def push(self, is_error, latency_ms):
+        cap = self.capacity
+        if self.count >= self.state_size:
+            # Slide the state window past its oldest entry
+            old = (self.head - self.state_size) % cap
+            self.state_errors -= self.errors[old]
+            self.state_latency -= self.latency[old]
+        if self.count >= cap:
+            self.risk_errors -= self.errors[self.head]
+
+        self.errors[self.head] = is_error
+        self.latency[self.head] = latency_ms
+        self.state_errors += is_error
+        self.state_latency += latency_ms
+        self.risk_errors += is_error
+
+        self.head = (self.head + 1) % cap
+        if self.count < cap:
+            self.count += 1
+
+    def push_log(self, log):
+        # Same reading of a log entry as AffectiveAnalyzer
+        self.push(1 if is_error(log.get('is_correct')) else 0, log.get('response_time_ms') or 0)
+
+
+class AffectiveStream:
+    """
+    Per-learner affective state and risk, kept in memory and updated as
+    interactions are logged.
+
+    Windows of up to `capacity` active learners are kept in LRU order; a cold
+    learner is rehydrated on first read with one query for their last
+    RISK_WINDOW interactions through `loader(learner_id, last_n)`.
+
+    Windows are per process, so other workers' writes don't reach them. With
+    `version(learner_id)` (the learner's committed interaction count), a warm
+    window is compared against it at most every `revalidate_interval`
+    seconds and rebuilt when another process logged interactions since.
+    """
+    def __init__(self, analyzer, loader, capacity=10000, version=None, revalidate_interval=1.0):
+        self.analyzer = analyzer
+        self.loader = loader
+        self.capacity = capacity
+        self.version = version
+        self.revalidate_interval = revalidate_interval
+        self._windows = OrderedDict()
+        self._loading = {} # learner_id -> [events recorded while loading, active loaders]
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "stale": 0}
+
+    def record(self, learner_id, interaction):
+        """
+        Adds one interaction (a dict like Interaction.to_dict()) to a warm
+        window. Cold learners are skipped; their next read rehydrates them.
+        """
+        with self._lock:
+            window = self._windows.get(learner_id)
+            if window is not None:
+                window.push_log(interaction)
+                if window.version is not None:
+                    window.version += 1
+            elif learner_id in self._loading:
+                self._loading[learner_id][0] += 1
+
+    def invalidate(self, learner_id):
+        with self._lock:
+            self._windows.pop(learner_id, None)
+            if learner_id in self._loading:
+                self._loading[learner_id][0] += 1
+
+    def analyze_state(self, learner_id):
+        with self._lock:
+            window = self._window(learner_id)
+            n = min(window.count, window.state_size)
+            if not n:
+                return "neutral"
+            return self.analyzer.classify_state(window.state_errors, window.state_latency, n)
+
+    def get_risk_score(self, learner_id):
+        with self._lock:
+            window = self._window(learner_id)
+            if not window.count:
+                return 0
+            return self.analyzer.risk_from_counts(window.risk_errors, window.count)
+
+    def _window(self, learner_id):
+        # Called with the lock held; releases it while querying the database
+        window = self._windows.get(learner_id)
+        if window is not None and not self._current(learner_id, window):
+            # Another process logged interactions for this learner
+            if self._windows.get(learner_id) is window:
+                del self._windows[learner_id]
+            self.stats["stale"] += 1
+            window = None
+        if window is not None:
+            self._windows.move_to_end(learner_id)
+            self.stats["hits"] += 1
+            return window
+
+        self.stats["misses"] += 1
+        for _ in range(3):
+            loading = self._loading.setdefault(learner_id, [0, 0])
+            loading[1] += 1
+            seen = loading[0]
+            self._lock.release()
+            try:
+                # Counted before loading, so a write in between makes the window look stale, not current
+                version = self.version(learner_id) if self.version else None
+                logs = self.loader(learner_id, self.analyzer.RISK_WINDOW)
+            finally:
+                self._lock.acquire()
+                loading[1] -= 1
+                if not loading[1]:
+                    del self._loading[learner_id]
+
+            cached = self._windows.get(learner_id)
+            if cached is not None:
+                return cached # Another thread finished loading first
+            window = InteractionWindow(self.analyzer.STATE_WINDOW, self.analyzer.RISK_WINDOW)
+            for log in logs:
+                window.push_log(log)
+            window.version, window.checked_at = version, time.monotonic()
+            if loading[0] == seen:
+                break
+            # An event arrived while loading and may be missing from `logs`: reload
+        else:
+            return window # Still racing; answer from what we have without caching it
+
+        self._windows[learner_id] = window
+        while len(self._windows) > self.capacity:
+            self._windows.popitem(last=False)
+            self.stats["evictions"] += 1
+        return window
+
+    def _current(self, learner_id, window):
+        # Called with the lock held; releases it while counting
+        now = time.monotonic()
+        if self.version is None or now - window.checked_at < self.revalidate_interval:
+            return True
+        self._lock.release()
+        try:
+            version = self.version(learner_id)
+        finally:
+            self._lock.acquire()
+        window.checked_at = now
+        return version == window.version
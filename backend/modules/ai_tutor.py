@@ -1,62 +1,77 @@
-import requests
+import hashlib
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-class AITutor:
-    def __init__(self, api_key):
-        self.api_key = api_key
-        self.base_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
+from .llm_client import LLMClient, LLMError
+from .content_cache import normalize_key_part
+from .single_flight import SingleFlight
 
-    def _call_gemini(self, prompt):
-        url = f"{self.base_url}?key={self.api_key}"
-        headers = {'Content-Type': 'application/json'}
-        data = {
-            "contents": [{
-                "parts": [{"text": prompt}]
-            }]
-        }
-        import time
-        retries = 5
-        base_delay = 2
-        for attempt in range(retries):
-            try:
-                response = requests.post(url, headers=headers, json=data)
-                response.raise_for_status()
-                result = response.json()
-                with open('debug_tutor.log', 'w') as f:
-                    f.write(json.dumps(result, indent=2))
-                # Extract text from response
-                text = result['candidates'][0]['content']['parts'][0]['text']
-                # Clean up potential markdown code blocks
-                lines = text.split('\n')
-                if lines[0].strip().startswith("```"):
-                    lines = lines[1:]
-                if lines[-1].strip() == "```":
-                    lines = lines[:-1]
-                return "\n".join(lines).strip()
-            except requests.exceptions.HTTPError as e:
-                if e.response.status_code == 429:
-                    delay = base_delay * (2 ** attempt)
-                    print(f"Rate limit hit, retrying in {delay} seconds...")
-                    time.sleep(delay)
-                    continue
-                with open('debug_tutor.log', 'a') as f:
-                    f.write(f"\nError: {str(e)}")
-                if 'response' in locals():
-                    print(f"Response Status: {response.status_code}")
-                    print(f"Response Body: {response.text}")
-                return None
-            except Exception as e:
-                with open('debug_tutor.log', 'a') as f:
-                    f.write(f"\nError: {str(e)}")
-                return None
-        return None
 
-    def generate_content(self, topic, difficulty_level='intermediate'):
-        """
-        Generates educational content for a given topic.
-        """
-        prompt = f"""
+def prompt_version(template):
+    """
+    Short hash of a prompt template. It is part of every cache key, so editing
+    a template retires the content generated from the old one.
+    """
+    return hashlib.sha256(template.encode()).hexdigest()[:12]
+
+
+def strip_code_fences(text):
+    """
+    Removes a Markdown code fence wrapped around a whole response.
+    """
+    lines = text.split('\n')
+    if lines[0].strip().startswith("```"):
+        lines = lines[1:]
+    if lines and lines[-1].strip() == "```":
+        lines = lines[:-1]
+    return "\n".join(lines).strip()
+
+
+class FenceStripper:
+    """
+    Incremental strip_code_fences for streamed text: feed() the chunks as they
+    arrive and finish() at the end. The concatenated output equals
+    strip_code_fences() of the whole text. Only the opening line and the
+    trailing whitespace and last line are held back until they can be decided.
+    """
+    def __init__(self):
+        self._buffer = ""
+        self._first_line_done = False
+        self._started = False
+
+    def feed(self, chunk):
+        self._buffer += chunk
+        if not self._first_line_done:
+            newline = self._buffer.find('\n')
+            if newline == -1:
+                return ""
+            if self._buffer[:newline].strip().startswith("```"):
+                self._buffer = self._buffer[newline + 1:]
+            self._first_line_done = True
+        if not self._started:
+            self._buffer = self._buffer.lstrip()
+            self._started = bool(self._buffer)
+        # Everything before the last newline is final, apart from trailing
+        # whitespace that may turn out to end the text
+        safe = self._buffer[:self._buffer.rfind('\n') + 1].rstrip()
+        self._buffer = self._buffer[len(safe):]
+        return safe
+
+    def finish(self):
+        text, self._buffer = self._buffer, ""
+        if not self._first_line_done:
+            return strip_code_fences(text)
+        if not self._started:
+            text = text.lstrip()
+        last_line = text[text.rfind('\n') + 1:]
+        if last_line.strip() == "```":
+            text = text[:text.rfind('\n') + 1] if '\n' in text else ""
+        return text.rstrip()
+
+
+LESSON_PROMPT = """
         You are an expert AI Tutor. Create a comprehensive, structured lesson on the topic: "{topic}".
         Target Audience: {difficulty_level} level learner.
 
@@ -73,14 +88,10 @@ class AITutor:
 
         Make the content visually appealing and easy to digest.
         """
-        content = self._call_gemini(prompt)
-        return content if content else "Sorry, I couldn't generate content at this time. Please try again."
+LESSON_PROMPT_VERSION = prompt_version(LESSON_PROMPT)
+LESSON_FALLBACK = "Sorry, I couldn't generate content at this time. Please try again."
 
-    def generate_quiz(self, content):
-        """
-        Generates a 5-question quiz based on the provided content.
-        """
-        prompt = f"""
+QUIZ_PROMPT = """
         Based on the following content, create a 5-question multiple-choice quiz.
         
         Content:
@@ -97,58 +108,334 @@ class AITutor:
         ]
         Do not include any markdown formatting (like ```json) in the response, just the raw JSON string.
         """
-        response_text = self._call_gemini(prompt)
+QUIZ_PROMPT_VERSION = prompt_version(QUIZ_PROMPT)
+
+EXPLANATION_PROMPT = """
+        You are an AI Tutor. A user just took a quiz on the following content.
+
+        Content:
+        {content}
+
+        These quiz questions have already been graded:
+        {questions}
+
+        For each question, briefly explain why the user's answer is correct or incorrect,
+        and give one specific recommendation on what to review or learn next.
+        Return a STRICT JSON object with this structure:
+        {{
+            "explanations": {{"<question id>": "<string, brief explanation>"}},
+            "next_steps": "<string, specific recommendation on what to review or learn next>"
+        }}
+        Do not include any markdown formatting (like ```json) in the response, just the raw JSON string.
+        """
+EXPLANATION_PROMPT_VERSION = prompt_version(EXPLANATION_PROMPT)
+# Lessons stay addressable by content_id at least as long as pre-generated ones are cached
+LESSON_STORE_TTL = 400 * 24 * 3600
+# Evaluations are kept just long enough for the client to pick up explanations
+EVALUATION_TTL = 24 * 3600
+# An evaluation whose explanations failed is kept only until the client has
+# polled it, so resubmitting the answers later tries the LLM again
+FAILED_EVALUATION_TTL = 60
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+class AITutor:
+    def __init__(self, api_key, llm_client=None, cache=None):
+        self.api_key = api_key
+        self.llm = llm_client or LLMClient(api_key)
+        # Optional ContentCache for generated lessons and quizzes
+        self.cache = cache
+        # Identical prompts in flight at the same time share one upstream call
+        self.flights = SingleFlight()
+        # Explanations are generated off the request path
+        self._executor = None
+        self._background_lock = threading.Lock()
+
+    def _call_gemini(self, prompt):
+        # Rate limits, retries and the time budget are handled by the LLM
+        # client; any failure comes back as None so callers use their fallback
+        try:
+            response = self.llm.generate(prompt, tag='tutor')
+        except LLMError as e:
+            with open('debug_tutor.log', 'a') as f:
+                f.write(f"\nError: {str(e)}")
+            print(f"Tutor Error: {e}")
+            return None
+        with open('debug_tutor.log', 'w') as f:
+            f.write(json.dumps(response.raw, indent=2))
+        # Clean up potential markdown code blocks
+        return strip_code_fences(response.text)
+
+    def generate_content(self, topic, difficulty_level='intermediate'):
+        """
+        Generates educational content for a given topic.
+        """
+        key = self.lesson_key(topic, difficulty_level)
+        if self.cache is not None:
+            cached = self.cache.get('lesson', key)
+            if cached is not None:
+                return cached
+
+        content = self.flights.do(('lesson', key), lambda: self._generate_lesson(topic, difficulty_level, key))
+        return content if content else LESSON_FALLBACK # Failures are never cached
+
+    def _generate_lesson(self, topic, difficulty_level, key, ttl=None):
+        if self.cache is not None:
+            # A call for the same key may have finished since our cache miss
+            cached = self.cache.get('lesson', key)
+            if cached is not None:
+                return cached
+        content = self._call_gemini(LESSON_PROMPT.format(topic=topic, difficulty_level=difficulty_level))
+        if content and self.cache is not None:
+            self.cache.set('lesson', key, content, ttl)
+        return content
+
+    def stream_content(self, topic, difficulty_level='intermediate'):
+        """
+        Like generate_content, but yields the lesson in chunks as they are
+        generated. A cached lesson is yielded in one piece; a streamed one is
+        cached once complete. Raises LLMError if generation fails (possibly
+        after some chunks).
+        """
+        key = self.lesson_key(topic, difficulty_level)
+        if self.cache is not None:
+            cached = self.cache.get('lesson', key)
+            if cached is not None:
+                yield cached
+                return
+
+        stripper = FenceStripper()
+        parts = []
+        prompt = LESSON_PROMPT.format(topic=topic, difficulty_level=difficulty_level)
+        for chunk in self.llm.stream(prompt, tag='tutor'):
+            text = stripper.feed(chunk)
+            if text:
+                parts.append(text)
+                yield text
+        text = stripper.finish()
+        if text:
+            parts.append(text)
+            yield text
+
+        content = "".join(parts)
+        if content and self.cache is not None:
+            self.cache.set('lesson', key, content)
+
+    def lesson_key(self, topic, difficulty_level):
+        return f"{normalize_key_part(topic)}|{normalize_key_part(difficulty_level)}|{LESSON_PROMPT_VERSION}"
+
+    def store_lesson(self, content):
+        """
+        Keeps a lesson addressable by its content hash, which clients send
+        back instead of the whole document. Returns the content_id (None for
+        the fallback text or without a cache).
+        """
+        if self.cache is None or not content or content == LESSON_FALLBACK:
+            return None
+        content_id = content_hash(content)
+        if self.cache.get('lesson_content', content_id) is None:
+            self.cache.set('lesson_content', content_id, content, LESSON_STORE_TTL)
+        return content_id
+
+    def get_lesson(self, content_id):
+        if self.cache is None:
+            return None
+        return self.cache.get('lesson_content', content_id)
+
+    def get_cached_quiz(self, content):
+        if self.cache is None:
+            return None
+        return self.cache.get('quiz', self.quiz_key(content))
+
+    def invalidate_content(self, topic=None, difficulty_level=None):
+        """
+        Drops cached lessons for a topic (at one difficulty, if given), or all
+        of them. Returns the number of entries removed.
+        """
+        if self.cache is None:
+            return 0
+        prefix = None
+        if topic:
+            prefix = f"{normalize_key_part(topic)}|"
+            if difficulty_level:
+                prefix += f"{normalize_key_part(difficulty_level)}|"
+        return self.cache.invalidate('lesson', prefix)
+
+    def generate_quiz(self, content, ttl=None):
+        """
+        Generates a 5-question quiz based on the provided content. Quizzes
+        are cached by the lesson's content hash, so each lesson gets one.
+        """
+        key = self.quiz_key(content)
+        if self.cache is not None:
+            cached = self.cache.get('quiz', key)
+            if cached is not None:
+                return cached
+        return self.flights.do(('quiz', key), lambda: self._generate_quiz(content, key, ttl))
+
+    def _generate_quiz(self, content, key, ttl=None):
+        if self.cache is not None:
+            cached = self.cache.get('quiz', key)
+            if cached is not None:
+                return cached
+        quiz = self._parse_quiz(self._call_gemini(QUIZ_PROMPT.format(content=content)))
+        if quiz and self.cache is not None:
+            self.cache.set('quiz', key, quiz, ttl)
+        return quiz
+
+    def quiz_key(self, content):
+        # Quizzes belong to the exact lesson text they were generated from
+        return f"{content_hash(content)}|{QUIZ_PROMPT_VERSION}"
+
+    def _parse_quiz(self, response_text):
         if not response_text:
             return []
-            
+
         try:
             return json.loads(response_text)
         except Exception as e:
             print(f"Error parsing quiz JSON: {e}")
             return []
 
+    def pregenerate(self, topic, difficulty_level, ttl=None):
+        """
+        Makes sure the lesson for (topic, level) and its quiz are cached.
+        Returns 'cached' if both already were, 'generated', or 'failed'.
+        """
+        key = self.lesson_key(topic, difficulty_level)
+        lesson = self.cache.get('lesson', key)
+        generated = lesson is None
+        if generated:
+            lesson = self.flights.do(('lesson', key), lambda: self._generate_lesson(topic, difficulty_level, key, ttl))
+            if not lesson:
+                return 'failed'
+
+        quiz_key = self.quiz_key(lesson)
+        if self.cache.get('quiz', quiz_key) is None:
+            generated = True
+            if not self.flights.do(('quiz', quiz_key), lambda: self._generate_quiz(lesson, quiz_key, ttl)):
+                return 'failed'
+        return 'generated' if generated else 'cached'
+
     def evaluate_quiz(self, content, user_answers, quiz_questions):
         """
         Evaluates the user's quiz answers and provides feedback.
         user_answers: dict of {question_id: selected_option}
+
+        Scoring is done locally from each question's correct_answer, so the
+        feedback is immediate. Explanations come from a per-question cache;
+        any that are missing are generated in the background together with
+        LLM next steps, and the finished feedback is then available through
+        get_evaluation(evaluation_id) while `explanations_pending` is true.
         """
-        prompt = f"""
-        You are an AI Tutor. A user just took a quiz on the following content.
-        
-        Content:
-        {content}
-        
-        Quiz Questions & Correct Answers:
-        {json.dumps(quiz_questions)}
-        
-        User's Answers:
-        {json.dumps(user_answers)}
-        
-        Please evaluate the quiz and return a STRICT JSON object with this structure:
-        {{
-            "score": <int, number of correct answers>,
-            "total": <int, total questions>,
-            "summary": "<string, brief encouraging summary>",
-            "next_steps": "<string, specific recommendation on what to review or learn next>",
-            "results": [
-                {{
-                    "id": <int, question id>,
-                    "question": "<string>",
-                    "user_answer": "<string>",
-                    "correct_answer": "<string>",
-                    "is_correct": <boolean>,
-                    "explanation": "<string, brief explanation of why the answer is correct/incorrect>"
-                }}
-            ]
-        }}
-        Do not include any markdown formatting (like ```json) in the response, just the raw JSON string.
-        """
-        response_text = self._call_gemini(prompt)
-        if not response_text:
+        results = grade_quiz(quiz_questions, user_answers)
+        score = sum(1 for r in results if r['is_correct'])
+        feedback = {
+            "score": score,
+            "total": len(results),
+            "summary": quiz_summary(score, len(results)),
+            "next_steps": quiz_next_steps(results),
+            "results": results
+        }
+        if self.cache is None:
+            return feedback
+
+        evaluation_id = content_hash(json.dumps([content_hash(content), results], sort_keys=True))
+        stored = self.cache.get('evaluation', evaluation_id, memory=False)
+        if stored is not None:
+            return stored
+
+        missing = []
+        for result in results:
+            explanation = self.cache.get('explanation', self.explanation_key(result))
+            if explanation is None:
+                missing.append(result)
+            else:
+                result['explanation'] = explanation
+        feedback['evaluation_id'] = evaluation_id
+        feedback['explanations_pending'] = bool(missing)
+        self.cache.set('evaluation', evaluation_id, feedback, EVALUATION_TTL, memory=False)
+        if missing:
+            self._background().submit(self.flights.do, ('evaluation', evaluation_id),
+                                      lambda: self._explain(content, feedback, missing))
+        return feedback
+
+    def get_evaluation(self, evaluation_id):
+        if self.cache is None:
             return None
-            
+        # Rewritten once explanations arrive, maybe by another worker: never from memory
+        return self.cache.get('evaluation', evaluation_id, memory=False)
+
+    def explanation_key(self, result):
+        # The explanation depends on the question and which answer was picked
+        parts = [result['question'], result['correct_answer'], result['user_answer']]
+        return f"{content_hash(json.dumps(parts))}|{EXPLANATION_PROMPT_VERSION}"
+
+    def _explain(self, content, feedback, missing):
+        enriched = json.loads(json.dumps(feedback)) # Don't touch what callers hold
+        enriched['explanations_pending'] = False
+        answered = False
         try:
-            return json.loads(response_text)
+            questions = [{k: r[k] for k in ('id', 'question', 'user_answer', 'correct_answer', 'is_correct')}
+                         for r in missing]
+            response_text = self._call_gemini(EXPLANATION_PROMPT.format(content=content, questions=json.dumps(questions)))
+            explained = json.loads(response_text) if response_text else {}
+            explanations = {str(k): v for k, v in (explained.get('explanations') or {}).items()}
+            for result in enriched['results']:
+                explanation = explanations.get(str(result['id']))
+                if explanation and not result['explanation']:
+                    result['explanation'] = explanation
+                    self.cache.set('explanation', self.explanation_key(result), explanation)
+            if explained.get('next_steps'):
+                enriched['next_steps'] = explained['next_steps']
+            answered = bool(explanations)
         except Exception as e:
-            print(f"Error parsing evaluation JSON: {e}")
-            return None
+            print(f"Error generating quiz explanations: {e}")
+        ttl = EVALUATION_TTL if answered else FAILED_EVALUATION_TTL
+        self.cache.set('evaluation', feedback['evaluation_id'], enriched, ttl, memory=False)
+
+    def _background(self):
+        with self._background_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='tutor-explain')
+            return self._executor
+
+
+def grade_quiz(quiz_questions, user_answers):
+    """
+    Per-question results for the answers given, by question id.
+    """
+    answers = {str(k): v for k, v in (user_answers or {}).items()}
+    results = []
+    for question in quiz_questions:
+        user_answer = answers.get(str(question.get('id')))
+        correct_answer = question.get('correct_answer')
+        results.append({
+            "id": question.get('id'),
+            "question": question.get('question'),
+            "user_answer": user_answer if user_answer is not None else "",
+            "correct_answer": correct_answer,
+            "is_correct": user_answer is not None and str(user_answer).strip() == str(correct_answer).strip(),
+            "explanation": ""
+        })
+    return results
+
+
+def quiz_summary(score, total):
+    ratio = score / total if total else 0
+    if ratio >= 0.8:
+        message = "Excellent work! You have a strong grasp of this topic."
+    elif ratio >= 0.5:
+        message = "Good effort! You're getting there."
+    else:
+        message = "Keep going! Every attempt builds understanding."
+    return f"You scored {score} out of {total}. {message}"
+
+
+def quiz_next_steps(results):
+    missed = [r['question'] for r in results if not r['is_correct']]
+    if not missed:
+        return "You're ready to move on to the next concept in your study plan."
+    return "Review the lesson sections behind these questions: " + " ".join(missed)
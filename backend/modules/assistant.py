@@ -1,11 +1,15 @@
-import requests
 import json
 import os
 
+from .llm_client import LLMClient
+from .intent_router import IntentRouter
+
 class AIAssistant:
-    def __init__(self, api_key):
+    def __init__(self, api_key, llm_client=None, router=None):
         self.api_key = api_key
-        self.base_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
+        self.llm = llm_client or LLMClient(api_key)
+        # Navigation and FAQ messages are answered locally, without the LLM
+        self.router = router or IntentRouter()
         
         self.system_prompt = """
         You are the "Neon Guide", an intelligent AI assistant embedded within the "AI Learning System" application.
@@ -33,6 +37,10 @@ class AIAssistant:
         """
 
     def chat(self, user_message, context=None):
+        routed = self.router.route(user_message)
+        if routed is not None:
+            return routed
+
         prompt = f"""
         {self.system_prompt}
 
@@ -42,19 +50,8 @@ class AIAssistant:
         Response:
         """
         
-        url = f"{self.base_url}?key={self.api_key}"
-        headers = {'Content-Type': 'application/json'}
-        data = {
-            "contents": [{
-                "parts": [{"text": prompt}]
-            }]
-        }
-        
         try:
-            response = requests.post(url, headers=headers, json=data)
-            response.raise_for_status()
-            result = response.json()
-            text = result['candidates'][0]['content']['parts'][0]['text']
+            text = self.llm.generate(prompt, tag='assistant').text
             
             # Clean up markdown if present
             # Robust JSON extraction
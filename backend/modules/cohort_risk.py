@@ -0,0 +1,107 @@
+import numpy as np
+from sqlalchemy import func, select
+
+from models import User, Interaction
+from .affective_analyzer import is_error
+
+STATES = np.array(["neutral", "struggling", "confused", "fatigued", "engaged"], dtype=object)
+
+
+class CohortRiskScorer:
+    """
+    Affective state and risk score for many learners at once.
+
+    One windowed query pulls every learner's last RISK_WINDOW interactions,
+    and the AffectiveAnalyzer rules are then applied to NumPy arrays. Results
+    are identical to calling analyze_state / get_risk_score per learner.
+    """
+    def __init__(self, db, analyzer):
+        self.db = db
+        self.analyzer = analyzer
+
+    def score_page(self, page=1, per_page=100):
+        query = User.query.order_by(User.id)
+        users = query.offset((page - 1) * per_page).limit(per_page).all()
+        scores = self.score([u.id for u in users])
+        return {
+            "page": page,
+            "per_page": per_page,
+            "total": query.count(),
+            "learners": [dict(scores[u.id], name=u.name) for u in users]
+        }
+
+    def iter_all(self, per_page=1000):
+        page = 1
+        while True:
+            result = self.score_page(page, per_page)
+            yield from result["learners"]
+            if page * per_page >= result["total"]:
+                return
+            page += 1
+
+    def score(self, user_ids):
+        """
+        Returns {user_id: {learner_id, affective_state, risk_score, recent_interactions}}.
+        """
+        user_ids = list(user_ids)
+        index = {uid: i for i, uid in enumerate(user_ids)}
+        n_users = len(user_ids)
+        if not n_users:
+            return {}
+
+        rows = self._recent_interactions(user_ids)
+        learner = np.fromiter((index[r[0]] for r in rows), dtype=np.int64, count=len(rows))
+        # Same rule as AffectiveAnalyzer: False is an error, NULL (ungraded) is not
+        errors = np.fromiter((is_error(r[1]) for r in rows), dtype=np.float64, count=len(rows))
+        latency = np.fromiter((r[2] or 0 for r in rows), dtype=np.float64, count=len(rows))
+        rank = np.fromiter((r[3] for r in rows), dtype=np.int64, count=len(rows))
+
+        risk_n = np.bincount(learner, minlength=n_users)
+        risk_errors = np.bincount(learner, weights=errors, minlength=n_users)
+
+        in_state = rank <= self.analyzer.STATE_WINDOW
+        state_n = np.bincount(learner[in_state], minlength=n_users)
+        state_errors = np.bincount(learner[in_state], weights=errors[in_state], minlength=n_users)
+        state_latency = np.bincount(learner[in_state], weights=latency[in_state], minlength=n_users)
+
+        active = risk_n > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            risk = np.where(active, np.minimum(np.round((risk_errors / risk_n) * 100), 100), 0).astype(np.int64)
+            error_rate = state_errors / state_n
+            latency_score = np.minimum((state_latency / state_n) / 60000, 1.0)
+
+        states = self._classify(active, error_rate, latency_score)
+
+        return {
+            uid: {
+                "learner_id": uid,
+                "affective_state": states[i],
+                "risk_score": int(risk[i]),
+                "recent_interactions": int(risk_n[i])
+            }
+            for uid, i in index.items()
+        }
+
+    def _recent_interactions(self, user_ids):
+        rank = func.row_number().over(
+            partition_by=Interaction.user_id,
+            order_by=(Interaction.timestamp.desc(), Interaction.id.desc())
+        ).label('rank')
+        ranked = select(
+            Interaction.user_id, Interaction.is_correct, Interaction.response_time_ms, rank
+        ).where(Interaction.user_id.in_(user_ids)).subquery()
+        return self.db.session.execute(
+            select(ranked.c.user_id, ranked.c.is_correct, ranked.c.response_time_ms, ranked.c.rank)
+            .where(ranked.c.rank <= self.analyzer.RISK_WINDOW)
+        ).all()
+
+    def _classify(self, active, error_rate, latency_score):
+        # Vectorized AffectiveAnalyzer.classify_state; first matching rule wins
+        high = active & (error_rate > 0.6)
+        low = active & (error_rate < 0.2)
+        codes = np.select(
+            [high & (latency_score > 0.7), high, low & (latency_score > 0.8), low & (latency_score < 0.5)],
+            [1, 2, 3, 4],
+            default=0
+        )
+        return STATES[codes]
@@ -0,0 +1,70 @@
+import numpy as np
+
+LOCKED = 0
+UNLOCKED = 1
+COMPLETED = 2
+STATUS_NAMES = ("locked", "unlocked", "completed")
+
+
+class CompactGraph:
+    """
+    Integer-indexed, array-backed form of a knowledge graph.
+
+    Concepts are numbered in graph order. Prerequisites are stored in CSR
+    form: the prerequisites of concept i are
+    `prereq_indices[prereq_indptr[i]:prereq_indptr[i + 1]]`, so unlock status
+    for every concept is one gather over the edge array plus one bincount.
+    """
+    def __init__(self, graph, node_lookup, topo_order):
+        self.ids = tuple(graph.nodes)
+        self.index = {cid: i for i, cid in enumerate(self.ids)}
+        self.size = len(self.ids)
+
+        # Node payload from the graph file, None for ids that only appear in edges
+        self.concepts = tuple(node_lookup.get(cid) for cid in self.ids)
+
+        in_degree = np.fromiter((graph.in_degree(cid) for cid in self.ids), dtype=np.int64, count=self.size)
+        self.prereq_indptr = np.zeros(self.size + 1, dtype=np.int64)
+        np.cumsum(in_degree, out=self.prereq_indptr[1:])
+        self.prereq_indices = np.fromiter(
+            (self.index[p] for cid in self.ids for p in graph.predecessors(cid)),
+            dtype=np.int64, count=int(self.prereq_indptr[-1])
+        )
+        # Owning concept of each CSR entry, used to count unmet prerequisites
+        self.prereq_owner = np.repeat(np.arange(self.size, dtype=np.int64), in_degree)
+
+        if topo_order is None:
+            self.topo_order = None
+        else:
+            self.topo_order = np.fromiter((self.index[cid] for cid in topo_order), dtype=np.int64, count=len(topo_order))
+
+        for arr in (self.prereq_indptr, self.prereq_indices, self.prereq_owner, self.topo_order):
+            if arr is not None:
+                arr.flags.writeable = False
+
+    def completed_mask(self, completed):
+        """
+        Bitmap over concept indices; ids not in this graph are ignored.
+        """
+        mask = np.zeros(self.size, dtype=bool)
+        idx = [self.index[cid] for cid in completed if cid in self.index]
+        if idx:
+            mask[idx] = True
+        return mask
+
+    def unlocked_mask(self, completed_mask):
+        """
+        True for every concept whose prerequisites are all in `completed_mask`.
+        """
+        unmet = ~completed_mask[self.prereq_indices]
+        missing = np.bincount(self.prereq_owner[unmet], minlength=self.size)
+        return missing == 0
+
+    def statuses(self, completed):
+        """
+        Returns an array of LOCKED / UNLOCKED / COMPLETED codes, one per concept.
+        """
+        done = self.completed_mask(completed)
+        codes = self.unlocked_mask(done).astype(np.int8)
+        codes[done] = COMPLETED
+        return codes
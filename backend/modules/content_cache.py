@@ -0,0 +1,188 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'cache')
+
+
+def normalize_key_part(value):
+    """
+    Case- and whitespace-insensitive form of a key component, so
+    "Python  Lists" and "python lists" share an entry.
+    """
+    return " ".join(str(value).split()).casefold()
+
+
+class ContentCache:
+    """
+    Two-tier cache for generated content.
+
+    Entries live in an in-memory LRU bounded by `max_bytes` of serialized
+    value, backed by a SQLite file that survives restarts and is shared by all
+    worker processes. Values are anything JSON-serializable. Each entry
+    belongs to a namespace (e.g. 'lesson') and expires after its TTL.
+
+    The memory tier is per process. invalidate() bumps a generation counter
+    in the SQLite file; every process checks it at most every
+    `revalidate_interval` seconds and drops its memory tier when it changed,
+    so invalidations reach all workers within that interval.
+    """
+    def __init__(self, path=None, max_bytes=64 * 1024 * 1024, ttl=7 * 24 * 3600, revalidate_interval=1.0):
+        self.path = path or os.path.join(CACHE_DIR, 'content_cache.sqlite3')
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.revalidate_interval = revalidate_interval
+
+        self._memory = OrderedDict() # (namespace, key) -> (expires_at, size, value)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "evictions": 0, "revalidations": 0}
+
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS content_cache ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " created_at REAL NOT NULL, expires_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        # Bumped by invalidate(); a change tells other processes to drop their memory tier
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS content_cache_generation ("
+            " id INTEGER PRIMARY KEY, generation INTEGER NOT NULL)"
+        )
+        self._db.execute("INSERT OR IGNORE INTO content_cache_generation (id, generation) VALUES (1, 0)")
+        self._generation = self._read_generation()
+        self._checked_at = time.monotonic()
+
+    def get(self, namespace, key, memory=True):
+        """
+        Returns the cached value, or None if missing or expired. With
+        memory=False the memory tier is bypassed, for entries that are
+        rewritten after they are first set (possibly by another process).
+        """
+        now = time.time()
+        with self._lock:
+            self._revalidate()
+            entry = self._memory.get((namespace, key)) if memory else None
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end((namespace, key))
+                    self.stats["memory_hits"] += 1
+                    return entry[2]
+                self._drop((namespace, key))
+
+            row = self._db.execute(
+                "SELECT value, expires_at FROM content_cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, now)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+            value = json.loads(row[0])
+            if memory:
+                self._remember((namespace, key), row[1], len(row[0]), value)
+            return value
+
+    def set(self, namespace, key, value, ttl=None, memory=True):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        encoded = json.dumps(value)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO content_cache (namespace, key, value, created_at, expires_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, encoded, now, expires_at)
+            )
+            if memory:
+                self._remember((namespace, key), expires_at, len(encoded), value)
+            else:
+                self._drop((namespace, key))
+            self.stats["sets"] += 1
+
+    def invalidate(self, namespace=None, key_prefix=None):
+        """
+        Drops every entry in `namespace` whose key starts with `key_prefix`;
+        everything when both are None. Takes effect in this process at once
+        and in other processes within `revalidate_interval` seconds. Returns
+        the number of stored entries removed.
+        """
+        with self._lock:
+            for cache_key in list(self._memory):
+                if self._matches(cache_key, namespace, key_prefix):
+                    self._drop(cache_key)
+
+            query, params = "DELETE FROM content_cache WHERE 1 = 1", []
+            if namespace is not None:
+                query += " AND namespace = ?"
+                params.append(namespace)
+            if key_prefix:
+                query += " AND substr(key, 1, ?) = ?"
+                params += [len(key_prefix), key_prefix]
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                removed = self._db.execute(query, params).rowcount
+                self._db.execute("UPDATE content_cache_generation SET generation = generation + 1 WHERE id = 1")
+                generation = self._read_generation()
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            if generation != self._generation + 1:
+                self._clear_memory() # Another process invalidated something since we last looked
+            self._generation = generation
+            return removed
+
+    def purge_expired(self):
+        with self._lock:
+            return self._db.execute("DELETE FROM content_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats, memory_entries=len(self._memory), memory_bytes=self._memory_bytes)
+
+    def _matches(self, cache_key, namespace, key_prefix):
+        return ((namespace is None or cache_key[0] == namespace)
+                and (not key_prefix or cache_key[1].startswith(key_prefix)))
+
+    def _read_generation(self):
+        return self._db.execute("SELECT generation FROM content_cache_generation WHERE id = 1").fetchone()[0]
+
+    def _revalidate(self):
+        # Called with the lock held
+        now = time.monotonic()
+        if now - self._checked_at < self.revalidate_interval:
+            return
+        self._checked_at = now
+        generation = self._read_generation()
+        if generation != self._generation:
+            self._generation = generation
+            self._clear_memory()
+            self.stats["revalidations"] += 1
+
+    def _clear_memory(self):
+        self._memory.clear()
+        self._memory_bytes = 0
+
+    def _remember(self, cache_key, expires_at, size, value):
+        # Called with the lock held
+        self._drop(cache_key)
+        if size > self.max_bytes:
+            return # Too large for memory; served from disk only
+        self._memory[cache_key] = (expires_at, size, value)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+            self.stats["evictions"] += 1
+
+    def _drop(self, cache_key):
+        entry = self._memory.pop(cache_key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[1]
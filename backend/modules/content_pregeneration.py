@@ -0,0 +1,98 @@
+import glob
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .content_cache import normalize_key_part
+from .knowledge_graph import KnowledgeGraph, MOCK_DATA_DIR
+from .learner_profile import SKILL_LEVELS
+
+
+def graph_domains(data_dir=MOCK_DATA_DIR):
+    """
+    Domains with a graph file, e.g. 'programming' for programming_graph.json.
+    """
+    suffix = '_graph.json'
+    return sorted(os.path.basename(path)[:-len(suffix)]
+                  for path in glob.glob(os.path.join(data_dir, f'*{suffix}')))
+
+
+def concept_names(data_dir=MOCK_DATA_DIR):
+    """
+    Normalized names of every concept in the knowledge graphs.
+    """
+    return {normalize_key_part(node['name'])
+            for domain in graph_domains(data_dir)
+            for node in KnowledgeGraph(domain).compiled.nodes if node.get('name')}
+
+
+class ContentPregenerator:
+    """
+    Fills the tutor's content cache with the lesson and quiz for every
+    (concept, skill level) pair in the knowledge graphs, so requests for
+    catalogued concepts never wait on the LLM.
+
+    Progress lives in the cache itself: pairs whose lesson and quiz are
+    already cached are skipped, so an interrupted run resumes where it
+    stopped. Cache keys include the prompt version, so editing a prompt
+    template makes exactly the affected content due again.
+    """
+    def __init__(self, tutor, data_dir=MOCK_DATA_DIR, levels=SKILL_LEVELS):
+        if tutor.cache is None:
+            raise ValueError("Pre-generation needs an AITutor with a content cache")
+        self.tutor = tutor
+        self.data_dir = data_dir
+        self.levels = levels
+
+    def catalog(self, domains=None):
+        """
+        Returns the (concept name, level) pairs to generate, one per
+        normalized name even when several graphs share a concept.
+        """
+        items = {}
+        for domain in domains or graph_domains(self.data_dir):
+            for node in KnowledgeGraph(domain).compiled.nodes:
+                name = node.get('name')
+                if not name:
+                    continue
+                for level in self.levels:
+                    items.setdefault((normalize_key_part(name), level), (name, level))
+        return list(items.values())
+
+    def is_done(self, topic, level):
+        lesson = self.tutor.cache.get('lesson', self.tutor.lesson_key(topic, level))
+        return lesson is not None and self.tutor.cache.get('quiz', self.tutor.quiz_key(lesson)) is not None
+
+    def run(self, domains=None, workers=4, limit=None, ttl=None, log=print):
+        """
+        Generates whatever is missing with at most `workers` pairs in flight
+        (the LLM client's own concurrency limit and rate governor still
+        apply). Returns counts per outcome.
+        """
+        items = self.catalog(domains)
+        pending = [item for item in items if not self.is_done(*item)]
+        counts = {"total": len(items), "cached": len(items) - len(pending), "generated": 0, "failed": 0}
+        if limit is not None:
+            pending = pending[:limit]
+        log(f"{len(items)} lessons in catalog, {counts['cached']} cached, {len(pending)} to generate")
+
+        lock = threading.Lock()
+        started = time.monotonic()
+        processed = [0]
+
+        def generate(item):
+            topic, level = item
+            try:
+                status = self.tutor.pregenerate(topic, level, ttl=ttl)
+            except Exception as e:
+                log(f"Error generating {level} '{topic}': {e}")
+                status = 'failed'
+            with lock:
+                counts[status] += 1
+                processed[0] += 1
+                log(f"[{processed[0]}/{len(pending)}] {status}: {level} '{topic}' ({time.monotonic() - started:.0f}s)")
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pregenerate') as pool:
+            list(pool.map(generate, pending))
+        return counts
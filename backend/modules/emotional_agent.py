@@ -1,12 +1,49 @@
 import random
 import json
-import requests
 import os
+import hashlib
+
+from .llm_client import LLMClient
+from .content_cache import CACHE_DIR, normalize_key_part
+
+PROMPTS = {
+    'tired': """
+            Write a very short, simple manga-style story (max 200 words) related to the topic: "{topic}".
+            Characters: A wise sensei and a curious student.
+            Tone: Calm, relaxing, and encouraging.
+            Format: Narrative text, no script format.
+            Goal: Explain one key concept of the topic gently through the story.
+            """,
+    'good': """
+            Generate a short, encouraging fun fact or appreciation message about learning "{topic}".
+            Tone: Friendly and supportive. Max 1 sentence.
+            """,
+    'happy': """
+            Generate a simple, fun bonus challenge question about "{topic}".
+            Format: Just the question.
+            """,
+    'enthusiastic': """
+            Generate a thought-provoking advanced concept extension or mini-challenge related to "{topic}".
+            Tone: Exciting and challenging. Max 2 sentences.
+            """,
+}
+
+# Saved pools are dropped when any prompt changes
+PROMPTS_VERSION = hashlib.sha256(json.dumps(PROMPTS, sort_keys=True).encode()).hexdigest()[:12]
+
+POOL_PATH = os.path.join(CACHE_DIR, 'emotional_pools.json')
 
 class EmotionalAgent:
-    def __init__(self, api_key):
+    def __init__(self, api_key, llm_client=None, pool=None, pooled_topics=None):
         self.api_key = api_key
-        self.base_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
+        self.llm = llm_client or LLMClient(api_key)
+        # Pre-generated responses per (emotion, topic); without a pool every
+        # response is generated on the request
+        self.pool = pool
+        # Normalized topics worth keeping a pool for (e.g. concept names);
+        # any other topic costs one call on the request rather than a refill
+        # of the whole pool. None pools every topic.
+        self.pooled_topics = pooled_topics
         
         self.games = [
             {"id": "reaction", "name": "Quick Reaction", "type": "reaction", "duration": 60},
@@ -16,26 +53,33 @@ class EmotionalAgent:
         ]
 
     def _call_gemini(self, prompt):
-        url = f"{self.base_url}?key={self.api_key}"
-        headers = {'Content-Type': 'application/json'}
-        data = {
-            "contents": [{
-                "parts": [{"text": prompt}]
-            }]
-        }
         try:
-            response = requests.post(url, headers=headers, json=data)
-            response.raise_for_status()
-            result = response.json()
-            return result['candidates'][0]['content']['parts'][0]['text']
+            return self.llm.generate(prompt, tag='emotional').text
         except Exception as e:
             print(f"Gemini Error: {e}")
             return None
 
-    def get_response(self, emotion, topic):
+    def _generate(self, emotion, topic):
+        return self._call_gemini(PROMPTS[emotion].format(topic=topic))
+
+    def _text(self, emotion, topic, wait):
+        """
+        A response for the emotion and topic, or None to use the fallback.
+        """
+        key = (emotion, normalize_key_part(topic))
+        if self.pool is None or (self.pooled_topics is not None and key[1] not in self.pooled_topics):
+            return self._generate(emotion, topic)
+        text = self.pool.take(key, lambda: self._generate(emotion, topic))
+        if text is None and wait:
+            text = self._generate(emotion, topic)
+        return text
+
+    def get_response(self, emotion, topic, wait=False):
         """
         Determines the appropriate intervention or response based on emotion.
         Returns a dict with 'type', 'content', and 'metadata'.
+        With `wait`, an empty response pool means generating a response now
+        rather than using the fallback (for callers off the request path).
         """
         if emotion == 'exhausted': # Frustrated 😫
             game = random.choice(self.games)
@@ -46,14 +90,7 @@ class EmotionalAgent:
             }
 
         elif emotion == 'tired': # Tired 🥱
-            prompt = f"""
-            Write a very short, simple manga-style story (max 200 words) related to the topic: "{topic}".
-            Characters: A wise sensei and a curious student.
-            Tone: Calm, relaxing, and encouraging.
-            Format: Narrative text, no script format.
-            Goal: Explain one key concept of the topic gently through the story.
-            """
-            story = self._call_gemini(prompt) or "Once upon a time, a learner took a well-deserved break..."
+            story = self._text('tired', topic, wait) or "Once upon a time, a learner took a well-deserved break..."
             return {
                 "type": "story",
                 "content": story,
@@ -61,11 +98,7 @@ class EmotionalAgent:
             }
 
         elif emotion == 'good': # Good 🙂
-            prompt = f"""
-            Generate a short, encouraging fun fact or appreciation message about learning "{topic}".
-            Tone: Friendly and supportive. Max 1 sentence.
-            """
-            message = self._call_gemini(prompt) or "You're doing great! Keep it up."
+            message = self._text('good', topic, wait) or "You're doing great! Keep it up."
             return {
                 "type": "message",
                 "content": message.strip(),
@@ -73,11 +106,7 @@ class EmotionalAgent:
             }
 
         elif emotion == 'happy': # Happy 😃
-            prompt = f"""
-            Generate a simple, fun bonus challenge question about "{topic}".
-            Format: Just the question.
-            """
-            challenge = self._call_gemini(prompt) or f"Can you explain {topic} to a 5-year-old?"
+            challenge = self._text('happy', topic, wait) or f"Can you explain {topic} to a 5-year-old?"
             return {
                 "type": "challenge",
                 "content": challenge.strip(),
@@ -85,11 +114,7 @@ class EmotionalAgent:
             }
 
         elif emotion == 'enthusiastic': # Enthusiastic 🤩
-            prompt = f"""
-            Generate a thought-provoking advanced concept extension or mini-challenge related to "{topic}".
-            Tone: Exciting and challenging. Max 2 sentences.
-            """
-            challenge = self._call_gemini(prompt) or f"Ready to dive deeper into {topic}?"
+            challenge = self._text('enthusiastic', topic, wait) or f"Ready to dive deeper into {topic}?"
             return {
                 "type": "challenge",
                 "content": challenge.strip(),
@@ -0,0 +1,171 @@
+import re
+import threading
+
+# Routes from the app map in AIAssistant.system_prompt
+ROUTES = [
+    {
+        "intent": "nav_dashboard",
+        "target": "/",
+        "keywords": ["dashboard", "home", "main page", "hub", "study plan", "knowledge graph"],
+        "message": "Heading to your Dashboard, where your personalized study plan and knowledge graph live."
+    },
+    {
+        "intent": "nav_tutor",
+        "target": "/tutor",
+        "keywords": ["tutor", "lesson", "lessons", "quiz", "quizzes"],
+        "message": "Opening the AI Tutor. Enter a topic or pick one from your plan to get a lesson and quiz."
+    },
+    {
+        "intent": "nav_progress",
+        "target": "/progress",
+        "keywords": ["progress", "analytics", "stats", "statistics", "badges", "streak"],
+        "message": "Here's your Progress page with detailed analytics of your learning journey."
+    },
+    {
+        "intent": "nav_settings",
+        "target": "/settings",
+        "keywords": ["settings", "preferences", "profile", "theme", "notifications", "account"],
+        "message": "Opening Settings, where you can update your profile and preferences."
+    },
+]
+
+# Words that make a message a navigation request
+NAV_CUES = ["go to", "goto", "take me", "bring me", "open", "navigate", "show me", "where is", "where are",
+            "where's", "where can i find", "how do i get to", "switch to", "jump to", "back to"]
+
+FAQS = [
+    {
+        "intent": "faq_capabilities",
+        "examples": ["what can you do", "help", "how can you help me", "who are you", "what are you"],
+        "message": "I'm the Neon Guide! I can take you anywhere in the app (Dashboard, AI Tutor, Progress, "
+                   "Settings) and answer questions about how it works or what you're learning."
+    },
+    {
+        "intent": "faq_study_plan",
+        "examples": ["what is the study plan", "how does the study plan work", "how is my study plan made",
+                     "what is a personalized study plan"],
+        "message": "Your study plan orders concepts by their prerequisites in the knowledge graph. Concepts "
+                   "unlock as you complete what they build on.",
+        "action": "navigate",
+        "target": "/"
+    },
+    {
+        "intent": "faq_knowledge_graph",
+        "examples": ["what is the knowledge graph", "what does the knowledge graph show",
+                     "how do i read the knowledge graph"],
+        "message": "The knowledge graph shows every concept in your domain and how they depend on each other, "
+                   "colored by your progress.",
+        "action": "navigate",
+        "target": "/"
+    },
+    {
+        "intent": "faq_quiz",
+        "examples": ["how do quizzes work", "how does the quiz work", "how do i pass a quiz",
+                     "how do i complete a concept"],
+        "message": "After reading a lesson in the AI Tutor, take its 5-question quiz. Scoring 70% or more "
+                   "marks the concept complete and unlocks what comes next.",
+        "action": "navigate",
+        "target": "/tutor"
+    },
+    {
+        "intent": "faq_change_domain",
+        "examples": ["how do i change my domain", "how do i switch subjects", "how do i change subject",
+                     "can i learn another domain"],
+        "message": "You can switch your learning domain from the Dashboard; your study plan updates right away.",
+        "action": "navigate",
+        "target": "/"
+    },
+    {
+        "intent": "faq_badges",
+        "examples": ["how do i earn badges", "what are badges", "how do badges work", "how does my streak work"],
+        "message": "Badges reward milestones like completing concepts and keeping a daily learning streak. "
+                   "See yours on the Progress page.",
+        "action": "navigate",
+        "target": "/progress"
+    },
+]
+
+STOPWORDS = {"a", "an", "the", "i", "me", "my", "to", "is", "are", "do", "does", "can", "you", "please",
+             "of", "in", "on", "for", "it", "this", "that", "and", "or", "be", "with", "hey", "hi"}
+
+TOKEN = re.compile(r"[a-z0-9']+")
+
+
+def tokenize(text):
+    return [t for t in TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class IntentRouter:
+    """
+    Local fast path for assistant chat: answers navigation requests and
+    common questions about the app without an LLM call.
+
+    route() returns the same {message, action, target} shape as
+    AIAssistant.chat, or None when no intent is matched with at least
+    `threshold` confidence so the message should go to the LLM.
+    """
+    def __init__(self, routes=ROUTES, faqs=FAQS, threshold=0.6, max_words=14):
+        self.routes = routes
+        self.faqs = faqs
+        self.threshold = threshold
+        self.max_words = max_words # Longer messages are real questions, not commands
+
+        self._route_patterns = [
+            (route, re.compile(r"\b(" + "|".join(re.escape(k) for k in route["keywords"]) + r")\b"))
+            for route in routes
+        ]
+        self._nav_cue = re.compile(r"(^|\b)(" + "|".join(re.escape(c) for c in NAV_CUES) + r")\b")
+        self._faq_examples = [(faq, set(tokenize(example))) for faq in faqs for example in faq["examples"]]
+
+        self._lock = threading.Lock()
+        self.stats = {"routed": 0, "fallthrough": 0, "intents": {}}
+
+    def classify(self, message):
+        """
+        Returns (intent entry, kind, confidence); entry is None if nothing matched.
+        """
+        text = " ".join(message.lower().split())
+        if not text or len(text.split()) > self.max_words:
+            return None, None, 0.0
+
+        matched = [route for route, pattern in self._route_patterns if pattern.search(text)]
+        if len(matched) == 1 and self._nav_cue.search(text):
+            return matched[0], 'route', 1.0
+
+        tokens = set(tokenize(text))
+        candidates = [(None, None, 0.0)]
+        if tokens:
+            for faq, example in self._faq_examples:
+                candidates.append((faq, 'faq', len(tokens & example) / len(tokens | example)))
+        if len(matched) == 1:
+            # A bare page name ("settings") reads as a navigation request;
+            # otherwise the page is only mentioned
+            candidates.append((matched[0], 'route', 0.9 if len(tokens) == 1 else 0.4))
+        return max(candidates, key=lambda candidate: candidate[2])
+
+    def route(self, message):
+        entry, kind, confidence = self.classify(message or "")
+        if entry is None or confidence < self.threshold:
+            with self._lock:
+                self.stats["fallthrough"] += 1
+            return None
+
+        with self._lock:
+            self.stats["routed"] += 1
+            self.stats["intents"][entry["intent"]] = self.stats["intents"].get(entry["intent"], 0) + 1
+
+        if kind == 'route':
+            return {"message": entry["message"], "action": "navigate", "target": entry["target"]}
+        response = {"message": entry["message"], "action": entry.get("action", "none")}
+        if response["action"] == "navigate":
+            response["target"] = entry["target"]
+        return response
+
+    def metrics(self):
+        with self._lock:
+            total = self.stats["routed"] + self.stats["fallthrough"]
+            return dict(
+                self.stats,
+                intents=dict(self.stats["intents"]),
+                hit_rate=round(self.stats["routed"] / total, 3) if total else 0
+            )
@@ -1,11 +1,51 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import json
-from models import db, Interaction
+from sqlalchemy import insert, delete
+from models import db, Interaction, InteractionReceipt, dialect_insert
+from .interaction_rollups import InteractionRollups
+from .write_behind import WriteBehindQueue
+
+# Keys stored in their own columns rather than in `details`
+RESERVED_KEYS = ['concept_id', 'action', 'is_correct', 'response_time_ms', 'timestamp', 'idempotency_key']
+# Length of InteractionReceipt.idempotency_key
+MAX_IDEMPOTENCY_KEY = 64
+# How long idempotency keys are remembered, i.e. how late a batch may be retried
+RECEIPT_RETENTION_DAYS = 7
 
 class InteractionLogger:
-    def __init__(self, learner_profile_manager):
+    def __init__(self, learner_profile_manager, affective_stream=None):
         # lp_manager is kept for compatibility if needed, but we write to DB directly
         self.lp_manager = learner_profile_manager
+        self.rollups = InteractionRollups(db)
+        self.write_behind = None
+        # In-memory affective windows, updated on every logged interaction
+        self.affective_stream = affective_stream
+
+    def enable_write_behind(self, app, **options):
+        """
+        Switches log_interaction to asynchronous, grouped writes (see
+        WriteBehindQueue for the options). Queued events stay visible to
+        LearnerProfile.get_learner until they are committed.
+        """
+        self.write_behind = WriteBehindQueue(app, self._write_group, **options).start()
+        self.lp_manager.pending_source = self.pending_interactions
+        return self.write_behind
+
+    def pending_interactions(self, learner_id):
+        if self.write_behind is None:
+            return []
+        return [pending_to_dict(item) for item in self.write_behind.pending_for(learner_id)]
+
+    def _build_row(self, learner_id, interaction_data, timestamp):
+        return {
+            "user_id": learner_id,
+            "concept_id": interaction_data.get('concept_id'),
+            "action": interaction_data.get('action'),
+            "is_correct": stored_is_correct(interaction_data),
+            "response_time_ms": interaction_data.get('response_time_ms', 0),
+            "timestamp": timestamp,
+            "details": json.dumps({k:v for k,v in interaction_data.items() if k not in RESERVED_KEYS})
+        }
 
     def log_interaction(self, learner_id, interaction_data):
         """
@@ -17,17 +57,140 @@ class InteractionLogger:
             "timestamp": isoformat str (optional)
         }
         """
-        new_interaction = Interaction(
-            user_id=learner_id,
-            concept_id=interaction_data.get('concept_id'),
-            action=interaction_data.get('action'),
-            is_correct=interaction_data.get('is_correct', False),
-            response_time_ms=interaction_data.get('response_time_ms', 0),
-            timestamp=datetime.utcnow(), # Use server time
-            details=json.dumps({k:v for k,v in interaction_data.items() if k not in ['concept_id', 'action', 'is_correct', 'response_time_ms']})
-        )
-        
+        now = datetime.utcnow() # Use server time
+        if self.write_behind is not None:
+            item = dict(interaction_data, timestamp=now)
+            if self.write_behind.enqueue(learner_id, item):
+                logged = pending_to_dict(item)
+                if self.affective_stream is not None:
+                    self.affective_stream.record(learner_id, logged)
+                return logged
+            # Queue is full: fall through and write synchronously
+
+        row = self._build_row(learner_id, interaction_data, now)
+        new_interaction = Interaction(**row)
+
         db.session.add(new_interaction)
+        # Rollups are updated in the same transaction as the row itself
+        self.rollups.record([row])
+        db.session.commit()
+
+        logged = new_interaction.to_dict()
+        if self.affective_stream is not None:
+            self.affective_stream.record(learner_id, logged)
+        return logged
+
+    def log_interactions(self, learner_id, interactions, commit=True):
+        """
+        Ingests a batch of interactions in one transaction with a single
+        multi-row INSERT.
+
+        Each item has the same shape as for log_interaction, plus:
+        - "timestamp": client-side isoformat time of the event (server time if missing)
+        - "idempotency_key": optional; items whose key was already ingested
+          for this learner are skipped, so clients can safely retry a batch
+          (for as long as purge_receipts keeps the key).
+
+        Returns (accepted rows, number of duplicates skipped). Raises ValueError
+        naming the offending item on a timestamp that isn't an isoformat string
+        or an idempotency key longer than MAX_IDEMPOTENCY_KEY; nothing is
+        written then. With commit=False the rows are only staged in the
+        current session.
+        """
+        now = datetime.utcnow()
+        rows = []
+        keys = {}
+        duplicates = 0
+        for i, item in enumerate(interactions):
+            key = item.get('idempotency_key')
+            if key is not None:
+                key = str(key)
+                if len(key) > MAX_IDEMPOTENCY_KEY:
+                    raise ValueError(f"Interaction {i}: idempotency_key is longer than {MAX_IDEMPOTENCY_KEY} characters")
+                if key in keys:
+                    duplicates += 1
+                    continue
+                keys[key] = len(rows)
+            try:
+                timestamp = self._parse_timestamp(item.get('timestamp'), now)
+            except ValueError as e:
+                raise ValueError(f"Interaction {i}: invalid timestamp: {e}") from None
+            rows.append(self._build_row(learner_id, item, timestamp))
+
+        if keys:
+            # Claim the keys first; RETURNING only yields keys not seen before,
+            # which also holds when two requests race with the same batch
+            stmt = dialect_insert(InteractionReceipt).values(
+                [{"user_id": learner_id, "idempotency_key": key, "received_at": now} for key in keys]
+            ).on_conflict_do_nothing().returning(InteractionReceipt.idempotency_key)
+            claimed = set(db.session.execute(stmt).scalars())
+            skipped = {keys[key] for key in keys if key not in claimed}
+            if skipped:
+                duplicates += len(skipped)
+                rows = [row for i, row in enumerate(rows) if i not in skipped]
+
+        if rows:
+            db.session.execute(insert(Interaction), rows)
+            self.rollups.record(rows)
+        if commit:
+            db.session.commit()
+        if rows and self.affective_stream is not None:
+            # Client timestamps may interleave with history, so rebuild the
+            # window from the database on next read
+            self.affective_stream.invalidate(learner_id)
+
+        return rows, duplicates
+
+    def purge_receipts(self, retention_days=RECEIPT_RETENTION_DAYS, now=None):
+        """
+        Deletes idempotency receipts older than `retention_days`; returns how
+        many were deleted.
+        """
+        cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+        result = db.session.execute(delete(InteractionReceipt).where(InteractionReceipt.received_at < cutoff))
         db.session.commit()
-        
-        return new_interaction.to_dict()
+        return result.rowcount
+
+    def _write_group(self, by_learner):
+        # One transaction for everything the write-behind thread collected
+        try:
+            for learner_id, items in by_learner.items():
+                self.log_interactions(learner_id, items, commit=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def _parse_timestamp(self, value, default):
+        if value is None or value == '':
+            return default
+        if isinstance(value, datetime):
+            ts = value
+        elif isinstance(value, str):
+            ts = datetime.fromisoformat(value)
+        else:
+            raise ValueError(f"expected an isoformat string, got {type(value).__name__}")
+        if ts.tzinfo is not None:
+            ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+        return ts
+
+
+def stored_is_correct(interaction_data):
+    # The ORM writes the column default (False) for a missing or None value;
+    # rollups and queued events must see the same
+    value = interaction_data.get('is_correct')
+    return False if value is None else value
+
+
+def pending_to_dict(item):
+    """
+    Renders a queued, not yet written interaction like Interaction.to_dict().
+    """
+    return {
+        "concept_id": item.get('concept_id'),
+        "action": item.get('action'),
+        "is_correct": stored_is_correct(item),
+        "response_time_ms": item.get('response_time_ms', 0),
+        "timestamp": item['timestamp'].isoformat(),
+        "details": {k: v for k, v in item.items() if k not in RESERVED_KEYS}
+    }
@@ -0,0 +1,145 @@
+from sqlalchemy import func, case, select, insert, delete
+from models import Interaction, LearnerStats, ConceptStats, DailyActivity, dialect_insert
+from .affective_analyzer import is_error
+
+
+def _is_incorrect(row):
+    # Same rule as AffectiveAnalyzer
+    return is_error(row.get('is_correct'))
+
+
+def _later(column, excluded):
+    return case((excluded > column, excluded), else_=column)
+
+
+def _earlier(column, excluded):
+    return case((excluded < column, excluded), else_=column)
+
+
+class InteractionRollups:
+    """
+    Keeps learner_stats, learner_concept_stats and learner_daily_activity in
+    step with the interactions table, so read paths touch a handful of rows
+    instead of a learner's whole history.
+    """
+    def __init__(self, db):
+        self.db = db
+
+    def record(self, rows):
+        """
+        Adds interaction rows (dicts with user_id, concept_id, is_correct,
+        response_time_ms and timestamp) to the rollups. Runs in the caller's
+        session, so the counters commit in the same transaction as the rows.
+        """
+        learners = {}
+        concepts = {}
+        days = {}
+        for row in rows:
+            user_id = row['user_id']
+            ts = row['timestamp']
+            errors = 1 if _is_incorrect(row) else 0
+            time_ms = row.get('response_time_ms') or 0
+
+            stats = learners.setdefault(user_id, {
+                "user_id": user_id, "interaction_count": 0, "incorrect_count": 0,
+                "total_response_time_ms": 0, "first_interaction_at": ts, "last_interaction_at": ts
+            })
+            stats["interaction_count"] += 1
+            stats["incorrect_count"] += errors
+            stats["total_response_time_ms"] += time_ms
+            stats["first_interaction_at"] = min(stats["first_interaction_at"], ts)
+            stats["last_interaction_at"] = max(stats["last_interaction_at"], ts)
+
+            concept = concepts.setdefault((user_id, row['concept_id']), {
+                "user_id": user_id, "concept_id": row['concept_id'],
+                "attempt_count": 0, "error_count": 0, "last_seen_at": ts
+            })
+            concept["attempt_count"] += 1
+            concept["error_count"] += errors
+            concept["last_seen_at"] = max(concept["last_seen_at"], ts)
+
+            day = days.setdefault((user_id, ts.date()), {
+                "user_id": user_id, "day": ts.date(), "interaction_count": 0, "total_response_time_ms": 0
+            })
+            day["interaction_count"] += 1
+            day["total_response_time_ms"] += time_ms
+
+        if not learners:
+            return
+
+        # Keys are unique within each statement, so one upsert per table is enough
+        stmt = dialect_insert(LearnerStats).values(list(learners.values()))
+        t, ex = LearnerStats, stmt.excluded
+        self.db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[t.user_id],
+            set_={
+                "interaction_count": t.interaction_count + ex.interaction_count,
+                "incorrect_count": t.incorrect_count + ex.incorrect_count,
+                "total_response_time_ms": t.total_response_time_ms + ex.total_response_time_ms,
+                "first_interaction_at": _earlier(t.first_interaction_at, ex.first_interaction_at),
+                "last_interaction_at": _later(t.last_interaction_at, ex.last_interaction_at)
+            }
+        ))
+
+        stmt = dialect_insert(ConceptStats).values(list(concepts.values()))
+        t, ex = ConceptStats, stmt.excluded
+        self.db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[t.user_id, t.concept_id],
+            set_={
+                "attempt_count": t.attempt_count + ex.attempt_count,
+                "error_count": t.error_count + ex.error_count,
+                "last_seen_at": _later(t.last_seen_at, ex.last_seen_at)
+            }
+        ))
+
+        stmt = dialect_insert(DailyActivity).values(list(days.values()))
+        t, ex = DailyActivity, stmt.excluded
+        self.db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[t.user_id, t.day],
+            set_={
+                "interaction_count": t.interaction_count + ex.interaction_count,
+                "total_response_time_ms": t.total_response_time_ms + ex.total_response_time_ms
+            }
+        ))
+
+    def backfill(self, user_id=None):
+        """
+        Rebuilds the rollups from the interactions table, for one learner or
+        for everyone, with set-based INSERT ... SELECT statements.
+        """
+        session = self.db.session
+        errors = func.sum(case((Interaction.is_correct.is_(False), 1), else_=0))
+        total_time = func.coalesce(func.sum(Interaction.response_time_ms), 0)
+        day = func.date(Interaction.timestamp)
+
+        def scoped(query):
+            return query.where(Interaction.user_id == user_id) if user_id is not None else query
+
+        for model in (LearnerStats, ConceptStats, DailyActivity):
+            stmt = delete(model)
+            if user_id is not None:
+                stmt = stmt.where(model.user_id == user_id)
+            session.execute(stmt)
+
+        session.execute(insert(LearnerStats).from_select(
+            ["user_id", "interaction_count", "incorrect_count", "total_response_time_ms",
+             "first_interaction_at", "last_interaction_at"],
+            scoped(select(
+                Interaction.user_id, func.count(Interaction.id), errors, total_time,
+                func.min(Interaction.timestamp), func.max(Interaction.timestamp)
+            )).group_by(Interaction.user_id)
+        ))
+        session.execute(insert(ConceptStats).from_select(
+            ["user_id", "concept_id", "attempt_count", "error_count", "last_seen_at"],
+            scoped(select(
+                Interaction.user_id, Interaction.concept_id, func.count(Interaction.id), errors,
+                func.max(Interaction.timestamp)
+            )).group_by(Interaction.user_id, Interaction.concept_id)
+        ))
+        session.execute(insert(DailyActivity).from_select(
+            ["user_id", "day", "interaction_count", "total_response_time_ms"],
+            scoped(select(
+                Interaction.user_id, day, func.count(Interaction.id), total_time
+            )).group_by(Interaction.user_id, day)
+        ))
+        session.commit()
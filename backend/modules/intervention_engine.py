@@ -4,9 +4,10 @@ class InterventionEngine:
     def __init__(self):
         self.rl_agent = RLAgent()
 
-    def get_intervention(self, affective_state, current_concept):
-        # Use RL Agent to choose action based on state
-        action = self.rl_agent.choose_action(affective_state)
+    def get_intervention(self, affective_state, current_concept, context=None):
+        # Use RL Agent to choose action based on state; `context` from
+        # build_context gives the agent the full learner situation
+        action = self.rl_agent.choose_action(context or affective_state)
         
         # Map RL actions to intervention objects
         if action == "hint":
@@ -0,0 +1,267 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from .content_cache import CACHE_DIR
+
+
+class RetryableJobError(Exception):
+    """
+    Raised by a job handler for a transient failure. The job is retried with
+    backoff; once out of attempts it finishes with `fallback` as its result if
+    one is given, and fails otherwise.
+    """
+    def __init__(self, message, fallback=None):
+        super().__init__(message)
+        self.fallback = fallback
+
+
+class JobQueue:
+    """
+    Durable queue for slow work (LLM calls) that would otherwise hold a web
+    worker for the whole round trip.
+
+    Jobs live in a SQLite file shared by every worker process and are run by
+    a pool of `workers` threads per process, each job by exactly one of them.
+    Submitting a job whose key matches a queued or running job returns that
+    job instead. A job still running after `lease` seconds (its process died)
+    is picked up again. Finished jobs are kept for `result_ttl` seconds so
+    clients can fetch the result.
+    """
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+    def __init__(self, path=None, workers=4, max_attempts=3, retry_backoff=2,
+                 lease=300, result_ttl=3600, poll_interval=1):
+        self.path = path or os.path.join(CACHE_DIR, 'jobs.sqlite3')
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.lease = lease
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+
+        self._handlers = {}
+        self._threads = []
+        self._stopping = False
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock) # Notified on submit and on finish
+        self._last_purge = 0
+        self.stats = {"submitted": 0, "deduplicated": 0, "completed": 0, "failed": 0, "retried": 0,
+                      "lost_leases": 0, "wait_ms": 0.0, "run_ms": 0.0, "max_wait_ms": 0.0, "max_run_ms": 0.0}
+
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, key TEXT, payload TEXT NOT NULL,"
+            " status TEXT NOT NULL, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL, run_after REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        # At most one live job per key, across processes
+        self._db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_jobs_live_key ON jobs (key)"
+            " WHERE key IS NOT NULL AND status IN ('queued', 'running')"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status_run_after ON jobs (status, run_after)")
+
+    def register(self, kind, handler):
+        """
+        `handler(payload)` runs a job of this kind and returns its
+        JSON-serializable result.
+        """
+        self._handlers[kind] = handler
+
+    def start(self):
+        # Cheap once running, so it can be called on every request
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping = False
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        with self._lock:
+            self._stopping = True
+            self._changed.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def submit(self, kind, payload, key=None):
+        """
+        Queues a job and returns it as a dict. `key` identifies the work
+        (e.g. the prompt); a live job with the same kind and key is returned
+        instead of queueing another.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind {kind!r}")
+        key = f"{kind}|{key}" if key is not None else None
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT INTO jobs (id, kind, key, payload, status, created_at, run_after)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, key, json.dumps(payload), self.QUEUED, now, now)
+                )
+            except sqlite3.IntegrityError:
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE key = ? AND status IN (?, ?)", (key, self.QUEUED, self.RUNNING)
+                ).fetchone()
+                if row is not None:
+                    self.stats["deduplicated"] += 1
+                    return self._get(row[0])
+                raise
+            self.stats["submitted"] += 1
+            self._changed.notify()
+            return self._get(job_id)
+
+    def get(self, job_id):
+        """
+        Returns {id, kind, status, result, error, attempts, created_at,
+        finished_at}, or None for an unknown or purged job.
+        """
+        with self._lock:
+            return self._get(job_id)
+
+    def wait(self, job_id, timeout):
+        """
+        Waits up to `timeout` seconds for the job to finish and returns it
+        (finished or not), or None if it is unknown.
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                job = self._get(job_id)
+                remaining = deadline - time.monotonic()
+                if job is None or job['status'] in (self.DONE, self.FAILED) or remaining <= 0:
+                    return job
+                # Jobs finished by another process are only seen by polling
+                self._changed.wait(min(remaining, self.poll_interval))
+
+    def _get(self, job_id):
+        row = self._db.execute(
+            "SELECT id, kind, status, result, error, attempts, created_at, finished_at FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0], "kind": row[1], "status": row[2],
+            "result": json.loads(row[3]) if row[3] is not None else None,
+            "error": row[4], "attempts": row[5], "created_at": row[6], "finished_at": row[7]
+        }
+
+    def _work(self):
+        while True:
+            with self._lock:
+                if self._stopping:
+                    return
+                job = self._claim()
+                if job is None:
+                    self._changed.wait(self.poll_interval)
+                    continue
+            self._run(*job)
+
+    def _claim(self):
+        # Called with the lock held. The conditional UPDATE makes the claim
+        # atomic across processes sharing the file.
+        now = time.time()
+        if now - self._last_purge > 60:
+            self._last_purge = now
+            self._db.execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                             (self.DONE, self.FAILED, now - self.result_ttl))
+        rows = self._db.execute(
+            "SELECT id, status, started_at, run_after FROM jobs"
+            " WHERE (status = ? AND run_after <= ?) OR (status = ? AND started_at < ?)"
+            " ORDER BY run_after LIMIT 8",
+            (self.QUEUED, now, self.RUNNING, now - self.lease)
+        ).fetchall()
+        for job_id, status, started_at, run_after in rows:
+            claimed = self._db.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1"
+                " WHERE id = ? AND status = ? AND started_at IS ?",
+                (self.RUNNING, now, job_id, status, started_at)
+            ).rowcount
+            if claimed:
+                kind, payload, attempts, created_at = self._db.execute(
+                    "SELECT kind, payload, attempts, created_at FROM jobs WHERE id = ?", (job_id,)
+                ).fetchone()
+                self._count("wait_ms", (now - max(created_at, run_after)) * 1000)
+                return job_id, kind, json.loads(payload), attempts, now
+        return None
+
+    def _run(self, job_id, kind, payload, attempts, claimed_at):
+        start = time.perf_counter()
+        status, result, error, retry_at = self.DONE, None, None, None
+        try:
+            result = self._handlers[kind](payload)
+        except RetryableJobError as e:
+            error = str(e)
+            if attempts < self.max_attempts:
+                status, retry_at = self.QUEUED, time.time() + self.retry_backoff * 2 ** (attempts - 1)
+            elif e.fallback is not None:
+                result = e.fallback
+            else:
+                status = self.FAILED
+        except Exception as e:
+            print(f"Job {job_id} ({kind}) failed: {e}")
+            status, error = self.FAILED, str(e)
+
+        with self._lock:
+            self._count("run_ms", (time.perf_counter() - start) * 1000)
+            # Only if the job is still ours: after the lease expired another
+            # worker may have claimed it again, and its outcome wins
+            if status == self.QUEUED:
+                updated = self._db.execute(
+                    "UPDATE jobs SET status = ?, error = ?, run_after = ? WHERE id = ? AND started_at = ?",
+                    (status, error, retry_at, job_id, claimed_at)
+                ).rowcount
+            else:
+                updated = self._db.execute(
+                    "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?"
+                    " WHERE id = ? AND started_at = ?",
+                    (status, json.dumps(result) if result is not None else None, error, time.time(), job_id,
+                     claimed_at)
+                ).rowcount
+            if not updated:
+                self.stats["lost_leases"] += 1
+                print(f"Job {job_id} ({kind}) was claimed again after its lease expired; dropping this outcome")
+            elif status == self.QUEUED:
+                self.stats["retried"] += 1
+            else:
+                self.stats["completed" if status == self.DONE else "failed"] += 1
+            self._changed.notify_all()
+
+    def _count(self, name, ms):
+        # Called with the lock held
+        self.stats[name] += ms
+        self.stats[f"max_{name}"] = max(self.stats[f"max_{name}"], ms)
+
+    def metrics(self):
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            started = self.stats["completed"] + self.stats["failed"] + self.stats["retried"]
+            return dict(
+                self.stats,
+                depth=counts.get(self.QUEUED, 0),
+                running=counts.get(self.RUNNING, 0),
+                workers=len(self._threads),
+                wait_ms=round(self.stats["wait_ms"], 1),
+                run_ms=round(self.stats["run_ms"], 1),
+                max_wait_ms=round(self.stats["max_wait_ms"], 1),
+                max_run_ms=round(self.stats["max_run_ms"], 1),
+                avg_wait_ms=round(self.stats["wait_ms"] / started, 1) if started else 0,
+                avg_run_ms=round(self.stats["run_ms"] / started, 1) if started else 0
+            )
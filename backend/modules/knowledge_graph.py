@@ -1,72 +1,194 @@
 import networkx as nx
 import json
 import os
+import threading
+from types import MappingProxyType
+
+from .compact_graph import CompactGraph
+
+MOCK_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'mock_data')
+
+
+def resolve_graph_path(domain, data_dir=MOCK_DATA_DIR):
+    """
+    Maps a domain name to its graph file, or None if no graph exists for it.
+    """
+    file_path = os.path.join(data_dir, f'{domain.lower().replace(" ", "_")}_graph.json')
+
+    if not os.path.exists(file_path):
+        # Fallback for "programming" or "mathematics" short names
+        if "prog" in domain.lower():
+            file_path = os.path.join(data_dir, 'programming_graph.json')
+        elif "math" in domain.lower():
+            file_path = os.path.join(data_dir, 'mathematics_graph.json')
+        elif "data" in domain.lower():
+            file_path = os.path.join(data_dir, 'data_science_graph.json')
+        else:
+            return None
+    return file_path
+
+
+def read_graph_data(file_path):
+    with open(file_path, 'r') as f:
+        data = json.load(f)
+        # Normalize data structure
+        if 'concepts' in data and 'nodes' not in data:
+            data['nodes'] = data['concepts']
+        return data
+
+
+def build_graph(data):
+    G = nx.DiGraph()
+    if not data: return G
+
+    # Handle "nodes" and "edges" format (Programming Graph)
+    if 'nodes' in data:
+        for node in data.get('nodes', []):
+            G.add_node(node['id'], **node)
+        for edge in data.get('edges', []):
+            G.add_edge(edge['source'], edge['target'])
+
+    # Handle "concepts" and "prerequisites" format (Data Science/Math Graph)
+    elif 'concepts' in data:
+        for concept in data.get('concepts', []):
+            # Add node
+            G.add_node(concept['id'], **concept)
+            # Add edges from prerequisites
+            for prereq in concept.get('prerequisites', []):
+                G.add_edge(prereq, concept['id'])
+
+    return G
+
+
+class CompiledGraph:
+    """
+    Read-only snapshot of one graph file, with everything the request path
+    needs computed up front. Snapshots are shared between requests and
+    threads, so nothing reachable from one may be mutated.
+    """
+    __slots__ = ('path', 'signature', 'graph', 'nodes', 'node_lookup', 'node_data',
+                 'topo_order', 'predecessors', 'node_link', 'compact')
+
+    def __init__(self, path=None, signature=None, data=None):
+        self.path = path
+        self.signature = signature
+
+        graph = build_graph(data)
+        nx.freeze(graph)
+        self.graph = graph
+
+        # Concepts in file order; node_lookup keeps the first entry per id,
+        # matching the linear scan it replaces
+        self.nodes = tuple(data['nodes']) if data else ()
+        lookup = {}
+        for node in self.nodes:
+            lookup.setdefault(node['id'], node)
+        self.node_lookup = MappingProxyType(lookup)
+        self.node_data = MappingProxyType(dict(graph.nodes(data=True)))
+
+        try:
+            self.topo_order = tuple(nx.topological_sort(graph))
+        except nx.NetworkXUnfeasible:
+            self.topo_order = None # Cycle detected
+
+        self.predecessors = MappingProxyType({n: frozenset(graph.predecessors(n)) for n in graph})
+        self.node_link = nx.node_link_data(graph)
+        self.compact = CompactGraph(graph, self.node_lookup, self.topo_order)
+
+
+class GraphRegistry:
+    """
+    Process-wide cache of compiled knowledge graphs.
+
+    Each graph file is parsed and compiled once; later lookups only stat the
+    file and recompile when its mtime, size or inode has changed on disk.
+    """
+    def __init__(self, data_dir=MOCK_DATA_DIR):
+        self.data_dir = data_dir
+        self._paths = {} # domain -> resolved file path
+        self._compiled = {} # file path -> CompiledGraph
+        self._empty = CompiledGraph()
+        self._lock = threading.Lock()
+
+    def get(self, domain):
+        path = self._paths.get(domain)
+        signature = self._stat(path) if path else None
+        if signature is None:
+            # Unresolved yet, or the file went away: resolve again
+            path = resolve_graph_path(domain, self.data_dir)
+            if path is None:
+                return self._empty
+            signature = self._stat(path)
+            if signature is None:
+                return self._empty
+            self._paths[domain] = path
+
+        compiled = self._compiled.get(path)
+        if compiled is not None and compiled.signature == signature:
+            return compiled
+
+        with self._lock:
+            compiled = self._compiled.get(path)
+            if compiled is None or compiled.signature != signature:
+                compiled = CompiledGraph(path, signature, read_graph_data(path))
+                self._compiled[path] = compiled
+            return compiled
+
+    def invalidate(self, domain=None):
+        with self._lock:
+            if domain is None:
+                self._paths.clear()
+                self._compiled.clear()
+            else:
+                path = self._paths.pop(domain, None)
+                self._compiled.pop(path, None)
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+graph_registry = GraphRegistry()
+
 
 class KnowledgeGraph:
-    def __init__(self, domain):
+    def __init__(self, domain, registry=None):
         self.domain = domain
-        self.graph = nx.DiGraph()
-        self.nodes_data = {}
+        self.registry = registry or graph_registry
         self.load_graph()
 
     def load_graph(self):
-        self.graph = self.build_graph(self.load_graph_data(self.domain))
-        # Populate nodes_data
-        for node in self.graph.nodes(data=True):
-            self.nodes_data[node[0]] = node[1]
+        self.compiled = self.registry.get(self.domain)
+        self.graph = self.compiled.graph
+        self.nodes_data = self.compiled.node_data
 
-    def load_graph_data(self, domain):
-        # Determine path to mock data
-        base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        file_path = os.path.join(base_path, 'data', 'mock_data', f'{domain.lower().replace(" ", "_")}_graph.json')
-        
-        if not os.path.exists(file_path):
-            # Fallback for "programming" or "mathematics" short names
-            if "prog" in domain.lower():
-                file_path = os.path.join(base_path, 'data', 'mock_data', 'programming_graph.json')
-            elif "math" in domain.lower():
-                file_path = os.path.join(base_path, 'data', 'mock_data', 'mathematics_graph.json')
-            elif "data" in domain.lower():
-                file_path = os.path.join(base_path, 'data', 'mock_data', 'data_science_graph.json')
-            else:
-                return None # Return None instead of raising error for safer handling
+    def snapshot(self, domain=None):
+        """
+        Returns the compiled graph for `domain` (defaults to this graph's domain).
+        """
+        if domain is None or domain == self.domain:
+            return self.compiled
+        return self.registry.get(domain)
 
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-            # Normalize data structure
-            if 'concepts' in data and 'nodes' not in data:
-                data['nodes'] = data['concepts']
-            return data
+    def load_graph_data(self, domain):
+        file_path = resolve_graph_path(domain, self.registry.data_dir)
+        if file_path is None:
+            return None # Return None instead of raising error for safer handling
+        return read_graph_data(file_path)
 
     def build_graph(self, data):
-        G = nx.DiGraph()
-        if not data: return G
-        
-        # Handle "nodes" and "edges" format (Programming Graph)
-        if 'nodes' in data:
-            for node in data.get('nodes', []):
-                G.add_node(node['id'], **node)
-            for edge in data.get('edges', []):
-                G.add_edge(edge['source'], edge['target'])
-        
-        # Handle "concepts" and "prerequisites" format (Data Science/Math Graph)
-        elif 'concepts' in data:
-            for concept in data.get('concepts', []):
-                # Add node
-                G.add_node(concept['id'], **concept)
-                # Add edges from prerequisites
-                for prereq in concept.get('prerequisites', []):
-                    G.add_edge(prereq, concept['id'])
-            
-        return G
+        return build_graph(data)
 
     def get_topological_sort(self):
-        if not nx.is_directed_acyclic_graph(self.graph):
+        if self.compiled.topo_order is None:
             raise ValueError("Graph contains cycles, cannot perform topological sort.")
-        return list(nx.topological_sort(self.graph))
+        return list(self.compiled.topo_order)
 
     def get_node_details(self, node_id):
         return self.nodes_data.get(node_id)
 
     def to_json(self):
-        return nx.node_link_data(self.graph)
+        return self.compiled.node_link
@@ -1,12 +1,16 @@
-from models import User, Interaction
-import json
+from models import User, Interaction, LearnerStats, ConceptStats, DailyActivity, ConceptCompletion, dialect_insert
 import uuid
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, date
 
+# Every skill_level create_learner can assign
+SKILL_LEVELS = ('beginner', 'intermediate', 'advanced')
+
 class LearnerProfile:
     def __init__(self, db):
         self.db = db
+        # Set by InteractionLogger when writes are asynchronous: learner_id -> queued interactions
+        self.pending_source = None
 
     def calculate_age(self, dob_str):
         if not dob_str: return 25
@@ -54,16 +58,84 @@ class LearnerProfile:
         self.db.session.commit()
         return new_user.to_dict()
 
-    def get_learner(self, learner_id):
+    def get_learner(self, learner_id, with_interactions=True, last_n=None, since=None, with_stats=False):
+        """
+        Returns the learner as a dict, or None if they don't exist.
+
+        Callers should only ask for the history they need:
+        - with_interactions=False: profile only, 'interaction_log' is empty.
+        - last_n / since: only the most recent N interactions and/or those at
+          or after `since` (a datetime). The log is always oldest first.
+        - with_stats: adds 'interaction_stats', read from the learner_stats rollup.
+        """
         user = User.query.get(learner_id)
         if user:
             user_dict = user.to_dict()
-            # Fetch interactions
-            interactions = Interaction.query.filter_by(user_id=learner_id).all()
-            user_dict['interaction_log'] = [i.to_dict() for i in interactions]
+            if with_interactions:
+                user_dict['interaction_log'] = self.get_interactions(learner_id, last_n=last_n, since=since)
+            if with_stats:
+                user_dict['interaction_stats'] = self.get_interaction_stats(learner_id)
             return user_dict
         return None
 
+    def get_interactions(self, learner_id, last_n=None, since=None):
+        # Read queued events before the table: an event committed in between
+        # then shows up twice and is deduplicated, rather than not at all
+        pending = self.pending_source(learner_id) if self.pending_source else []
+
+        query = Interaction.query.filter_by(user_id=learner_id)
+        if since is not None:
+            query = query.filter(Interaction.timestamp >= since)
+        if last_n is not None:
+            # Newest first so the (user_id, timestamp) index can stop after N rows
+            rows = query.order_by(Interaction.timestamp.desc(), Interaction.id.desc()).limit(last_n).all()
+            rows.reverse()
+        else:
+            rows = query.order_by(Interaction.timestamp, Interaction.id).all()
+        log = [i.to_dict() for i in rows]
+
+        if pending:
+            seen = {(i['timestamp'], i['concept_id'], i['action']) for i in log}
+            if since is not None:
+                since_iso = since.isoformat()
+                pending = [i for i in pending if i['timestamp'] >= since_iso]
+            log.extend(i for i in pending if (i['timestamp'], i['concept_id'], i['action']) not in seen)
+            if last_n is not None:
+                log = log[-last_n:] if last_n else []
+        return log
+
+    def get_interaction_stats(self, learner_id):
+        stats = LearnerStats.query.get(learner_id)
+        if stats:
+            return stats.to_dict()
+        return LearnerStats(interaction_count=0, incorrect_count=0, total_response_time_ms=0).to_dict()
+
+    def get_interaction_count(self, learner_id):
+        # Committed interactions, from learner_stats: one primary-key lookup
+        count = self.db.session.query(LearnerStats.interaction_count).filter(
+            LearnerStats.user_id == learner_id
+        ).scalar()
+        return count or 0
+
+    def get_concept_error_counts(self, learner_id):
+        """
+        Returns {concept_id: number of incorrect interactions} for concepts with at least one error.
+        """
+        rows = self.db.session.query(ConceptStats.concept_id, ConceptStats.error_count).filter(
+            ConceptStats.user_id == learner_id,
+            ConceptStats.error_count > 0
+        ).all()
+        return {concept_id: errors for concept_id, errors in rows}
+
+    def get_activity_dates(self, learner_id):
+        """
+        Returns the distinct (UTC) dates the learner was active on, newest first.
+        """
+        rows = self.db.session.query(DailyActivity.day).filter(
+            DailyActivity.user_id == learner_id
+        ).order_by(DailyActivity.day.desc()).all()
+        return [day for (day,) in rows]
+
     def get_learner_by_email(self, email):
         user = User.query.filter_by(email=email).first()
         return user.to_dict() if user else None
@@ -74,14 +146,53 @@ class LearnerProfile:
             return user.to_dict()
         return None
 
+    def mark_completed(self, learner_id, concept_ids):
+        """
+        Records completions with a single idempotent INSERT; concepts already
+        completed are left as they are. Safe under concurrent requests.
+        """
+        concept_ids = list(dict.fromkeys(concept_ids))
+        if not concept_ids:
+            return
+        now = datetime.utcnow()
+        self.db.session.execute(dialect_insert(ConceptCompletion).values(
+            [{"user_id": learner_id, "concept_id": cid, "completed_at": now} for cid in concept_ids]
+        ).on_conflict_do_nothing())
+        self.db.session.commit()
+
+    def _replace_completed(self, user, concept_ids):
+        # Full replacement: move everything into concept_completions and
+        # retire the legacy JSON column for this learner
+        keep = set(concept_ids)
+        ConceptCompletion.query.filter(
+            ConceptCompletion.user_id == user.id,
+            ConceptCompletion.concept_id.notin_(keep)
+        ).delete(synchronize_session=False)
+        user.completed_concepts = '[]'
+        if keep:
+            now = datetime.utcnow()
+            self.db.session.execute(dialect_insert(ConceptCompletion).values(
+                [{"user_id": user.id, "concept_id": cid, "completed_at": now} for cid in dict.fromkeys(concept_ids)]
+            ).on_conflict_do_nothing())
+
+    def migrate_legacy_completions(self):
+        """
+        Moves every learner's legacy completed_concepts JSON into
+        concept_completions. Returns the number of learners migrated.
+        """
+        users = User.query.filter(User.completed_concepts.notin_(['[]', ''])).all()
+        for user in users:
+            self.update_learner(user.id, {'completed_concepts': user.completed_concept_ids()})
+        return len(users)
+
     def update_learner(self, learner_id, updates):
         user = User.query.get(learner_id)
         if user:
             for key, value in updates.items():
                 if key == 'completed_concepts':
-                    user.completed_concepts = json.dumps(value)
+                    self._replace_completed(user, value)
                 elif hasattr(user, key):
                     setattr(user, key, value)
             self.db.session.commit()
-            return self.get_learner(learner_id) # Return full dict with interactions
+            return self.get_learner(learner_id, with_interactions=False)
         return None
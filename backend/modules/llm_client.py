@@ -0,0 +1,309 @@
+import json
+import os
+import threading
+import time
+
+import requests
+from flask import has_request_context
+from requests.adapters import HTTPAdapter
+
+from .rate_governor import RateGovernor
+
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+DEFAULT_MODEL = "gemini-pro"
+
+
+class LLMError(Exception):
+    """
+    Raised when an LLM call fails. status_code is the upstream HTTP status,
+    or None for connection errors, timeouts and malformed responses.
+    """
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after # Seconds, when upstream said so
+
+
+class LLMUnavailable(LLMError):
+    """
+    Raised without calling upstream: the circuit breaker is open, the rate
+    limit or concurrency limit can't be met in time, or the budget is spent.
+    """
+
+
+def parse_retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMResponse:
+    __slots__ = ('text', 'latency_ms', 'prompt_tokens', 'output_tokens', 'raw')
+
+    def __init__(self, text, latency_ms, prompt_tokens, output_tokens, raw):
+        self.text = text
+        self.latency_ms = latency_ms
+        self.prompt_tokens = prompt_tokens
+        self.output_tokens = output_tokens
+        self.raw = raw
+
+
+class LLMClient:
+    """
+    Shared Gemini client for every module that talks to the LLM.
+
+    Calls go through one requests.Session, so connections (and their TLS
+    handshakes) are reused from a keep-alive pool. Every call has connect and
+    read timeouts, and at most `max_concurrency` calls are in flight across
+    all threads; callers beyond that wait for a free slot.
+
+    Admission goes through a RateGovernor (token bucket and circuit breaker)
+    shared by all callers, and each call is bounded by a deadline budget, so
+    a throttled or unhealthy upstream costs callers little time. Calls made
+    while handling a Flask request get `budget` (LLM_REQUEST_BUDGET_S, a few
+    seconds) and fail fast to the caller's fallback rather than pile up
+    request threads; background work (job workers, pool refills,
+    pre-generation) gets the longer `background_budget`.
+
+    The endpoint can be pointed at a local stub with GEMINI_BASE_URL, and the
+    model chosen with GEMINI_MODEL.
+    """
+    def __init__(self, api_key, base_url=None, model=None, pool_size=10, max_concurrency=8,
+                 connect_timeout=3.05, read_timeout=60, governor=None, budget=None,
+                 background_budget=None, max_retries=2, retry_backoff=1):
+        self.api_key = api_key
+        self.base_url = (base_url or os.getenv("GEMINI_BASE_URL") or DEFAULT_BASE_URL).rstrip('/')
+        self.model = model or os.getenv("GEMINI_MODEL") or DEFAULT_MODEL
+        self.timeout = (connect_timeout, read_timeout)
+        self.governor = governor or RateGovernor(
+            requests_per_minute=float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", 60))
+        )
+        self.budget = budget if budget is not None else float(os.getenv("LLM_REQUEST_BUDGET_S", 5))
+        self.background_budget = (background_budget if background_budget is not None
+                                  else float(os.getenv("LLM_BACKGROUND_BUDGET_S", 30)))
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Content-Type'] = 'application/json'
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.stats = {} # tag -> counters, see metrics()
+
+    def default_budget(self):
+        return self.budget if has_request_context() else self.background_budget
+
+    def url(self, method='generateContent'):
+        return f"{self.base_url}/models/{self.model}:{method}"
+
+    def generate(self, prompt, tag='default', budget=None):
+        """
+        Sends one prompt and returns an LLMResponse. Raises LLMError on any
+        failure; `tag` groups the call in metrics() (e.g. 'tutor').
+
+        The whole call, including waiting for admission and retrying a 429,
+        is bounded by `budget` seconds (default self.budget on the request
+        path, self.background_budget elsewhere). Once it can no longer finish
+        in time, LLMUnavailable is raised right away.
+        """
+        deadline = time.monotonic() + (self.default_budget() if budget is None else budget)
+        data = {
+            "contents": [{
+                "parts": [{"text": prompt}]
+            }]
+        }
+        attempt = 0
+        while True:
+            try:
+                return self._generate_once(data, tag, deadline)
+            except LLMUnavailable:
+                raise
+            except LLMError as e:
+                if e.status_code != 429 or attempt >= self.max_retries:
+                    raise
+                delay = max(e.retry_after or 0, self.retry_backoff * (2 ** attempt))
+                if time.monotonic() + delay >= deadline:
+                    self._count(tag, 'rejected')
+                    raise LLMUnavailable(f"Rate limited and no budget left to retry: {e}") from e
+                time.sleep(delay)
+                attempt += 1
+
+    def _generate_once(self, data, tag, deadline):
+        response, start = self._post('generateContent', data, tag, deadline)
+        if not response.ok:
+            self._record(tag, start, error='errors')
+            raise LLMError(f"LLM returned {response.status_code}: {response.text[:500]}",
+                           response.status_code, retry_after=parse_retry_after(response))
+        try:
+            result = response.json()
+            text = result['candidates'][0]['content']['parts'][0]['text']
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            self._record(tag, start, error='errors')
+            raise LLMError(f"Unexpected LLM response: {e}", response.status_code) from e
+
+        usage = result.get('usageMetadata') or {}
+        prompt_tokens = usage.get('promptTokenCount', 0)
+        output_tokens = usage.get('candidatesTokenCount', 0)
+        latency_ms = self._record(tag, start, prompt_tokens=prompt_tokens, output_tokens=output_tokens)
+        return LLMResponse(text, latency_ms, prompt_tokens, output_tokens, result)
+
+    def stream(self, prompt, tag='default', budget=None):
+        """
+        Streams one prompt through streamGenerateContent (server-sent events),
+        yielding text chunks as upstream produces them. Raises LLMError like
+        generate(), possibly after some chunks were already yielded.
+
+        `budget` bounds the time to the first byte (default self.budget:
+        streams are read by a waiting client even after the request handler
+        returned); after that each read may take up to the read timeout. The
+        call holds its concurrency slot until the stream is exhausted or
+        closed.
+        """
+        deadline = time.monotonic() + (self.budget if budget is None else budget)
+        data = {
+            "contents": [{
+                "parts": [{"text": prompt}]
+            }]
+        }
+        response, start = self._post('streamGenerateContent', data, tag, deadline, stream=True)
+        prompt_tokens = output_tokens = 0
+        first_chunk = None
+        try:
+            if not response.ok:
+                self._record(tag, start, error='errors')
+                raise LLMError(f"LLM returned {response.status_code}: {response.text[:500]}",
+                               response.status_code, retry_after=parse_retry_after(response))
+            response.encoding = 'utf-8'
+            # chunk_size=None hands over each chunk as soon as it arrives
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if not line.startswith('data:'):
+                    continue
+                event = json.loads(line[5:])
+                usage = event.get('usageMetadata') or {}
+                prompt_tokens = usage.get('promptTokenCount', prompt_tokens)
+                output_tokens = usage.get('candidatesTokenCount', output_tokens)
+                parts = ((event.get('candidates') or [{}])[0].get('content') or {}).get('parts') or []
+                text = "".join(part.get('text', '') for part in parts)
+                if text:
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter()
+                    yield text
+        except requests.exceptions.Timeout as e:
+            self._record(tag, start, error='timeouts')
+            raise LLMError(f"LLM stream timed out: {e}") from e
+        except (requests.exceptions.RequestException, ValueError, AttributeError) as e:
+            self._record(tag, start, error='errors')
+            raise LLMError(f"LLM stream failed: {e}") from e
+        finally:
+            response.close()
+            self._release()
+
+        self._record(tag, start, prompt_tokens=prompt_tokens, output_tokens=output_tokens,
+                     first_chunk=first_chunk)
+
+    def _post(self, method, data, tag, deadline, stream=False):
+        """
+        Admits and sends one request, reporting its outcome to the circuit
+        breaker. Returns (response, start time).
+
+        With stream=True the body is left unread and the concurrency slot
+        stays taken; the caller must call _release() when done with it.
+        """
+        remaining = deadline - time.monotonic()
+        reason = "deadline exceeded" if remaining <= 0 else self.governor.admit(remaining)
+        if reason:
+            self._count(tag, 'rejected')
+            raise LLMUnavailable(f"LLM call not attempted: {reason}")
+        if not self._slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+            self.governor.breaker.record_neutral()
+            self._count(tag, 'rejected')
+            raise LLMUnavailable("LLM call not attempted: no free slot before the deadline")
+
+        with self._lock:
+            self._in_flight += 1
+        start = time.perf_counter()
+        handed_off = False
+        try:
+            remaining = max(deadline - time.monotonic(), 0.001)
+            timeout = (min(self.timeout[0], remaining), min(self.timeout[1], remaining))
+            params = {'key': self.api_key}
+            if stream:
+                params['alt'] = 'sse'
+            response = self.session.post(self.url(method), params=params, json=data, timeout=timeout, stream=stream)
+            handed_off = stream
+        except requests.exceptions.Timeout as e:
+            self.governor.breaker.record_failure()
+            self._record(tag, start, error='timeouts')
+            raise LLMError(f"LLM request timed out: {e}") from e
+        except requests.exceptions.RequestException as e:
+            self.governor.breaker.record_failure()
+            self._record(tag, start, error='errors')
+            raise LLMError(f"LLM request failed: {e}") from e
+        finally:
+            if not handed_off:
+                self._release()
+
+        if response.status_code == 429 or response.status_code >= 500:
+            self.governor.breaker.record_failure(parse_retry_after(response))
+        else:
+            self.governor.breaker.record_success()
+        return response, start
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def metrics(self):
+        """
+        Returns counters per tag plus the number of calls in flight.
+        """
+        with self._lock:
+            tags = {}
+            for tag, counters in self.stats.items():
+                tags[tag] = dict(counters)
+                tags[tag]['latency_ms'] = round(counters['latency_ms'], 1)
+                tags[tag]['max_latency_ms'] = round(counters['max_latency_ms'], 1)
+                done = counters['calls'] - counters['errors'] - counters['timeouts']
+                tags[tag]['avg_latency_ms'] = round(counters['latency_ms'] / done, 1) if done else 0
+                tags[tag]['ttfb_ms'] = round(counters['ttfb_ms'], 1)
+                tags[tag]['avg_ttfb_ms'] = round(counters['ttfb_ms'] / counters['streams'], 1) if counters['streams'] else 0
+            return {"in_flight": self._in_flight, "governor": self.governor.metrics(), "tags": tags}
+
+    def _counters(self, tag):
+        # Called with the lock held
+        counters = self.stats.get(tag)
+        if counters is None:
+            counters = self.stats[tag] = {
+                "calls": 0, "errors": 0, "timeouts": 0, "rejected": 0, "latency_ms": 0.0,
+                "max_latency_ms": 0.0, "prompt_tokens": 0, "output_tokens": 0,
+                "streams": 0, "ttfb_ms": 0.0
+            }
+        return counters
+
+    def _count(self, tag, name):
+        with self._lock:
+            self._counters(tag)[name] += 1
+
+    def _record(self, tag, start, error=None, prompt_tokens=0, output_tokens=0, first_chunk=None):
+        latency_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            counters = self._counters(tag)
+            counters["calls"] += 1
+            if error:
+                counters[error] += 1
+            else:
+                counters["latency_ms"] += latency_ms
+                counters["max_latency_ms"] = max(counters["max_latency_ms"], latency_ms)
+                counters["prompt_tokens"] += prompt_tokens
+                counters["output_tokens"] += output_tokens
+                if first_chunk is not None:
+                    counters["streams"] += 1
+                    counters["ttfb_ms"] += (first_chunk - start) * 1000
+        return latency_ms
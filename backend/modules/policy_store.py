@@ -0,0 +1,130 @@
+import fcntl
+import os
+import struct
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+# Open file description locks (Linux): owned by the descriptor, not the process
+_OFD_SETLKW = getattr(fcntl, 'F_OFD_SETLKW', None)
+
+
+class SharedPolicyStore:
+    """
+    A Q-table shared by every worker process on the machine.
+
+    The table is a .npy file memory-mapped read-write, so an update by one
+    process is immediately visible to all. Writers lock the rows they update:
+    a striped thread lock within the process plus a byte-range lock per row
+    on a sidecar lock file across processes. The byte-range locks are open
+    file description locks where available; process-owned POSIX locks would
+    report false deadlocks (EDEADLK) once several threads of a process hold
+    rows, so without OFD locks a process has one writer at a time. Rows are
+    locked in ascending order, so batches can't deadlock. Readers take no
+    locks; they may see a row while it is being updated, which a greedy
+    policy tolerates.
+
+    `seed` identifies the `initial` table (e.g. the saved model's mtime and
+    size). It is recorded next to the table, and a store opened with a
+    different seed copies `initial` over the table in place, so a retrained
+    or restored model reaches workers that are already running too.
+    """
+    def __init__(self, path, shape, initial=None, seed=None, stripes=64):
+        self.path = path
+        self.shape = tuple(shape)
+        self.seed_path = f"{path}.seed"
+        self._stripes = [threading.Lock() for _ in range(stripes if _OFD_SETLKW else 1)]
+        self._lock_fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+
+        # Byte 0 of the lock file guards creation; byte 1 + row guards that row
+        with self._file_lock(0, 1 + self.shape[0]):
+            if not self._valid():
+                self._create(initial)
+                self._write_seed(seed)
+            self.table = np.lib.format.open_memmap(self.path, mode='r+')
+            if seed is not None and seed != self._read_seed():
+                print(f"Reseeding shared policy {self.path} from a changed model")
+                if initial is not None:
+                    self.table[:] = initial
+                    self.table.flush()
+                self._write_seed(seed)
+
+    def _valid(self):
+        if not os.path.exists(self.path):
+            return False
+        existing = np.load(self.path, mmap_mode='r')
+        if existing.shape == self.shape:
+            return True
+        print(f"Replacing shared policy {self.path} with shape {existing.shape}, expected {self.shape}")
+        return False
+
+    def _create(self, initial):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        table = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float64, shape=self.shape)
+        if initial is not None:
+            table[:] = initial
+        table.flush()
+        del table
+        os.replace(tmp, self.path)
+
+    def _read_seed(self):
+        try:
+            with open(self.seed_path, 'r') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_seed(self, seed):
+        if seed is None:
+            return
+        tmp = f"{self.seed_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(seed)
+        os.replace(tmp, self.seed_path)
+
+    def _set_lock(self, start, length, exclusive):
+        if _OFD_SETLKW is None:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_UN, length, start)
+            return
+        # struct flock: l_type, l_whence, l_start, l_len, l_pid (0 for OFD locks)
+        flock = struct.pack('hhqqi', fcntl.F_WRLCK if exclusive else fcntl.F_UNLCK, os.SEEK_SET, start, length, 0)
+        fcntl.fcntl(self._lock_fd, _OFD_SETLKW, flock)
+
+    @contextmanager
+    def _file_lock(self, start, length=1):
+        self._set_lock(start, length, True)
+        try:
+            yield
+        finally:
+            self._set_lock(start, length, False)
+
+    @contextmanager
+    def locked(self, rows):
+        """
+        Holds the write locks of `rows` (any iterable of row indices).
+        """
+        rows = sorted(set(int(row) for row in rows))
+        stripes = sorted(set(row % len(self._stripes) for row in rows))
+        for stripe in stripes:
+            self._stripes[stripe].acquire()
+        locked = []
+        try:
+            for row in rows:
+                self._set_lock(1 + row, 1, True)
+                locked.append(row)
+            yield
+        finally:
+            for row in locked:
+                self._set_lock(1 + row, 1, False)
+            for stripe in reversed(stripes):
+                self._stripes[stripe].release()
+
+    def flush(self):
+        # Updates are shared through the page cache already; this makes them durable
+        self.table.flush()
+
+    def close(self):
+        self.flush()
+        os.close(self._lock_fd)
@@ -5,34 +5,28 @@ class ProgressManager:
         self.lp_manager = learner_profile_manager
 
     def get_progress_stats(self, learner_id):
-        learner = self.lp_manager.get_learner(learner_id)
+        learner = self.lp_manager.get_learner(learner_id, with_interactions=False, with_stats=True)
         if not learner:
             return None
 
         completed_count = len(learner.get('completed_concepts', []))
         
-        # Calculate total time spent from interaction log
-        total_time_ms = sum(log.get('response_time_ms', 0) for log in learner.get('interaction_log', []))
+        # Total time spent, from the learner_stats rollup
+        total_time_ms = learner['interaction_stats']['total_response_time_ms']
         total_minutes = round(total_time_ms / 60000, 1)
 
         return {
             "completed_concepts": completed_count,
             "total_minutes_learned": total_minutes,
-            "streak_days": self._calculate_streak(learner)
+            "streak_days": self._calculate_streak(learner_id)
         }
 
-    def _calculate_streak(self, learner):
-        # Simple streak calculation based on interaction timestamps
-        dates = set()
-        for log in learner.get('interaction_log', []):
-            if 'timestamp' in log:
-                dt = datetime.fromisoformat(log['timestamp'])
-                dates.add(dt.date())
-        
-        if not dates:
+    def _calculate_streak(self, learner_id):
+        # Simple streak calculation based on the days with interactions
+        sorted_dates = self.lp_manager.get_activity_dates(learner_id)
+        if not sorted_dates:
             return 0
 
-        sorted_dates = sorted(list(dates), reverse=True)
         streak = 0
         today = datetime.now().date()
         
@@ -49,7 +43,6 @@ class ProgressManager:
         return streak
 
     def get_badges(self, learner_id):
-        learner = self.lp_manager.get_learner(learner_id)
         stats = self.get_progress_stats(learner_id)
         badges = []
 
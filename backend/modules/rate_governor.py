@@ -0,0 +1,129 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Client-side rate limit: `rate` requests per second on average, with
+    bursts of up to `capacity`.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout):
+        """
+        Takes one token, waiting at most `timeout` seconds for it. Returns
+        False without taking anything if the wait would be longer.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve the token now and wait for it outside the lock, so
+            # waiters are served in arrival order
+            wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0
+            if wait > timeout:
+                return False
+            self._tokens -= 1
+        if wait:
+            time.sleep(wait)
+        return True
+
+    def available(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._updated
+            return min(self.capacity, self._tokens + elapsed * self.rate)
+
+
+class CircuitBreaker:
+    """
+    Fails fast while upstream is throttling or down.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    rejects calls for `reset_timeout` seconds (longer if upstream asked us to
+    retry later). Then one probe call is let through: success closes the
+    breaker, failure opens it again.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_until = 0
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "rejected": 0}
+
+    def allow(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() >= self._opened_until:
+                self._state = self.HALF_OPEN # This caller is the probe
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self, retry_after=None):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.stats["opened"] += 1
+                self._state = self.OPEN
+                self._opened_until = time.monotonic() + max(self.reset_timeout, retry_after or 0)
+
+    def record_neutral(self):
+        # A call that neither proved nor disproved upstream health
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._state = self.OPEN
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() >= self._opened_until:
+                return self.HALF_OPEN
+            return self._state
+
+
+class RateGovernor:
+    """
+    Admission control shared by every LLM caller: a token bucket sized to the
+    upstream quota in front of a circuit breaker.
+    """
+    def __init__(self, requests_per_minute=60, burst=10, failure_threshold=3, reset_timeout=30):
+        self.bucket = TokenBucket(requests_per_minute / 60, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.stats = {"throttled": 0}
+
+    def admit(self, timeout):
+        """
+        Returns None if the call may proceed, or the reason it may not.
+        """
+        if not self.breaker.allow():
+            return "circuit open"
+        if not self.bucket.acquire(timeout):
+            self.breaker.record_neutral()
+            self.stats["throttled"] += 1
+            return "rate limit"
+        return None
+
+    def metrics(self):
+        return dict(
+            self.stats,
+            breaker=self.breaker.state,
+            breaker_opened=self.breaker.stats["opened"],
+            breaker_rejected=self.breaker.stats["rejected"],
+            tokens=round(self.bucket.available(), 2)
+        )
@@ -0,0 +1,244 @@
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, groupby
+from operator import itemgetter
+
+import numpy as np
+from sqlalchemy import create_engine, select
+
+from models import Interaction, User
+from .affective_analyzer import AffectiveAnalyzer
+from .content_pregeneration import graph_domains
+from .knowledge_graph import KnowledgeGraph, MOCK_DATA_DIR
+from .rl_agent import ACTIONS
+from .state_encoding import build_context
+
+ACTION_INDEX = {a: i for i, a in enumerate(ACTIONS)}
+
+# Rows fetched per round trip while streaming
+YIELD_PER = 10000
+
+_engines = {} # Database URI -> engine, one per worker process
+
+
+def intervention_of(action, details):
+    """
+    The RL action an interaction row records, or None for a plain answer.
+    Interventions are logged either with the action name itself or with
+    {"intervention": action} in details.
+    """
+    if action in ACTION_INDEX:
+        return action
+    if details and 'intervention' in details:
+        try:
+            action = json.loads(details).get('intervention')
+        except (ValueError, AttributeError):
+            return None
+        if action in ACTION_INDEX:
+            return action
+    return None
+
+
+def replay_reward(outcomes):
+    """
+    Reward for an intervention from the (is_correct, response_time_ms) of
+    the answers that followed it: accuracy in [-1, 1], minus up to 0.5 for
+    slow answers (60s or more on average).
+    """
+    accuracy = sum(1 for correct, _ in outcomes if correct) / len(outcomes)
+    latency = sum(ms or 0 for _, ms in outcomes) / len(outcomes)
+    return 2 * accuracy - 1 - 0.5 * min(latency / 60000, 1.0)
+
+
+def concept_levels(data_dir=MOCK_DATA_DIR):
+    """
+    {concept_id: level} over every knowledge graph.
+    """
+    levels = {}
+    for domain in graph_domains(data_dir):
+        for node in KnowledgeGraph(domain).compiled.nodes:
+            levels[node['id']] = node.get('level')
+    return levels
+
+
+def replay_transitions(rows, horizon, encoder, levels, skill_level=None, analyzer=None):
+    """
+    Turns one learner's interaction rows (action, is_correct,
+    response_time_ms, details, concept_id, timestamp), oldest first, into
+    Q-learning transitions (state, action, reward, next_state) of encoded
+    states and ACTIONS indices.
+
+    The state is the learner's context at an intervention, with
+    analyze_state over the answers before it; the reward and next state come
+    from the `horizon` answers after it. Interventions the history ends too
+    soon after are skipped. Memory use is independent of the history length.
+    """
+    analyzer = analyzer or AffectiveAnalyzer()
+    window = deque(maxlen=analyzer.STATE_WINDOW)
+
+    def state_at(concept_id, timestamp):
+        recent = list(window)
+        return encoder.encode(build_context(analyzer.analyze_state(recent), recent, levels.get(concept_id),
+                                            skill_level, timestamp))
+
+    pending = [] # (state, action, outcomes so far)
+    for action, is_correct, response_time_ms, details, concept_id, timestamp in rows:
+        intervention = intervention_of(action, details)
+        if intervention is not None:
+            pending.append((state_at(concept_id, timestamp), ACTION_INDEX[intervention], []))
+            continue
+
+        window.append({'is_correct': is_correct, 'response_time_ms': response_time_ms or 0})
+        if not pending:
+            continue
+        next_state = None
+        still_pending = []
+        for state, action_index, outcomes in pending:
+            outcomes.append((is_correct, response_time_ms))
+            if len(outcomes) < horizon:
+                still_pending.append((state, action_index, outcomes))
+                continue
+            if next_state is None:
+                next_state = state_at(concept_id, timestamp)
+            yield state, action_index, replay_reward(outcomes), next_state
+        pending = still_pending
+
+
+def extract_chunk(task):
+    """
+    Process pool task for (database_uri, user_ids, horizon, encoder,
+    levels): streams the interactions of those learners with a server-side
+    cursor and returns their transitions as arrays, plus the number of rows
+    read.
+    """
+    database_uri, user_ids, horizon, encoder, levels = task
+    engine = _engines.get(database_uri)
+    if engine is None:
+        engine = _engines[database_uri] = create_engine(database_uri)
+
+    table, users = Interaction.__table__, User.__table__
+    query = (
+        select(table.c.user_id, users.c.skill_level, table.c.action, table.c.is_correct,
+               table.c.response_time_ms, table.c.details, table.c.concept_id, table.c.timestamp)
+        .join(users, users.c.id == table.c.user_id)
+        .where(table.c.user_id.in_(user_ids))
+        .order_by(table.c.user_id, table.c.timestamp, table.c.id)
+    )
+    analyzer = AffectiveAnalyzer()
+    transitions = []
+    rows = [0]
+
+    def counted(result):
+        for row in result:
+            rows[0] += 1
+            yield row
+
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=YIELD_PER).execute(query)
+        for _, learner_rows in groupby(counted(result), key=itemgetter(0)):
+            first = next(learner_rows)
+            history = chain([first], learner_rows)
+            transitions.extend(replay_transitions((row[2:] for row in history), horizon, encoder, levels,
+                                                  first[1], analyzer))
+
+    columns = list(zip(*transitions)) or [(), (), (), ()]
+    return {
+        "states": np.array(columns[0], dtype=np.int64),
+        "actions": np.array(columns[1], dtype=np.int64),
+        "rewards": np.array(columns[2], dtype=np.float64),
+        "next_states": np.array(columns[3], dtype=np.int64),
+        "rows": rows[0]
+    }
+
+
+def bounded_map(pool, fn, items, window):
+    """
+    pool.map(fn, items) in order, but with at most `window` items submitted
+    ahead of the result being consumed, so neither pending tasks nor
+    finished results pile up.
+    """
+    in_flight = deque()
+    for item in items:
+        in_flight.append(pool.submit(fn, item))
+        if len(in_flight) >= window:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
+
+class ReplayTrainer:
+    """
+    Trains an RLAgent offline from the interactions table.
+
+    Learners are split into chunks of `learners_per_chunk`; each chunk is
+    streamed and turned into transitions by a worker process, and the
+    main process merges every chunk into the Q-table with one batched
+    update, in chunk order. At most two chunks per worker are in flight,
+    so memory doesn't grow with the history. With several epochs the
+    transitions are kept in memory (about 32 bytes each) after the first.
+    """
+    def __init__(self, agent, database_uri, horizon=3, learners_per_chunk=500, levels=None):
+        self.agent = agent
+        self.levels = concept_levels() if levels is None else levels
+        self.database_uri = database_uri
+        self.horizon = horizon
+        self.learners_per_chunk = learners_per_chunk
+
+    def learner_chunks(self):
+        engine = create_engine(self.database_uri)
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=self.learners_per_chunk).execute(
+                select(User.__table__.c.id).order_by(User.__table__.c.id)
+            )
+            chunk = []
+            for (user_id,) in result:
+                chunk.append(user_id)
+                if len(chunk) == self.learners_per_chunk:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+        engine.dispose()
+
+    def run(self, workers=4, epochs=1, log=print):
+        """
+        Replays every learner's history `epochs` times. The table is read
+        once; later epochs replay the transitions extracted in the first.
+        Returns counts of learners, rows read and transitions learned (per
+        epoch).
+        """
+        counts = {"learners": 0, "rows": 0, "transitions": 0}
+        extracted = [] if epochs > 1 else None
+        tasks = self._tasks(self.learner_chunks(), counts)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # Results come back in chunk order, so training is deterministic
+                self._merge(bounded_map(pool, extract_chunk, tasks, 2 * workers), log, counts, extracted)
+        else:
+            self._merge(map(extract_chunk, tasks), log, counts, extracted)
+        log(f"Epoch 1/{epochs}: {counts}")
+        for epoch in range(1, epochs):
+            self._merge(extracted, log)
+            log(f"Epoch {epoch + 1}/{epochs}: {counts}")
+        self.agent.save_model()
+        return counts
+
+    def _tasks(self, chunks, counts):
+        for user_ids in chunks:
+            counts["learners"] += len(user_ids)
+            yield self.database_uri, user_ids, self.horizon, self.agent.encoder, self.levels
+
+    def _merge(self, results, log, counts=None, extracted=None):
+        # Learns every chunk in order; `counts` and `extracted` (a list that
+        # keeps the chunks for later epochs) are only given in the first epoch
+        for i, chunk in enumerate(results):
+            if len(chunk["states"]):
+                self.agent.learn_batch(chunk["states"], chunk["actions"], chunk["rewards"], chunk["next_states"])
+                if extracted is not None:
+                    extracted.append(chunk)
+            if counts is not None:
+                counts["rows"] += chunk["rows"]
+                counts["transitions"] += len(chunk["states"])
+            if (i + 1) % 20 == 0:
+                log(f"  {i + 1} chunks merged")
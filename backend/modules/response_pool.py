@@ -0,0 +1,150 @@
+import atexit
+import fcntl
+import json
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ResponsePool:
+    """
+    Pools of interchangeable pre-generated responses, one per key.
+
+    take() hands out a pooled response immediately, or None when the pool is
+    empty. Whenever a pool drops to `low_water` it is topped back up to
+    `target_size` by background workers, using the generator passed to
+    take(). Pools are bounded by `max_keys` keys and `max_bytes` of text in
+    total (least recently used keys go first) and are saved to `path` so
+    they survive restarts. Worker processes sharing `path` merge their pools
+    into it rather than overwriting each other's. A different `version`
+    (e.g. a hash of the prompts) discards saved pools.
+    """
+    def __init__(self, path=None, version=None, target_size=3, low_water=1,
+                 max_bytes=2 * 1024 * 1024, max_keys=1000, workers=2):
+        self.path = path
+        self.version = version
+        self.target_size = target_size
+        self.low_water = low_water
+        self.max_bytes = max_bytes
+        self.max_keys = max_keys
+
+        self._pools = OrderedDict() # key -> deque of responses, least recently used first
+        self._bytes = 0
+        self._refilling = set()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='response-pool')
+        self.stats = {"served": 0, "empty": 0, "generated": 0, "failed": 0, "evicted": 0}
+
+        self.load()
+        if self.path:
+            atexit.register(self.save)
+
+    def take(self, key, generate):
+        """
+        Returns a pooled response for `key`, or None if there is none yet.
+        `generate()` produces one new response (None on failure) and is used
+        to refill the pool in the background.
+        """
+        with self._lock:
+            pool = self._pools.get(key)
+            response = None
+            if pool:
+                response = pool.popleft()
+                self._bytes -= len(response)
+                self._pools.move_to_end(key)
+                self.stats["served"] += 1
+            else:
+                self.stats["empty"] += 1
+            if (pool is None or len(pool) <= self.low_water) and key not in self._refilling:
+                self._refilling.add(key)
+                self._executor.submit(self._refill, key, generate)
+        return response
+
+    def size(self, key):
+        with self._lock:
+            return len(self._pools.get(key, ()))
+
+    def _refill(self, key, generate):
+        try:
+            while self.size(key) < self.target_size:
+                response = generate()
+                if not response:
+                    with self._lock:
+                        self.stats["failed"] += 1
+                    return # Try again on the next take()
+                with self._lock:
+                    self._pools.setdefault(key, deque()).append(response)
+                    self._bytes += len(response)
+                    self.stats["generated"] += 1
+                    self._evict()
+        except Exception as e:
+            print(f"Response pool refill failed for {key}: {e}")
+            with self._lock:
+                self.stats["failed"] += 1
+        finally:
+            with self._lock:
+                self._refilling.discard(key)
+        self.save()
+
+    def _evict(self):
+        # Called with the lock held
+        while len(self._pools) > 1 and (self._bytes > self.max_bytes or len(self._pools) > self.max_keys):
+            _, pool = self._pools.popitem(last=False)
+            self._bytes -= sum(len(response) for response in pool)
+            self.stats["evicted"] += 1
+
+    def load(self):
+        with self._lock:
+            for key, responses in self._read_saved():
+                pool = deque(responses[:self.target_size])
+                self._pools[key] = pool
+                self._bytes += sum(len(response) for response in pool)
+            self._evict()
+
+    def _read_saved(self):
+        # [(key, responses)] from `path`, least recently used first
+        if not self.path or not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable response pools at {self.path}: {e}")
+            return []
+        if saved.get('version') != self.version:
+            return []
+        return [(tuple(key), responses) for key, responses in saved.get('pools', [])]
+
+    def save(self):
+        """
+        Merges this process's pools into the file: its own keys replace the
+        saved ones and count as most recently used, keys only other workers
+        pool are kept, and the result is bounded like the in-memory pools.
+        """
+        if not self.path:
+            return
+        with self._lock:
+            ours = [(key, list(pool)) for key, pool in self._pools.items()]
+        with self._save_lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(f"{self.path}.lock", 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX) # Read-merge-write is one step across processes
+                merged = OrderedDict(self._read_saved())
+                for key, responses in ours:
+                    merged.pop(key, None)
+                    merged[key] = responses
+                pools = [(key, responses) for key, responses in merged.items() if responses]
+                size = sum(len(response) for _, responses in pools for response in responses)
+                while len(pools) > 1 and (size > self.max_bytes or len(pools) > self.max_keys):
+                    size -= sum(len(response) for response in pools.pop(0)[1])
+
+                tmp = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp, 'w') as f:
+                    json.dump({"version": self.version, "pools": [[list(key), r] for key, r in pools]}, f)
+                os.replace(tmp, self.path) # Readers never see a half-written file
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats, keys=len(self._pools), bytes=self._bytes, refilling=len(self._refilling))
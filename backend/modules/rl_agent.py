@@ -1,58 +1,168 @@
 import random
 import json
 import os
+import atexit
+import threading
+import time
+
+import numpy as np
+
+from .policy_store import SharedPolicyStore
+from .state_encoding import STATES, StateEncoder
+
+ACTIONS = ("hint", "visual_aid", "break", "mind_game", "video", "easier_problem")
 
 class RLAgent:
-    def __init__(self):
-        self.q_table = {} # State -> {Action: Value}
-        self.actions = ["hint", "visual_aid", "break", "mind_game", "video", "easier_problem"]
+    """
+    Tabular Q-learning policy for interventions.
+
+    The Q-table is a (states x actions) float array. States are learner
+    contexts encoded to rows by a StateEncoder (a bare affective state is
+    accepted too); actions are indexed through ACTIONS. Updates mark it
+    dirty; it is checkpointed at most every `checkpoint_interval` seconds
+    (and at exit) to a .npy file written to a temp file and renamed into
+    place, and memory-mapped copy-on-write on load so startup doesn't
+    depend on the table size.
+
+    With `shared` (or RL_SHARED_POLICY=1), the table lives in a
+    SharedPolicyStore next to the model instead, so every worker process
+    reads and updates one policy; it is seeded from the saved model, and
+    reseeded when that file changes (e.g. after train-policy).
+    """
+    def __init__(self, model_path=None, checkpoint_interval=30, encoder=None, shared=None):
+        self.actions = list(ACTIONS)
+        self.action_index = {a: i for i, a in enumerate(self.actions)}
+        self.encoder = encoder or StateEncoder()
+        self.n_states = self.encoder.n_states
         self.learning_rate = 0.1
         self.discount_factor = 0.9
         self.epsilon = 0.2 # Exploration rate
-        
+
         self.base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        self.model_path = os.path.join(self.base_path, 'data', 'rl_model.json')
+        self.model_path = model_path or os.path.join(self.base_path, 'data', 'rl_model.npy')
+        # Dict-of-dicts model written by earlier versions, imported if there's no .npy yet
+        self.legacy_model_path = os.path.join(os.path.dirname(self.model_path), 'rl_model.json')
+        self.checkpoint_interval = checkpoint_interval
+        self._dirty = False
+        self._last_checkpoint = time.monotonic()
+        self._lock = threading.Lock()
         self.load_model()
 
-    def get_state_key(self, affective_state):
-        return affective_state
+        if shared is None:
+            shared = os.getenv("RL_SHARED_POLICY") == "1"
+        self.store = None
+        if shared:
+            root, _ = os.path.splitext(self.model_path)
+            self.store = SharedPolicyStore(f"{root}.shared.npy", self.q_table.shape, initial=self.q_table,
+                                           seed=self.model_signature())
+            self.q_table = self.store.table
+        atexit.register(self.checkpoint)
 
-    def choose_action(self, state):
-        state_key = self.get_state_key(state)
-        
-        if state_key not in self.q_table:
-            self.q_table[state_key] = {a: 0.0 for a in self.actions}
+    def model_signature(self):
+        # Changes whenever the saved model is rewritten or restored; None without one
+        if not os.path.exists(self.model_path):
+            return None
+        stat = os.stat(self.model_path)
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def get_state_key(self, state):
+        # A context dict from build_context, or a bare affective state
+        return self.encoder.encode(state)
 
+    def encode_states(self, states):
+        return np.fromiter((self.get_state_key(s) for s in states), dtype=np.int64, count=len(states))
+
+    def choose_action(self, state):
         # Epsilon-greedy strategy
         if random.random() < self.epsilon:
             return random.choice(self.actions)
-        
-        # Exploit: Choose max Q-value
-        return max(self.q_table[state_key], key=self.q_table[state_key].get)
+
+        # Exploit: Choose max Q-value (first action on ties)
+        return self.actions[int(self.q_table[self.get_state_key(state)].argmax())]
 
     def learn(self, state, action, reward, next_state):
-        state_key = self.get_state_key(state)
-        next_state_key = self.get_state_key(next_state)
-        
-        if state_key not in self.q_table:
-            self.q_table[state_key] = {a: 0.0 for a in self.actions}
-        if next_state_key not in self.q_table:
-            self.q_table[next_state_key] = {a: 0.0 for a in self.actions}
-
-        current_q = self.q_table[state_key][action]
-        max_next_q = max(self.q_table[next_state_key].values())
-        
-        # Q-Learning Update Rule
-        new_q = current_q + self.learning_rate * (reward + self.discount_factor * max_next_q - current_q)
-        self.q_table[state_key][action] = new_q
-        
-        self.save_model()
+        self.learn_batch(
+            np.array([self.get_state_key(state)]),
+            np.array([self.action_index[action]]),
+            np.array([reward], dtype=np.float64),
+            np.array([self.get_state_key(next_state)])
+        )
+
+    def learn_batch(self, states, actions, rewards, next_states):
+        """
+        Q-learning update for a batch of transitions given as arrays of state
+        keys, action indices, rewards and next-state keys. Every transition is
+        evaluated against the table as it was before the batch; a (state,
+        action) pair that occurs several times moves by the mean of its TD
+        errors, so large batches don't multiply the learning rate.
+        """
+        states = np.asarray(states, dtype=np.int64)
+        cells = states * len(self.actions) + np.asarray(actions, dtype=np.int64)
+        # Shared tables lock only the rows being written, across processes
+        with self.store.locked(states) if self.store else self._lock:
+            q = self.q_table.reshape(-1)
+            max_next = self.q_table[np.asarray(next_states, dtype=np.int64)].max(axis=1)
+            td = np.asarray(rewards, dtype=np.float64) + self.discount_factor * max_next - q[cells]
+            unique, inverse = np.unique(cells, return_inverse=True)
+            td_sum = np.zeros(len(unique))
+            np.add.at(td_sum, inverse, td)
+            q[unique] += self.learning_rate * td_sum / np.bincount(inverse)
+            self._dirty = True
+        self.maybe_checkpoint()
+
+    def maybe_checkpoint(self):
+        if self._dirty and time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def checkpoint(self):
+        # Only writes if something changed since the last checkpoint
+        if not self._dirty:
+            return
+        if self.store:
+            self._dirty = False
+            self._last_checkpoint = time.monotonic()
+            self.store.flush()
+        else:
+            self.save_model()
 
     def load_model(self):
+        shape = (self.n_states, len(self.actions))
+        per_affective_state = None # Values from a model without context, one row per affective state
         if os.path.exists(self.model_path):
-            with open(self.model_path, 'r') as f:
-                self.q_table = json.load(f)
+            q = np.load(self.model_path, mmap_mode='c')
+            if q.shape == shape:
+                self.q_table = q
+                return
+            if q.shape == (len(STATES), len(self.actions)):
+                per_affective_state = np.array(q)
+            else:
+                print(f"Ignoring RL model {self.model_path} with shape {q.shape}, expected {shape}")
+        elif os.path.exists(self.legacy_model_path):
+            with open(self.legacy_model_path, 'r') as f:
+                legacy = json.load(f)
+            per_affective_state = np.zeros((len(STATES), len(self.actions)))
+            for i, state in enumerate(STATES):
+                for action, value in legacy.get(state, {}).items():
+                    if action in self.action_index:
+                        per_affective_state[i, self.action_index[action]] = value
+        self.q_table = np.zeros(shape)
+
+        if per_affective_state is not None:
+            if self.encoder.hash_buckets:
+                print("Not importing a context-free RL model into a hashed state space")
+                return
+            # Every context starts from what was learned for its affective state
+            for i in range(len(STATES)):
+                self.q_table[self.encoder.affective_rows(i)] = per_affective_state[i]
+            self.save_model()
 
     def save_model(self):
-        with open(self.model_path, 'w') as f:
-            json.dump(self.q_table, f)
+        with self._lock:
+            snapshot = np.array(self.q_table)
+            self._dirty = False
+            self._last_checkpoint = time.monotonic()
+        os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
+        tmp = f"{self.model_path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.save(f, snapshot)
+        os.replace(tmp, self.model_path) # Readers see the old or the new model, never a partial one
@@ -0,0 +1,135 @@
+import hashlib
+from datetime import datetime
+
+import numpy as np
+
+from .affective_analyzer import is_error
+from .learner_profile import SKILL_LEVELS
+
+# Affective states from AffectiveAnalyzer.classify_state
+STATES = ("neutral", "engaged", "confused", "struggling", "fatigued")
+# Wrong answers among the last AffectiveAnalyzer.STATE_WINDOW: 0, 1, 2-3, 4+
+ERROR_BUCKETS = 4
+# Night (0-5h), morning, afternoon, evening, by UTC hour unless build_context is given an offset
+TIME_BUCKETS = 4
+
+_MASK64 = (1 << 64) - 1
+
+
+def error_bucket(errors):
+    return 0 if errors <= 0 else 1 if errors == 1 else 2 if errors <= 3 else 3
+
+
+def time_bucket(hour):
+    return hour // 6
+
+
+def build_context(affective_state, recent_interactions=(), concept_level=None, skill_level=None, when=None,
+                  utc_offset=None):
+    """
+    The learner context a policy state is made of. `recent_interactions`
+    are the log entries the affective state was derived from.
+
+    `when` is a naive UTC datetime (default now), like the interaction
+    timestamps. The hour is UTC unless `utc_offset` (a timedelta, e.g. the
+    learner's) shifts it to local time; a policy should be trained and
+    queried with the same convention.
+    """
+    when = when or datetime.utcnow()
+    if utc_offset is not None:
+        when = when + utc_offset
+    return {
+        "affective_state": affective_state,
+        "concept_level": concept_level,
+        "errors": sum(1 for log in recent_interactions if is_error(log.get('is_correct'))),
+        "hour": when.hour,
+        "skill_level": skill_level
+    }
+
+
+def mix64_int(z):
+    """
+    SplitMix64 finalizer; spreads nearby keys uniformly over 64 bits.
+    """
+    z = (z + 0x9E3779B97F4A7C15) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+def mix64(keys):
+    """
+    mix64_int over uint64 arrays.
+    """
+    z = np.asarray(keys, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        z = z + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+class StateEncoder:
+    """
+    Maps a learner context to a Q-table row.
+
+    By default the row is a mixed-radix index over (affective state, concept
+    level, error bucket, time-of-day bucket, skill level), 720 rows with the
+    affective state as the most significant digit. With `hash_buckets`, the
+    index and any `extra_features` of the context (e.g. 'concept_id') are
+    hashed into that many rows instead, so open-ended features don't grow
+    the table. Unknown values encode as the first value of their feature.
+    """
+    def __init__(self, hash_buckets=None, extra_features=()):
+        self.hash_buckets = hash_buckets
+        self.extra_features = tuple(extra_features)
+        self._states = {s: i for i, s in enumerate(STATES)}
+        self._levels = {s: i for i, s in enumerate(SKILL_LEVELS)}
+        self.radices = (len(STATES), len(SKILL_LEVELS), ERROR_BUCKETS, TIME_BUCKETS, len(SKILL_LEVELS))
+        self.strides = tuple(int(np.prod(self.radices[i + 1:])) for i in range(len(self.radices)))
+        self.index_size = int(np.prod(self.radices))
+        self.n_states = hash_buckets or self.index_size
+
+    def digits(self, context):
+        if isinstance(context, str): # A bare affective state
+            context = {"affective_state": context}
+        return (
+            self._states.get(context.get("affective_state"), 0),
+            self._levels.get(context.get("concept_level"), 0),
+            error_bucket(context.get("errors", 0)),
+            time_bucket(context.get("hour", 0)) % TIME_BUCKETS,
+            self._levels.get(context.get("skill_level"), 0)
+        )
+
+    def encode(self, context):
+        index = sum(d * s for d, s in zip(self.digits(context), self.strides))
+        if not self.hash_buckets:
+            return index
+        return mix64_int(index ^ self.extra_hash(context)) % self.hash_buckets
+
+    def extra_hash(self, context):
+        # 64-bit hash of the context's extra features; 0 without any
+        if not self.extra_features or isinstance(context, str):
+            return 0
+        values = "|".join(str(context.get(name, "")) for name in self.extra_features)
+        return int.from_bytes(hashlib.blake2b(values.encode(), digest_size=8).digest(), 'little')
+
+    def encode_batch(self, digits, extra=None):
+        """
+        Vectorized encode over a (n, 5) array of digits() rows, with an
+        optional uint64 array of extra_hash() values in hashed mode.
+        """
+        index = np.asarray(digits, dtype=np.int64) @ np.asarray(self.strides, dtype=np.int64)
+        if not self.hash_buckets:
+            return index
+        keys = index.astype(np.uint64)
+        if extra is not None:
+            keys ^= np.asarray(extra, dtype=np.uint64)
+        return (mix64(keys) % np.uint64(self.hash_buckets)).astype(np.int64)
+
+    def affective_rows(self, affective_index):
+        """
+        Rows of every context with this affective state (mixed-radix mode).
+        """
+        block = self.strides[0]
+        return slice(affective_index * block, (affective_index + 1) * block)
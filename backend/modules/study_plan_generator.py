@@ -1,5 +1,4 @@
-from .knowledge_graph import KnowledgeGraph
-import networkx as nx
+from .compact_graph import STATUS_NAMES
 
 class StudyPlanGenerator:
     def __init__(self, learner_profile, kg_loader, lp_manager):
@@ -18,35 +17,26 @@ class StudyPlanGenerator:
         4. Perform Topological Sort to find the valid next steps.
         5. Prioritize Review concepts at the top of the list.
         """
-        graph_data = self.kg_loader.load_graph_data(domain)
-        if not graph_data:
+        # Compiled once per graph file by the shared registry
+        snapshot = self.kg_loader.snapshot(domain)
+        if snapshot.path is None:
             return []
 
-        G = self.kg_loader.build_graph(graph_data)
-        
-        learner = self.lp_manager.get_learner(learner_id)
+        learner = self.lp_manager.get_learner(learner_id, with_interactions=False)
         completed = set(learner.get('completed_concepts', []))
         
         # 1. Identify Review Candidates (Simple Spaced Repetition)
         # Find concepts that were completed but had high error rates in interactions
         review_candidates = set()
-        interaction_log = learner.get('interaction_log', [])
-        concept_errors = {}
-        
-        for log in interaction_log:
-            cid = log['concept_id']
-            if cid not in concept_errors: concept_errors[cid] = 0
-            if not log.get('is_correct', True):
-                concept_errors[cid] += 1
+        concept_errors = self.lp_manager.get_concept_error_counts(learner_id)
         
         for cid, errors in concept_errors.items():
             if cid in completed and errors >= 2: # If completed but had 2+ errors
                 review_candidates.add(cid)
 
         # 2. Topological Sort for New Content
-        try:
-            topo_order = list(nx.topological_sort(G))
-        except nx.NetworkXUnfeasible:
+        compact = snapshot.compact
+        if compact.topo_order is None:
             return [] # Cycle detected
 
         plan = []
@@ -55,7 +45,7 @@ class StudyPlanGenerator:
 
         # Add Review Items First
         for concept_id in review_candidates:
-            concept_data = next((c for c in graph_data['nodes'] if c['id'] == concept_id), None)
+            concept_data = snapshot.node_lookup.get(concept_id)
             if concept_data:
                 plan.append({
                     **concept_data,
@@ -63,29 +53,22 @@ class StudyPlanGenerator:
                     "reason": "High error rate detected previously"
                 })
 
+        # Unlock status for every concept in one vectorized pass
+        # over the prerequisite arrays
+        status_codes = compact.statuses(completed).tolist()
+
         # Add New Content
-        for concept_id in topo_order:
+        for idx in compact.topo_order.tolist():
+            concept_id = compact.ids[idx]
             if concept_id in review_candidates:
                 continue # Already added as review
             
-            concept_data = next((c for c in graph_data['nodes'] if c['id'] == concept_id), None)
+            concept_data = compact.concepts[idx]
             if not concept_data: continue
 
-            # Check prerequisites
-            prereqs = set(G.predecessors(concept_id))
-            
-            if concept_id in completed:
-                status = "completed"
-            elif prereqs.issubset(completed):
-                status = "unlocked"
-            else:
-                status = "locked"
-            
-            print(f"DEBUG: Concept {concept_id} prereqs: {prereqs}, status: {status}")
-            
             plan.append({
                 **concept_data,
-                "status": status
+                "status": STATUS_NAMES[status_codes[idx]]
             })
 
         return plan
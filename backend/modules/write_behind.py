@@ -0,0 +1,166 @@
+import atexit
+import queue
+import threading
+import time
+from collections import deque
+
+
+class WriteBehindQueue:
+    """
+    Bounded in-process queue of interactions, written to the database in
+    groups by a background thread.
+
+    A group is flushed when it reaches `max_batch` items or `flush_interval_ms`
+    after its first item arrived, and is committed as one transaction. When
+    the queue is full, enqueue() waits up to `enqueue_timeout` seconds and then
+    reports failure so the caller can write synchronously instead.
+
+    Until an event is committed it is visible through pending_for(), which
+    the learner read path merges into the interaction log.
+    """
+    def __init__(self, app, write_group, max_size=10000, max_batch=500, flush_interval_ms=5, enqueue_timeout=0.5):
+        self.app = app
+        self.write_group = write_group # callable({learner_id: [items]}), commits once
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval_ms / 1000
+        self.enqueue_timeout = enqueue_timeout
+
+        self._queue = queue.Queue(maxsize=max_size)
+        self._pending = {} # learner_id -> deque of items not yet committed
+        self._pending_lock = threading.Lock() # Also guards stats
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.stats = {"enqueued": 0, "rejected": 0, "flushed": 0, "groups": 0, "errors": 0, "dropped": 0}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='interaction-write-behind', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+        return self
+
+    def enqueue(self, learner_id, item):
+        """
+        Queues one interaction. Returns False if the queue stayed full for
+        `enqueue_timeout` seconds (or is shutting down); nothing is queued then.
+        """
+        if self._stop.is_set():
+            return False
+        with self._pending_lock:
+            self._pending.setdefault(learner_id, deque()).append(item)
+        try:
+            self._queue.put((learner_id, item), timeout=self.enqueue_timeout)
+        except queue.Full:
+            self._forget(learner_id, [item])
+            self._count("rejected")
+            return False
+        self._count("enqueued")
+        return True
+
+    def pending_for(self, learner_id):
+        """
+        Returns the learner's queued but uncommitted interactions, oldest first.
+        """
+        with self._pending_lock:
+            return list(self._pending.get(learner_id, ()))
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def flush(self, timeout=None):
+        """
+        Blocks until everything queued so far has been written.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def close(self, timeout=10):
+        """
+        Stops accepting events and writes out everything still queued.
+        """
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            group = self._collect()
+            if group:
+                self._write(group)
+            elif self._stop.is_set():
+                return
+
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        group = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(group) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                # Once shutting down, drain without waiting
+                group.append(self._queue.get_nowait() if remaining <= 0 or self._stop.is_set()
+                             else self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return group
+
+    def _write(self, group):
+        by_learner = {}
+        for learner_id, item in group:
+            by_learner.setdefault(learner_id, []).append(item)
+        try:
+            with self.app.app_context():
+                try:
+                    self.write_group(by_learner)
+                except Exception as e:
+                    print(f"Write-behind group of {len(group)} failed, retrying per learner: {e}")
+                    self._count("errors")
+                    self._write_individually(by_learner)
+            with self._pending_lock:
+                self.stats["flushed"] += len(group)
+                self.stats["groups"] += 1
+        finally:
+            for learner_id, items in by_learner.items():
+                self._forget(learner_id, items)
+            for _ in group:
+                self._queue.task_done()
+
+    def _write_individually(self, by_learner):
+        for learner_id, items in by_learner.items():
+            try:
+                self.write_group({learner_id: items})
+            except Exception as e:
+                print(f"Write-behind dropped {len(items)} interactions for {learner_id}: {e}")
+                self._count("dropped", len(items))
+
+    def _count(self, name, n=1):
+        with self._pending_lock:
+            self.stats[name] += n
+
+    def _forget(self, learner_id, items):
+        with self._pending_lock:
+            pending = self._pending.get(learner_id)
+            if not pending:
+                return
+            # Items are written in the order they were queued, so they are
+            # almost always the oldest pending ones
+            ids = {id(item) for item in items}
+            while pending and id(pending[0]) in ids:
+                ids.discard(id(pending.popleft()))
+            if ids:
+                # Out of order (concurrent enqueues, or a rejected enqueue): one pass
+                pending = deque(item for item in pending if id(item) not in ids)
+                self._pending[learner_id] = pending
+            if not pending:
+                del self._pending[learner_id]
+
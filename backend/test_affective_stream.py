@@ -0,0 +1,48 @@
+import random
+
+from conftest import seed_learners
+from modules.affective_analyzer import AffectiveAnalyzer
+from modules.affective_stream import AffectiveStream
+from modules.interaction_logger import InteractionLogger
+
+
+def test_affective_stream_matches_analyzer(lp_manager):
+    logger = seed_learners(lp_manager, n_learners=10)
+    analyzer = AffectiveAnalyzer()
+    stream = AffectiveStream(analyzer, lambda learner_id, n: lp_manager.get_interactions(learner_id, last_n=n),
+                             capacity=4)
+    logger.affective_stream = stream
+    rng = random.Random(1)
+
+    for step in range(60):
+        learner_id = f"u{rng.randrange(10):03d}"
+        if rng.random() < 0.5:
+            logger.log_interaction(learner_id, {"concept_id": "c", "action": "submit_answer",
+                                                "is_correct": rng.random() < 0.5,
+                                                "response_time_ms": rng.randint(0, 90000)})
+        log = lp_manager.get_interactions(learner_id)
+        assert stream.analyze_state(learner_id) == analyzer.analyze_state(log), step
+        assert stream.get_risk_score(learner_id) == analyzer.get_risk_score(log), step
+    assert stream.stats["evictions"] > 0
+
+
+def test_windows_follow_other_workers_writes(lp_manager):
+    seed_learners(lp_manager, n_learners=1)
+    analyzer = AffectiveAnalyzer()
+    loader = lambda learner_id, n: lp_manager.get_interactions(learner_id, last_n=n)
+    # One stream per worker process, both reading the same database
+    writer, reader = (AffectiveStream(analyzer, loader, version=lp_manager.get_interaction_count,
+                                      revalidate_interval=0) for _ in range(2))
+    logger = InteractionLogger(lp_manager, affective_stream=writer)
+    writer.analyze_state("u000")
+    reader.analyze_state("u000")
+
+    for _ in range(10):
+        logger.log_interaction("u000", {"concept_id": "c", "action": "submit_answer", "is_correct": False,
+                                        "response_time_ms": 90000})
+    log = lp_manager.get_interactions("u000")
+    assert reader.analyze_state("u000") == analyzer.analyze_state(log) == "struggling"
+    assert reader.get_risk_score("u000") == analyzer.get_risk_score(log)
+    assert reader.stats["stale"] == 1
+    # The writer's window saw every write itself, so it stays current
+    assert writer.analyze_state("u000") == "struggling" and writer.stats["stale"] == 0
@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from modules import ai_tutor
+from modules.ai_tutor import AITutor, LESSON_FALLBACK, grade_quiz
+from modules.content_cache import ContentCache
+from modules.llm_client import LLMClient
+
+QUIZ = [{"id": 1, "question": "Q?", "options": ["A", "B"], "correct_answer": "A"},
+        {"id": 2, "question": "R?", "options": ["C", "D"], "correct_answer": "D"}]
+
+
+@pytest.fixture
+def client(gemini_url, stub_gemini):
+    return LLMClient("test-key", base_url=gemini_url)
+
+
+def tutor_on(path, client):
+    # One tutor per simulated worker process, sharing the cache file
+    return AITutor("test-key", llm_client=client, cache=ContentCache(str(path)))
+
+
+def test_concurrent_lessons_share_one_call(tmp_path, client, stub_gemini):
+    tutor = tutor_on(tmp_path / "cache.sqlite3", client)
+    stub_gemini.delay = 0.2
+    before = stub_gemini.requests
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(tutor.generate_content(" python  LISTS", "Beginner")))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["# Lesson\nBody"] * 5
+    assert stub_gemini.requests == before + 1
+    assert tutor.generate_content("Python Lists", "beginner") == "# Lesson\nBody" # From the cache
+    assert stub_gemini.requests == before + 1
+
+
+def test_failures_are_not_cached(tmp_path, client):
+    tutor = tutor_on(tmp_path / "cache.sqlite3", client)
+    assert tutor.generate_content("status:503") == LESSON_FALLBACK
+    assert tutor.cache.get('lesson', tutor.lesson_key("status:503", "intermediate")) is None
+    assert tutor.store_lesson(LESSON_FALLBACK) is None
+
+
+def test_lessons_are_addressable_by_content_id(tmp_path, client):
+    tutor = tutor_on(tmp_path / "cache.sqlite3", client)
+    content_id = tutor.store_lesson("# Lesson\nBody")
+    assert tutor_on(tmp_path / "cache.sqlite3", client).get_lesson(content_id) == "# Lesson\nBody"
+    assert tutor.get_lesson("unknown") is None
+
+
+def test_grade_quiz_locally():
+    results = grade_quiz(QUIZ, {"1": " A ", 2: "C"})
+    assert [r["is_correct"] for r in results] == [True, False]
+    assert grade_quiz(QUIZ, {})[0]["user_answer"] == ""
+
+
+def test_evaluation_explanations_reach_every_worker(tmp_path, client, stub_gemini):
+    path = tmp_path / "cache.sqlite3"
+    worker_a, worker_b = tutor_on(path, client), tutor_on(path, client)
+    stub_gemini.delay = 0.3
+
+    feedback = worker_a.evaluate_quiz("# Lesson", {"1": "A", "2": "C"}, QUIZ)
+    assert feedback["score"] == 1 and feedback["explanations_pending"]
+    # Another worker serves the poll while explanations are still pending
+    assert worker_b.get_evaluation(feedback["evaluation_id"])["explanations_pending"]
+
+    deadline = time.monotonic() + 5
+    while worker_a.get_evaluation(feedback["evaluation_id"])["explanations_pending"]:
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    polled = worker_b.get_evaluation(feedback["evaluation_id"])
+    assert not polled["explanations_pending"]
+    assert polled["results"][0]["explanation"] == "A is right." and polled["next_steps"] == "Practice more."
+    # Resubmitting the same answers returns the finished evaluation
+    assert worker_b.evaluate_quiz("# Lesson", {"1": "A", "2": "C"}, QUIZ) == polled
+
+
+def wait_for_explanations(tutor, evaluation_id):
+    deadline = time.monotonic() + 5
+    while (evaluation := tutor.get_evaluation(evaluation_id))["explanations_pending"]:
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    return evaluation
+
+
+def test_failed_explanations_are_retried(tmp_path, client, monkeypatch):
+    monkeypatch.setattr(ai_tutor, "FAILED_EVALUATION_TTL", 0.3)
+    tutor = tutor_on(tmp_path / "cache.sqlite3", client)
+    lesson = "# Lesson status:503" # The stub fails every prompt containing the lesson
+
+    feedback = tutor.evaluate_quiz(lesson, {"1": "A", "2": "C"}, QUIZ)
+    failed = wait_for_explanations(tutor, feedback["evaluation_id"])
+    assert failed["score"] == 1 and failed["results"][0]["explanation"] == "" # Local grading still stands
+    time.sleep(0.4)
+    assert tutor.get_evaluation(feedback["evaluation_id"]) is None
+    assert tutor.evaluate_quiz(lesson, {"1": "A", "2": "C"}, QUIZ)["explanations_pending"] # Tried again
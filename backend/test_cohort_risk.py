@@ -0,0 +1,32 @@
+from conftest import add_learner, seed_learners
+from models import db, Interaction
+from modules.affective_analyzer import AffectiveAnalyzer
+from modules.cohort_risk import CohortRiskScorer
+from modules.interaction_logger import InteractionLogger
+
+
+def test_cohort_scores_match_analyzer(lp_manager):
+    seed_learners(lp_manager)
+    analyzer = AffectiveAnalyzer()
+    scorer = CohortRiskScorer(db, analyzer)
+
+    learners = list(scorer.iter_all(per_page=7))
+    assert len(learners) == 40
+    assert len({row["affective_state"] for row in learners}) >= 4
+    for row in learners:
+        log = lp_manager.get_interactions(row["learner_id"])
+        assert row["affective_state"] == analyzer.analyze_state(log), row
+        assert row["risk_score"] == analyzer.get_risk_score(log), row
+        assert row["recent_interactions"] == min(len(log), analyzer.RISK_WINDOW)
+
+
+def test_ungraded_answers_are_not_errors(lp_manager):
+    logger = InteractionLogger(lp_manager)
+    add_learner(lp_manager, "u1")
+    logger.log_interactions("u1", [{"concept_id": "c", "action": "submit_answer", "is_correct": False,
+                                    "response_time_ms": 1000}] * 10)
+    Interaction.query.update({"is_correct": None}) # NULLs, e.g. from rows older than the column default
+    db.session.commit()
+    [row] = CohortRiskScorer(db, AffectiveAnalyzer()).iter_all()
+    assert (row["affective_state"], row["risk_score"]) == ("engaged", 0)
+    assert AffectiveAnalyzer().analyze_state(lp_manager.get_interactions("u1")) == "engaged"
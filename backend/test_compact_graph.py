@@ -0,0 +1,71 @@
+import os
+import random
+
+import networkx as nx
+import pytest
+
+from benchmarks import synthetic
+from modules.compact_graph import COMPLETED, LOCKED, UNLOCKED
+from modules.knowledge_graph import CompiledGraph, GraphRegistry, KnowledgeGraph, build_graph, read_graph_data
+
+
+def networkx_statuses(graph, completed):
+    # The per-concept rule CompactGraph replaces
+    return [
+        COMPLETED if cid in completed
+        else UNLOCKED if all(p in completed for p in graph.predecessors(cid))
+        else LOCKED
+        for cid in graph.nodes
+    ]
+
+
+@pytest.mark.parametrize("fmt", synthetic.GRAPH_FORMATS)
+def test_statuses_match_networkx(tmp_path, fmt):
+    domain = synthetic.graph_domain(300, fmt)
+    data = read_graph_data(synthetic.write_graph(str(tmp_path), domain, synthetic.generate_graph(300, fmt)))
+    compiled = CompiledGraph(data=data)
+    compact = compiled.compact
+    graph = build_graph(data)
+    assert compact.ids == tuple(graph.nodes)
+
+    rng = random.Random(1)
+    for fraction in (0, 0.1, 0.5, 1):
+        completed = {cid for cid in graph.nodes if rng.random() < fraction}
+        completed.add("not_in_graph")
+        assert compact.statuses(completed).tolist() == networkx_statuses(graph, completed)
+
+
+def test_topological_order_matches_networkx():
+    data = synthetic.generate_graph(300)
+    compact = CompiledGraph(data=data).compact
+    order = [compact.ids[i] for i in compact.topo_order.tolist()]
+    assert order == list(nx.topological_sort(build_graph(data)))
+
+
+def test_edge_only_ids_and_cycles():
+    data = {"nodes": [{"id": "b"}], "edges": [{"source": "a", "target": "b"}]}
+    compact = CompiledGraph(data=data).compact
+    assert compact.concepts[compact.index["a"]] is None
+    assert compact.statuses(set()).tolist() == networkx_statuses(build_graph(data), set())
+
+    cyclic = {"nodes": [{"id": "a"}, {"id": "b"}],
+              "edges": [{"source": "a", "target": "b"}, {"source": "b", "target": "a"}]}
+    assert CompiledGraph(data=cyclic).compact.topo_order is None
+
+
+def test_registry_recompiles_changed_files(tmp_path):
+    registry = GraphRegistry(str(tmp_path))
+    domain = synthetic.graph_domain(10, 'nodes_edges')
+    path = synthetic.write_graph(str(tmp_path), domain, synthetic.generate_graph(10))
+
+    first = KnowledgeGraph(domain, registry).compiled
+    assert KnowledgeGraph(domain, registry).compiled is first # Shared until the file changes
+
+    synthetic.write_graph(str(tmp_path), domain, synthetic.generate_graph(20))
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+    second = KnowledgeGraph(domain, registry).compiled
+    assert second is not first and second.compact.size == 20
+
+    os.remove(path)
+    assert KnowledgeGraph(domain, registry).compiled.path is None
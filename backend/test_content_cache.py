@@ -0,0 +1,67 @@
+import time
+
+from modules.content_cache import ContentCache, normalize_key_part
+
+
+def test_memory_and_disk_tiers(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ContentCache(path)
+    cache.set('lesson', 'k', {"text": "x"})
+    assert cache.get('lesson', 'k') == {"text": "x"}
+    assert cache.stats["memory_hits"] == 1
+
+    restarted = ContentCache(path)
+    assert restarted.get('lesson', 'k') == {"text": "x"}
+    assert restarted.get('lesson', 'k') == {"text": "x"}
+    assert (restarted.stats["disk_hits"], restarted.stats["memory_hits"]) == (1, 1)
+    assert restarted.get('quiz', 'k') is None
+
+
+def test_expiry_and_memory_bound(tmp_path):
+    cache = ContentCache(str(tmp_path / "cache.sqlite3"), max_bytes=100)
+    cache.set('lesson', 'short', "x", ttl=0.05)
+    time.sleep(0.1)
+    assert cache.get('lesson', 'short') is None
+    assert cache.purge_expired() == 1
+
+    for i in range(10):
+        cache.set('lesson', str(i), "y" * 20)
+    metrics = cache.metrics()
+    assert metrics["memory_bytes"] <= 100 and metrics["evictions"] > 0
+    assert cache.get('lesson', '0') == "y" * 20 # Evicted from memory only
+
+
+def test_invalidate_prefix(tmp_path):
+    cache = ContentCache(str(tmp_path / "cache.sqlite3"))
+    for key in ('python lists|beginner', 'python lists|advanced', 'python loops|beginner'):
+        cache.set('lesson', key, key)
+    cache.set('quiz', 'python lists|beginner', 'q')
+    assert cache.invalidate('lesson', 'python lists|') == 2
+    assert cache.get('lesson', 'python lists|beginner') is None
+    assert cache.get('lesson', 'python loops|beginner') is not None
+    assert cache.get('quiz', 'python lists|beginner') == 'q'
+
+
+def test_invalidate_reaches_other_processes(tmp_path):
+    # Two caches on one file behave like two worker processes
+    path = str(tmp_path / "cache.sqlite3")
+    worker_a = ContentCache(path, revalidate_interval=0.05)
+    worker_b = ContentCache(path, revalidate_interval=0.05)
+    worker_a.set('lesson', 'k', "old")
+    assert worker_b.get('lesson', 'k') == "old" # Now in b's memory tier
+
+    worker_a.invalidate('lesson')
+    time.sleep(0.1)
+    assert worker_b.get('lesson', 'k') is None
+    assert worker_b.stats["revalidations"] == 1
+
+    # b's own next invalidation also drops what a invalidated meanwhile
+    worker_b.set('quiz', 'q', "old")
+    worker_b.revalidate_interval = 3600
+    worker_a.invalidate('quiz')
+    worker_b.invalidate('lesson', 'unrelated')
+    assert worker_b.get('quiz', 'q') is None
+
+
+def test_normalize_key_part():
+    assert normalize_key_part("  Python   LISTS ") == normalize_key_part("python lists") == "python lists"
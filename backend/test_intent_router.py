@@ -0,0 +1,67 @@
+import pytest
+
+from modules.assistant import AIAssistant
+from modules.intent_router import FAQS as APP_FAQS, IntentRouter
+from modules.llm_client import LLMClient
+
+# Jaccard similarity of "alpha beta gamma" with this example is 3/4
+FAQS = [{"intent": "faq_greek", "examples": ["alpha beta gamma delta"], "message": "Greek letters."}]
+
+
+def faq_message(intent):
+    return next(faq["message"] for faq in APP_FAQS if faq["intent"] == intent)
+
+
+def test_faq_hits():
+    router = IntentRouter()
+    assert router.route("How do quizzes work?") == {
+        "message": faq_message("faq_quiz"), "action": "navigate", "target": "/tutor"
+    }
+    # Not every answer navigates
+    assert router.route("what can you do") == {"message": faq_message("faq_capabilities"), "action": "none"}
+
+
+def test_navigation():
+    router = IntentRouter()
+    assert router.route("Take me to the settings page")["target"] == "/settings"
+    assert router.route("settings")["target"] == "/settings" # A bare page name
+    # A page that is only mentioned isn't a navigation request
+    assert router.route("my progress on recursion is slow, any tips") is None
+    assert router.route("open progress or settings") is None # Ambiguous
+
+
+def test_unmatched_messages_fall_through_to_the_llm(gemini_url, stub_gemini):
+    assistant = AIAssistant("test-key", llm_client=LLMClient("test-key", base_url=gemini_url))
+    assert assistant.router.route("Explain recursion with an example") is None
+    before = stub_gemini.requests
+    assert assistant.chat("Explain recursion with an example")["target"] == "/settings" # The stub's reply
+    assert stub_gemini.requests == before + 1
+    assert assistant.chat("go to settings")["target"] == "/settings"
+    assert stub_gemini.requests == before + 1 # Answered locally
+
+
+@pytest.mark.parametrize("threshold, routed", [(0.74, True), (0.75, True), (0.76, False)])
+def test_similarity_threshold(threshold, routed):
+    router = IntentRouter(routes=[], faqs=FAQS, threshold=threshold)
+    assert router.classify("alpha beta gamma")[2] == 0.75
+    assert (router.route("alpha beta gamma") is not None) == routed
+
+
+def test_max_words():
+    router = IntentRouter(max_words=6)
+    assert router.route("go to settings right now please")["target"] == "/settings" # 6 words
+    assert router.route("go to settings right now please thanks") is None
+    assert router.classify("go to settings right now please thanks") == (None, None, 0.0)
+    assert router.route("") is None and router.route(None) is None
+
+
+def test_metrics():
+    router = IntentRouter()
+    for message in ("go to settings", "settings", "what can you do", "Explain recursion with an example"):
+        router.route(message)
+    metrics = router.metrics()
+    assert (metrics["routed"], metrics["fallthrough"], metrics["hit_rate"]) == (3, 1, 0.75)
+    assert metrics["intents"] == {"nav_settings": 2, "faq_capabilities": 1}
+    metrics["intents"]["nav_settings"] = 0 # A copy
+    assert router.metrics()["intents"]["nav_settings"] == 2
+    assert IntentRouter().metrics()["hit_rate"] == 0
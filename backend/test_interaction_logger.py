@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import add_learner
+from models import Interaction, InteractionReceipt
+from modules.interaction_logger import InteractionLogger, MAX_IDEMPOTENCY_KEY, RECEIPT_RETENTION_DAYS
+
+
+def answer(**fields):
+    return dict({"concept_id": "c", "action": "submit_answer", "is_correct": True}, **fields)
+
+
+def test_batch_timestamps(lp_manager):
+    logger = InteractionLogger(lp_manager)
+    add_learner(lp_manager, "u1")
+    rows, _ = logger.log_interactions("u1", [
+        answer(timestamp="2024-01-01T10:00:00+02:00"),
+        answer(timestamp="2024-01-01T09:00:00"),
+        answer()
+    ])
+    assert rows[0]["timestamp"] == datetime(2024, 1, 1, 8, 0) # Converted to naive UTC
+    assert rows[1]["timestamp"] == datetime(2024, 1, 1, 9, 0)
+    assert rows[2]["timestamp"] > datetime(2024, 1, 2) # Server time
+
+
+@pytest.mark.parametrize("timestamp", [1704103200, ["2024-01-01"], {"at": 1}, "yesterday"])
+def test_invalid_timestamps_raise_value_error(lp_manager, timestamp):
+    logger = InteractionLogger(lp_manager)
+    add_learner(lp_manager, "u1")
+    with pytest.raises(ValueError, match="Interaction 1: invalid timestamp"):
+        logger.log_interactions("u1", [answer(), answer(timestamp=timestamp)])
+    assert Interaction.query.count() == 0
+
+
+def test_idempotency_keys(lp_manager):
+    logger = InteractionLogger(lp_manager)
+    add_learner(lp_manager, "u1")
+    batch = [answer(idempotency_key="a"), answer(idempotency_key="a"), answer(idempotency_key=7)]
+    rows, duplicates = logger.log_interactions("u1", batch)
+    assert (len(rows), duplicates) == (2, 1)
+    rows, duplicates = logger.log_interactions("u1", batch) # A retried batch
+    assert (len(rows), duplicates) == (0, 3)
+
+    with pytest.raises(ValueError, match="idempotency_key is longer than 64"):
+        logger.log_interactions("u1", [answer(idempotency_key="k" * (MAX_IDEMPOTENCY_KEY + 1))])
+    assert Interaction.query.count() == 2
+
+
+def test_purge_receipts(lp_manager):
+    logger = InteractionLogger(lp_manager)
+    add_learner(lp_manager, "u1")
+    logger.log_interactions("u1", [answer(idempotency_key="old")])
+    InteractionReceipt.query.update({"received_at": datetime.utcnow() - timedelta(days=RECEIPT_RETENTION_DAYS + 1)})
+    logger.log_interactions("u1", [answer(idempotency_key="new")])
+
+    assert logger.purge_receipts() == 1
+    assert [r.idempotency_key for r in InteractionReceipt.query.all()] == ["new"]
+    # Within retention a retry is still skipped; past it the key is accepted again
+    assert logger.log_interactions("u1", [answer(idempotency_key="new"), answer(idempotency_key="old")])[1] == 1
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+from conftest import add_learner
+from models import db, Interaction, LearnerStats, ConceptStats, DailyActivity
+from modules.interaction_logger import InteractionLogger
+
+START = datetime(2024, 1, 1, 22, 0)
+
+
+def rollup_rows():
+    return {
+        "learners": sorted((s.user_id, s.interaction_count, s.incorrect_count, s.total_response_time_ms,
+                            s.first_interaction_at, s.last_interaction_at) for s in LearnerStats.query.all()),
+        "concepts": sorted((s.user_id, s.concept_id, s.attempt_count, s.error_count, s.last_seen_at)
+                           for s in ConceptStats.query.all()),
+        "days": sorted((d.user_id, d.day, d.interaction_count, d.total_response_time_ms)
+                       for d in DailyActivity.query.all())
+    }
+
+
+def interactions(n, offset=0):
+    # Spread over two days, and out of order so min/max matter
+    return [
+        {"concept_id": f"c{i % 3}", "action": "submit_answer", "is_correct": i % 3 == 0,
+         "response_time_ms": 100 * i, "timestamp": (START + timedelta(minutes=37 * ((i * 7) % n) + offset)).isoformat()}
+        for i in range(n)
+    ]
+
+
+def test_incremental_rollups_match_backfill(lp_manager):
+    logger = InteractionLogger(lp_manager)
+    for user_id in ("u1", "u2"):
+        add_learner(lp_manager, user_id)
+    logger.log_interactions("u1", interactions(10))
+    logger.log_interactions("u1", interactions(5, offset=3)) # Upserts into existing counters
+    logger.log_interactions("u2", interactions(7))
+    logger.log_interaction("u2", {"concept_id": "c1", "action": "view_concept"}) # is_correct defaults to False
+
+    incremental = rollup_rows()
+    assert incremental["learners"][0][1:3] == (15, 9)
+    assert len([row for row in incremental["days"] if row[0] == "u1"]) == 2
+
+    logger.rollups.backfill()
+    assert rollup_rows() == incremental
+
+
+def test_backfill_one_learner(lp_manager):
+    logger = InteractionLogger(lp_manager)
+    for user_id in ("u1", "u2"):
+        add_learner(lp_manager, user_id)
+        logger.log_interactions(user_id, interactions(6))
+    expected = rollup_rows()
+
+    ConceptStats.query.delete()
+    LearnerStats.query.filter_by(user_id="u1").update({"interaction_count": 0})
+    db.session.commit()
+    logger.rollups.backfill(user_id="u1")
+    assert [row for row in rollup_rows()["learners"] if row[0] == "u1"] == \
+        [row for row in expected["learners"] if row[0] == "u1"]
+    assert {row[0] for row in rollup_rows()["concepts"]} == {"u1"} # Other learners untouched
+
+
+def test_read_paths_use_rollups(lp_manager):
+    logger = InteractionLogger(lp_manager)
+    add_learner(lp_manager, "u1")
+    logger.log_interactions("u1", interactions(9))
+    assert lp_manager.get_concept_error_counts("u1") == {"c1": 3, "c2": 3}
+    days = lp_manager.get_activity_dates("u1")
+    assert days == sorted(days, reverse=True) and len(days) == 2
+
+
+def test_truthy_answers_are_correct(lp_manager):
+    logger = InteractionLogger(lp_manager)
+    add_learner(lp_manager, "u1")
+    logger.log_interactions("u1", [
+        {"concept_id": "c", "action": "submit_answer", "is_correct": value,
+         "timestamp": (START + timedelta(minutes=i)).isoformat()}
+        for i, value in enumerate([1, 0, True, False, None])
+    ])
+    incremental = rollup_rows()
+    assert incremental["learners"][0][1:3] == (5, 3) # None is stored as the column default, False
+    logger.rollups.backfill()
+    assert rollup_rows() == incremental
+
+    # NULLs written by other means are ungraded, not errors
+    Interaction.query.update({"is_correct": None})
+    logger.rollups.backfill()
+    assert rollup_rows()["learners"][0][1:3] == (5, 0)
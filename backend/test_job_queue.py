@@ -0,0 +1,74 @@
+import threading
+import time
+
+from modules.job_queue import JobQueue, RetryableJobError
+from modules.llm_client import LLMClient
+
+
+def test_jobs_are_deduplicated_and_retried(gemini_url, stub_gemini):
+    client = LLMClient("test-key", base_url=gemini_url)
+    jobs = JobQueue(path=':memory:', workers=2, retry_backoff=0.05, poll_interval=0.05)
+    attempts = []
+
+    def flaky(payload):
+        attempts.append(payload)
+        if len(attempts) < 3:
+            raise RetryableJobError("upstream busy", fallback={"content": "fallback"})
+        return {"content": client.generate(payload["prompt"]).text}
+
+    jobs.register('lesson', flaky)
+    first = jobs.submit('lesson', {"prompt": "hello"}, key="hello")
+    assert jobs.submit('lesson', {"prompt": "hello"}, key="hello")["id"] == first["id"]
+    jobs.start()
+    try:
+        job = jobs.wait(first["id"], timeout=5)
+        assert job["status"] == 'done' and job["attempts"] == 3 and job["result"]["content"]
+        # Finished jobs aren't reused
+        assert jobs.submit('lesson', {"prompt": "hello"}, key="hello")["id"] != first["id"]
+    finally:
+        jobs.stop()
+
+
+def test_retries_give_up_with_fallback():
+    jobs = JobQueue(path=':memory:', workers=1, max_attempts=2, retry_backoff=0.01, poll_interval=0.02)
+
+    def failing(payload):
+        raise RetryableJobError("upstream busy", fallback={"content": "fallback"})
+
+    jobs.register('lesson', failing)
+    submitted = jobs.submit('lesson', {}, key="k")
+    jobs.start()
+    try:
+        job = jobs.wait(submitted["id"], timeout=5)
+    finally:
+        jobs.stop()
+    assert job["attempts"] == 2 and job["result"] == {"content": "fallback"}
+
+
+def test_run_after_lost_lease_does_not_overwrite(tmp_path):
+    # Two processes sharing the queue file; the first one's run outlives its lease
+    path = str(tmp_path / "jobs.sqlite3")
+    slow_worker = JobQueue(path=path, workers=1, lease=0.1, poll_interval=0.02)
+    fast_worker = JobQueue(path=path, workers=1, lease=0.1, poll_interval=0.02)
+    started = threading.Event()
+
+    def slow(payload):
+        started.set()
+        time.sleep(0.5)
+        return "stale"
+
+    slow_worker.register('lesson', slow)
+    fast_worker.register('lesson', lambda payload: "fresh")
+    job = slow_worker.submit('lesson', {}, key="k")
+    slow_worker.start()
+    try:
+        assert started.wait(5)
+        fast_worker.start()
+        assert fast_worker.wait(job["id"], timeout=5)["result"] == "fresh"
+        time.sleep(0.6) # The slow run finishes
+        final = slow_worker.get(job["id"])
+        assert final["result"] == "fresh" and final["attempts"] == 2
+        assert slow_worker.metrics()["lost_leases"] == 1
+    finally:
+        slow_worker.stop()
+        fast_worker.stop()
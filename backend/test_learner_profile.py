@@ -0,0 +1,89 @@
+import json
+from datetime import datetime, timedelta
+
+from conftest import add_learner
+from models import db, User, ConceptCompletion
+from modules.interaction_logger import InteractionLogger
+
+START = datetime(2024, 1, 1, 12, 0)
+
+
+def log_history(lp_manager, learner_id, n):
+    logger = InteractionLogger(lp_manager)
+    logger.log_interactions(learner_id, [
+        {"concept_id": f"c{i % 3}", "action": "submit_answer", "is_correct": i % 2 == 0,
+         "response_time_ms": 1000 * i, "timestamp": (START + timedelta(minutes=i)).isoformat()}
+        for i in range(n)
+    ])
+
+
+def test_get_learner_windows(lp_manager):
+    learner_id = add_learner(lp_manager, "u1")
+    log_history(lp_manager, learner_id, 10)
+
+    full = lp_manager.get_learner(learner_id)['interaction_log']
+    assert [i['response_time_ms'] for i in full] == [1000 * i for i in range(10)] # Oldest first
+
+    assert lp_manager.get_learner(learner_id, with_interactions=False)['interaction_log'] == []
+    assert lp_manager.get_learner(learner_id, last_n=3)['interaction_log'] == full[-3:]
+    since = START + timedelta(minutes=4)
+    assert lp_manager.get_learner(learner_id, since=since)['interaction_log'] == full[4:]
+    assert lp_manager.get_learner(learner_id, last_n=2, since=since)['interaction_log'] == full[-2:]
+    assert lp_manager.get_learner(learner_id, last_n=20, since=START + timedelta(minutes=8))['interaction_log'] == full[8:]
+    assert lp_manager.get_learner("missing") is None
+
+
+def test_get_learner_merges_pending(lp_manager):
+    learner_id = add_learner(lp_manager, "u1")
+    log_history(lp_manager, learner_id, 4)
+    queued = {"concept_id": "c9", "action": "submit_answer", "is_correct": True, "response_time_ms": 5,
+              "timestamp": (START + timedelta(hours=1)).isoformat(), "details": {}}
+    lp_manager.pending_source = lambda _: [queued]
+
+    log = lp_manager.get_learner(learner_id, last_n=2)['interaction_log']
+    assert len(log) == 2 and log[-1] == queued
+    assert lp_manager.get_learner(learner_id, since=START + timedelta(minutes=30))['interaction_log'] == [queued]
+
+
+def test_get_learner_stats(lp_manager):
+    learner_id = add_learner(lp_manager, "u1")
+    log_history(lp_manager, learner_id, 10)
+    stats = lp_manager.get_learner(learner_id, with_interactions=False, with_stats=True)['interaction_stats']
+    assert stats['interaction_count'] == 10 and stats['incorrect_count'] == 5
+    assert stats['total_response_time_ms'] == 45000
+    assert stats['first_interaction_at'] == START.isoformat()
+
+
+def test_mark_completed_is_idempotent(lp_manager):
+    learner_id = add_learner(lp_manager, "u1")
+    lp_manager.mark_completed(learner_id, ["a", "b", "a"])
+    lp_manager.mark_completed(learner_id, ["b", "c"])
+    assert lp_manager.get_learner(learner_id, with_interactions=False)['completed_concepts'] == ["a", "b", "c"]
+
+
+def test_update_learner_replaces_completions(lp_manager):
+    learner_id = add_learner(lp_manager, "u1")
+    lp_manager.mark_completed(learner_id, ["a", "b"])
+    updated = lp_manager.update_learner(learner_id, {"completed_concepts": ["b", "d"]})
+    assert sorted(updated['completed_concepts']) == ["b", "d"]
+
+
+def test_migrate_legacy_completions(lp_manager):
+    legacy = add_learner(lp_manager, "legacy")
+    mixed = add_learner(lp_manager, "mixed")
+    fresh = add_learner(lp_manager, "fresh")
+    User.query.get(legacy).completed_concepts = json.dumps(["a", "b"])
+    User.query.get(mixed).completed_concepts = json.dumps(["a"])
+    db.session.commit()
+    lp_manager.mark_completed(mixed, ["a", "c"])
+    lp_manager.mark_completed(fresh, ["z"])
+
+    assert lp_manager.migrate_legacy_completions() == 2
+    assert lp_manager.migrate_legacy_completions() == 0 # Nothing left to move
+
+    for user_id, expected in ((legacy, {"a", "b"}), (mixed, {"a", "c"}), (fresh, {"z"})):
+        user = User.query.get(user_id)
+        assert user.completed_concepts == '[]'
+        rows = ConceptCompletion.query.filter_by(user_id=user_id).all()
+        assert {row.concept_id for row in rows} == expected
+        assert set(user.completed_concept_ids()) == expected
@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from modules.llm_client import LLMClient, LLMError, LLMUnavailable
+from modules.rate_governor import RateGovernor
+from modules.ai_tutor import AITutor
+from modules.assistant import AIAssistant
+
+
+@pytest.fixture
+def client(gemini_url, stub_gemini):
+    return LLMClient("test-key", base_url=gemini_url, read_timeout=0.5, max_concurrency=2,
+                     governor=RateGovernor(requests_per_minute=60000, burst=100))
+
+
+def test_generate_reports_usage_and_reuses_connection(client, stub_gemini):
+    for _ in range(5):
+        response = client.generate("hello", tag='test')
+    assert response.text.startswith("```markdown")
+    assert (response.prompt_tokens, response.output_tokens) == (7, 3)
+    assert len(stub_gemini.connections) == 1, stub_gemini.connections
+    metrics = client.metrics()['tags']['test']
+    assert metrics['calls'] == 5 and metrics['prompt_tokens'] == 35 and metrics['output_tokens'] == 15
+
+
+def test_errors_and_timeouts_raise(client):
+    # Upstream errors and timeouts raise LLMError instead of hanging
+    with pytest.raises(LLMError) as error:
+        client.generate("status:503", tag='test')
+    assert error.value.status_code == 503
+    with pytest.raises(LLMError) as error:
+        client.generate("slow", tag='test')
+    assert error.value.status_code is None
+    metrics = client.metrics()['tags']['test']
+    assert metrics['errors'] == 1 and metrics['timeouts'] == 1
+
+
+def test_concurrency_limit(client, stub_gemini):
+    # No more than max_concurrency calls reach upstream at once
+    stub_gemini.delay = 0.1
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client.generate, args=("hello",)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert time.perf_counter() - start >= 0.2
+
+
+def test_tutor_and_assistant(client, stub_gemini):
+    # Modules ported onto the client behave as before
+    tutor = AITutor("test-key", llm_client=client)
+    assert tutor.generate_content("Python Lists") == "# Lesson\nBody"
+    assistant = AIAssistant("test-key", llm_client=client)
+    before = stub_gemini.requests
+    assert assistant.chat("go to settings")['target'] == "/settings" # Answered locally
+    assert stub_gemini.requests == before
+    assert assistant.chat("Explain recursion with an example")['target'] == "/settings" # Stub's reply
+    assert stub_gemini.requests == before + 1
+
+
+def test_streaming(client, stub_gemini):
+    # Chunks are yielded as they arrive; fences are stripped incrementally
+    tutor = AITutor("test-key", llm_client=client)
+    stub_gemini.delay = 0.2
+    start = time.perf_counter()
+    chunks = client.stream("hello", tag='stream')
+    first = next(chunks)
+    ttfb = time.perf_counter() - start
+    assert first == "```markdown\n# Les" and ttfb < 0.15, (first, ttfb)
+    assert first + "".join(chunks) == "```markdown\n# Lesson\nBody\n```"
+    assert "".join(tutor.stream_content("Python Lists")) == "# Lesson\nBody"
+    metrics = client.metrics()['tags']['stream']
+    assert metrics['streams'] == 1 and metrics['output_tokens'] == 4
+
+
+def test_circuit_breaker(client, gemini_url, stub_gemini):
+    # Repeated 429s open the breaker; callers then fail fast without a request
+    breaking = LLMClient("test-key", base_url=gemini_url, retry_backoff=0.05,
+                         governor=RateGovernor(requests_per_minute=60000, burst=100, failure_threshold=2))
+    with pytest.raises(LLMUnavailable):
+        breaking.generate("status:429")
+    assert breaking.governor.breaker.state == 'open'
+    before, start = stub_gemini.requests, time.perf_counter()
+    with pytest.raises(LLMUnavailable):
+        breaking.generate("hello")
+    assert stub_gemini.requests == before and time.perf_counter() - start < 0.05
+    # Other clients are unaffected
+    assert AITutor("test-key", llm_client=client).generate_content("Python Lists") == "# Lesson\nBody"
+
+
+def test_deadline_budget(gemini_url, stub_gemini):
+    # When the token bucket can't admit a call within the budget, fail fast
+    client = LLMClient("test-key", base_url=gemini_url, background_budget=0.2,
+                       governor=RateGovernor(requests_per_minute=6, burst=1))
+    client.generate("hello")
+    start = time.perf_counter()
+    with pytest.raises(LLMUnavailable):
+        client.generate("hello")
+    assert time.perf_counter() - start < 0.05
+
+
+def test_request_path_fails_fast_and_background_waits(gemini_url, stub_gemini):
+    client = LLMClient("test-key", base_url=gemini_url, budget=0.2, background_budget=3,
+                       governor=RateGovernor(requests_per_minute=60, burst=1))
+    client.generate("hello")
+    with Flask(__name__).test_request_context():
+        start = time.perf_counter()
+        with pytest.raises(LLMUnavailable):
+            client.generate("hello")
+        assert time.perf_counter() - start < 0.05
+    # Off the request path the call waits for the next token (1s)
+    start = time.perf_counter()
+    assert client.generate("hello").text
+    assert time.perf_counter() - start >= 0.5
@@ -0,0 +1,78 @@
+import multiprocessing
+import os
+import random
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from modules.policy_store import SharedPolicyStore
+from modules.rl_agent import ACTIONS, RLAgent
+
+SHAPE = (12, 6)
+
+
+def hammer(path, threads, updates, seed):
+    """
+    One worker process: `threads` threads each increment column 0 of three
+    random rows `updates` times, reading and writing under the row locks.
+    Returns the number of increments; any lock error propagates.
+    """
+    store = SharedPolicyStore(path, SHAPE)
+    errors = []
+
+    def run(rng):
+        try:
+            for _ in range(updates):
+                rows = rng.sample(range(SHAPE[0]), 3)
+                with store.locked(rows):
+                    values = store.table[rows, 0].copy()
+                    os.sched_yield() # Invite the lost update a missing lock would allow
+                    store.table[rows, 0] = values + 1
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=run, args=(random.Random(seed * 100 + i),)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    store.close()
+    if errors:
+        raise errors[0]
+    return threads * updates * 3
+
+
+def test_concurrent_batches_lose_no_updates(tmp_path):
+    path = str(tmp_path / "policy.shared.npy")
+    SharedPolicyStore(path, SHAPE).close()
+    with ProcessPoolExecutor(4, mp_context=multiprocessing.get_context('spawn')) as pool:
+        counts = list(pool.map(hammer, [path] * 4, [4] * 4, [500] * 4, range(4)))
+    assert sum(counts) == 4 * 4 * 500 * 3
+    assert SharedPolicyStore(path, SHAPE).table[:, 0].sum() == sum(counts)
+
+
+def shared_agent(tmp_path):
+    return RLAgent(model_path=str(tmp_path / "rl_model.npy"), shared=True)
+
+
+def test_updates_survive_restarts(tmp_path):
+    agent = shared_agent(tmp_path)
+    agent.learn("confused", "hint", 1.0, "engaged")
+    value = agent.q_table[agent.get_state_key("confused"), 0]
+    assert value != 0
+    assert shared_agent(tmp_path).q_table[agent.get_state_key("confused"), 0] == value
+
+
+def test_changed_model_reseeds_running_workers(tmp_path):
+    running = shared_agent(tmp_path)
+    running.learn("confused", "hint", 1.0, "engaged")
+    np.save(running.model_path, np.full((running.n_states, len(ACTIONS)), 2.0)) # Restored from a backup
+    os.utime(running.model_path, ns=(1, 1)) # An older file is still a change
+
+    restarted = shared_agent(tmp_path)
+    assert (restarted.q_table == 2.0).all()
+    assert (running.q_table == 2.0).all() # Same mapping, updated in place
+    restarted.learn("confused", "hint", 1.0, "engaged")
+    # An unchanged model doesn't reseed again
+    assert shared_agent(tmp_path).q_table[restarted.get_state_key("confused"), 0] != 2.0
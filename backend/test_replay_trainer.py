@@ -0,0 +1,134 @@
+import json
+import random
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import insert
+
+from models import db, Interaction, User
+from modules.affective_analyzer import AffectiveAnalyzer
+from modules.replay_trainer import ReplayTrainer, bounded_map, intervention_of, replay_reward, replay_transitions
+from modules.rl_agent import ACTIONS, RLAgent
+from modules.state_encoding import StateEncoder, build_context
+
+T = datetime(2024, 1, 1, 13, 0)
+LEVELS = {"c1": "intermediate"}
+
+
+def test_intervention_of():
+    assert intervention_of("hint", None) == "hint"
+    assert intervention_of("intervention_shown", json.dumps({"intervention": "break"})) == "break"
+    assert intervention_of("intervention_shown", json.dumps({"intervention": "nap"})) is None
+    assert intervention_of("intervention_shown", "{'intervention': broken") is None
+    assert intervention_of("submit_answer", json.dumps({"note": "intervention"})) is None
+    assert intervention_of("submit_answer", None) is None
+
+
+def test_replay_reward():
+    assert replay_reward([(True, 0), (True, 0)]) == 1.0
+    assert replay_reward([(False, 0)]) == -1.0
+    assert replay_reward([(True, 60000), (False, 60000)]) == pytest.approx(-0.5)
+    assert replay_reward([(True, None), (True, 30000)]) == pytest.approx(1 - 0.125)
+
+
+def test_replay_transitions():
+    encoder, analyzer = StateEncoder(), AffectiveAnalyzer()
+    answers = [('submit_answer', True, 1000, None, 'c1', T)] * 5
+    after = [('submit_answer', False, 70000, None, 'c1', T + timedelta(hours=6))] * 3
+    rows = answers + [('hint', False, 0, None, 'c1', T)] + after
+
+    [(state, action, reward, next_state)] = replay_transitions(iter(rows), 3, encoder, LEVELS, 'advanced')
+    before = [{'is_correct': True, 'response_time_ms': 1000}] * 5
+    assert state == encoder.encode(build_context(analyzer.analyze_state(before), before, 'intermediate',
+                                                 'advanced', T))
+    assert ACTIONS[action] == 'hint' and reward == pytest.approx(-1.5)
+    later = before[3:] + [{'is_correct': False, 'response_time_ms': 70000}] * 3
+    assert next_state == encoder.encode(build_context(analyzer.analyze_state(later), later, 'intermediate',
+                                                      'advanced', T + timedelta(hours=6)))
+
+    # Interventions the history ends too soon after yield nothing
+    assert list(replay_transitions(iter(rows[:-1]), 3, encoder, LEVELS)) == []
+
+
+@pytest.fixture
+def history(app):
+    """
+    A database of 30 learners with answers and interventions logged both
+    ways; returns its URI.
+    """
+    rng = random.Random(0)
+    db.session.execute(insert(User), [
+        {"id": f"u{i:02d}", "name": "x", "email": f"u{i}@test.local", "password_hash": "x",
+         "skill_level": rng.choice(["beginner", "advanced"])} for i in range(30)
+    ])
+    rows = []
+    for i in range(30):
+        t = T
+        for _ in range(rng.randint(0, 60)):
+            t += timedelta(minutes=rng.randint(1, 120))
+            row = {"user_id": f"u{i:02d}", "concept_id": "c1", "timestamp": t, "is_correct": False,
+                   "response_time_ms": 0, "details": "{}"}
+            if rng.random() < 0.15:
+                action = rng.choice(ACTIONS)
+                if rng.random() < 0.5:
+                    row["action"] = action
+                else:
+                    row["action"], row["details"] = "intervention_shown", json.dumps({"intervention": action})
+            else:
+                row.update(action="submit_answer", is_correct=rng.random() < 0.6,
+                           response_time_ms=rng.randint(1000, 90000))
+            rows.append(row)
+    db.session.execute(insert(Interaction), rows)
+    db.session.commit()
+    return app.config['SQLALCHEMY_DATABASE_URI']
+
+
+def train(tmp_path, uri, name, runs=1, **options):
+    agent = RLAgent(model_path=str(tmp_path / name / "rl_model.npy"), shared=False)
+    trainer = ReplayTrainer(agent, uri, learners_per_chunk=7, levels=LEVELS)
+    extractions = []
+    chunks = trainer.learner_chunks
+
+    def counted_chunks():
+        extractions.append(1) # One read of the table
+        return chunks()
+
+    trainer.learner_chunks = counted_chunks
+    counts = [trainer.run(log=lambda *args: None, **options) for _ in range(runs)]
+    return agent, counts[-1], len(extractions)
+
+
+def test_workers_give_identical_policies(tmp_path, history):
+    serial, counts, _ = train(tmp_path, history, "serial", workers=1)
+    parallel, parallel_counts, _ = train(tmp_path, history, "parallel", workers=3)
+    assert counts == parallel_counts
+    assert counts["learners"] == 30 and counts["rows"] == Interaction.query.count() and counts["transitions"] > 50
+    np.testing.assert_array_equal(serial.q_table, parallel.q_table)
+    np.testing.assert_array_equal(np.load(serial.model_path), serial.q_table) # Saved after training
+
+
+def test_later_epochs_replay_without_reading_again(tmp_path, history):
+    cached, counts, extractions = train(tmp_path, history, "cached", workers=1, epochs=3)
+    reread, _, _ = train(tmp_path, history, "reread", runs=3, workers=1)
+    assert extractions == 1
+    assert counts["rows"] == Interaction.query.count() # Counted once, not per epoch
+    np.testing.assert_allclose(cached.q_table, reread.q_table)
+
+
+def test_bounded_map_keeps_order_and_limits_in_flight():
+    submitted = []
+
+    class Pool:
+        def submit(self, fn, item):
+            submitted.append(item)
+            future = Future()
+            future.set_result(fn(item))
+            return future
+
+    results = []
+    for result in bounded_map(Pool(), lambda n: n * n, iter(range(10)), 3):
+        assert len(submitted) - len(results) <= 3 # Never more than the window ahead
+        results.append(result)
+    assert results == [n * n for n in range(10)]
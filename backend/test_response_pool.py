@@ -0,0 +1,83 @@
+import time
+
+from modules.llm_client import LLMClient
+from modules.emotional_agent import EmotionalAgent
+from modules.response_pool import ResponsePool
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_emotional_responses_come_from_pool(tmp_path, gemini_url, stub_gemini):
+    client = LLMClient("test-key", base_url=gemini_url)
+    pool_path = str(tmp_path / "emotional_pools.json")
+    pool = ResponsePool(path=pool_path, version="v1", target_size=3, low_water=1)
+    agent = EmotionalAgent("test-key", llm_client=client, pool=pool)
+    key = ('good', "python lists")
+
+    # Empty pool: fallback now, refilled in the background
+    assert agent.get_response('good', "Python Lists")["content"] == "You're doing great! Keep it up."
+    wait_for(lambda: pool.size(key) == 3)
+    before = stub_gemini.requests
+    assert agent.get_response('good', " python  LISTS ")["content"] == "```markdown\n# Lesson\nBody\n```"
+    assert pool.size(key) == 2 and stub_gemini.requests == before
+
+    # Saved pools survive a restart unless the prompts changed
+    assert ResponsePool(path=pool_path, version="v1").size(key) >= 2
+    assert ResponsePool(path=pool_path, version="v2").size(key) == 0
+
+
+def test_failed_generation_leaves_pool_empty(tmp_path):
+    pool = ResponsePool(target_size=3)
+    assert pool.take(('good', 'x'), lambda: None) is None
+    wait_for(lambda: pool.metrics()["refilling"] == 0)
+    assert pool.size(('good', 'x')) == 0 and pool.metrics()["failed"] == 1
+
+
+def test_only_catalogued_topics_are_pooled(gemini_url, stub_gemini):
+    client = LLMClient("test-key", base_url=gemini_url)
+    pool = ResponsePool(target_size=3)
+    agent = EmotionalAgent("test-key", llm_client=client, pool=pool, pooled_topics={"python lists"})
+
+    before = stub_gemini.requests
+    response = agent.get_response('happy', "My cat's birthday")
+    assert response["content"] == "```markdown\n# Lesson\nBody\n```" # Generated on the request
+    assert stub_gemini.requests == before + 1 and pool.metrics()["keys"] == 0
+
+    agent.get_response('happy', "Python Lists")
+    wait_for(lambda: pool.size(('happy', "python lists")) == 3)
+
+
+def test_pooled_keys_are_capped():
+    pool = ResponsePool(target_size=1, max_keys=3)
+    for n in range(5):
+        pool.take(('good', str(n)), lambda: "response")
+        wait_for(lambda: pool.size(('good', str(n))) == 1)
+    assert pool.metrics()["keys"] == 3 and pool.metrics()["evicted"] == 2
+    assert pool.size(('good', '0')) == 0 and pool.size(('good', '4')) == 1
+
+
+def test_workers_merge_saved_pools(tmp_path):
+    path = str(tmp_path / "pools.json")
+    worker_a = ResponsePool(path=path, version="v1", target_size=2)
+    worker_b = ResponsePool(path=path, version="v1", target_size=2)
+    worker_a.take(('good', 'a'), lambda: "from a")
+    worker_b.take(('good', 'b'), lambda: "from b")
+    wait_for(lambda: worker_a.size(('good', 'a')) == 2 and worker_b.size(('good', 'b')) == 2)
+    worker_a.save()
+    worker_b.save()
+
+    restarted = ResponsePool(path=path, version="v1")
+    assert restarted.size(('good', 'a')) == 2 and restarted.size(('good', 'b')) == 2
+
+    # A worker's own view of its keys wins: emptied pools are dropped
+    worker_a.take(('good', 'a'), lambda: None)
+    worker_a.take(('good', 'a'), lambda: None)
+    wait_for(lambda: worker_a.metrics()["refilling"] == 0)
+    worker_a.save()
+    restarted = ResponsePool(path=path, version="v1")
+    assert restarted.size(('good', 'a')) == 0 and restarted.size(('good', 'b')) == 2
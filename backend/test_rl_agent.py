@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from modules.rl_agent import ACTIONS, RLAgent
+from modules.state_encoding import StateEncoder
+
+
+@pytest.fixture
+def agent(tmp_path):
+    agent = RLAgent(model_path=str(tmp_path / "rl_model.npy"), shared=False)
+    agent.q_table = np.array(agent.q_table) # Writable copy, like after the first update
+    return agent
+
+
+def q_update(agent, value, reward, next_max):
+    return value + agent.learning_rate * (reward + agent.discount_factor * next_max - value)
+
+
+def test_learn_is_the_q_learning_update(agent):
+    s, s2 = agent.get_state_key("confused"), agent.get_state_key("engaged")
+    agent.q_table[s2] = [0, 2, 1, 0, 0, 0]
+    agent.q_table[s, 3] = 0.5
+    agent.learn("confused", ACTIONS[3], 1.0, "engaged")
+    assert agent.q_table[s, 3] == pytest.approx(q_update(agent, 0.5, 1.0, 2))
+    assert np.count_nonzero(agent.q_table) == 3 # Nothing else moved
+
+
+def test_learn_batch_uses_pre_batch_values(agent):
+    # The second transition's next state is the cell the first one updates
+    agent.q_table[1] = [1, 0, 0, 0, 0, 0]
+    agent.q_table[2, 0] = 3
+    agent.learn_batch([1, 2], [0, 0], [0.0, 0.0], [2, 1])
+    assert agent.q_table[1, 0] == pytest.approx(q_update(agent, 1, 0, 3))
+    assert agent.q_table[2, 0] == pytest.approx(q_update(agent, 3, 0, 1))
+
+
+def test_learn_batch_averages_repeated_pairs(agent):
+    agent.learn_batch([7, 7, 7, 8], [2, 2, 2, 2], [1.0, 0.0, -0.4, 1.0], [9, 9, 9, 9])
+    assert agent.q_table[7, 2] == pytest.approx(agent.learning_rate * 0.2)
+    assert agent.q_table[8, 2] == pytest.approx(agent.learning_rate * 1.0)
+
+    # Equivalent to one update with the mean reward, not three updates
+    other = RLAgent(model_path=agent.model_path + ".other", shared=False)
+    other.q_table = np.array(other.q_table)
+    other.learn_batch([7], [2], [0.2], [9])
+    assert other.q_table[7, 2] == pytest.approx(agent.q_table[7, 2])
+
+
+def test_choose_action_is_greedy_without_exploration(agent):
+    agent.epsilon = 0
+    agent.q_table[agent.get_state_key("fatigued")] = [0, 0, 5, 0, 5, 0]
+    assert agent.choose_action("fatigued") == "break" # First action on ties
+    assert agent.choose_action({"affective_state": "fatigued"}) == "break"
+
+
+def test_checkpoint_round_trip(agent):
+    agent.learn("confused", "hint", 1.0, "engaged")
+    agent.checkpoint()
+    assert not agent._dirty
+    reloaded = RLAgent(model_path=agent.model_path, shared=False)
+    np.testing.assert_array_equal(reloaded.q_table, agent.q_table)
+
+
+def expanded_rows(agent, state):
+    return agent.q_table[agent.encoder.affective_rows(agent.encoder.digits(state)[0])]
+
+
+def test_context_free_model_is_expanded(tmp_path):
+    per_state = np.arange(30, dtype=float).reshape(5, 6)
+    np.save(tmp_path / "rl_model.npy", per_state)
+    agent = RLAgent(model_path=str(tmp_path / "rl_model.npy"), shared=False)
+    assert agent.q_table.shape == (agent.n_states, len(ACTIONS))
+    for i, state in enumerate(("neutral", "engaged", "confused", "struggling", "fatigued")):
+        rows = expanded_rows(agent, state)
+        assert len(rows) == agent.n_states // 5
+        np.testing.assert_array_equal(rows, np.broadcast_to(per_state[i], rows.shape))
+    # Saved in the new shape, so the next start loads it directly
+    np.testing.assert_array_equal(np.load(agent.model_path), agent.q_table)
+
+
+def test_legacy_json_model_is_imported(tmp_path):
+    (tmp_path / "rl_model.json").write_text(
+        '{"confused": {"hint": 0.5, "video": -1, "retired_action": 9}, "fatigued": {"break": 2}, "bored": {"hint": 1}}'
+    )
+    agent = RLAgent(model_path=str(tmp_path / "rl_model.npy"), shared=False)
+    assert (expanded_rows(agent, "confused") == [0.5, 0, 0, 0, -1, 0]).all()
+    assert (expanded_rows(agent, "fatigued") == [0, 0, 2, 0, 0, 0]).all()
+    assert np.count_nonzero(agent.q_table) == 3 * agent.n_states // 5
+    assert (tmp_path / "rl_model.npy").exists()
+
+
+def test_context_free_model_is_not_hashed(tmp_path):
+    np.save(tmp_path / "rl_model.npy", np.ones((5, 6)))
+    agent = RLAgent(model_path=str(tmp_path / "rl_model.npy"), shared=False,
+                    encoder=StateEncoder(hash_buckets=64))
+    assert agent.q_table.shape == (64, 6) and not agent.q_table.any()
+    assert np.load(agent.model_path).shape == (5, 6) # Left as it was
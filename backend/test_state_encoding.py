@@ -0,0 +1,56 @@
+import itertools
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from modules.state_encoding import StateEncoder, build_context
+
+CONTEXTS = [
+    {"affective_state": state, "concept_level": level, "errors": errors, "hour": hour, "skill_level": skill,
+     "concept_id": concept}
+    for state, level, errors, hour, skill, concept in itertools.product(
+        ("neutral", "confused", "fatigued", "unknown"), ("beginner", "advanced", None), (0, 1, 3, 7),
+        (0, 9, 23), ("intermediate", None), ("c1", "c2"))
+]
+
+
+@pytest.mark.parametrize("encoder", [
+    StateEncoder(),
+    StateEncoder(hash_buckets=1000),
+    StateEncoder(hash_buckets=1000, extra_features=("concept_id",))
+], ids=["mixed-radix", "hashed", "hashed-extra"])
+def test_encode_batch_agrees_with_encode(encoder):
+    contexts = CONTEXTS + ["struggling", "engaged"] # Bare affective states too
+    digits = np.array([encoder.digits(c) for c in contexts])
+    extra = np.array([encoder.extra_hash(c) for c in contexts], dtype=np.uint64)
+    batch = encoder.encode_batch(digits, extra if encoder.hash_buckets else None)
+    assert batch.tolist() == [encoder.encode(c) for c in contexts]
+    assert batch.min() >= 0 and batch.max() < encoder.n_states
+
+
+def test_mixed_radix_rows_are_distinct():
+    encoder = StateEncoder()
+    digits = list(itertools.product(*(range(r) for r in encoder.radices)))
+    rows = encoder.encode_batch(digits)
+    assert sorted(rows.tolist()) == list(range(encoder.n_states))
+    # The affective state is the most significant digit
+    for d, row in zip(digits, rows):
+        assert encoder.affective_rows(d[0]).start <= row < encoder.affective_rows(d[0]).stop
+
+
+def test_extra_features_spread_rows():
+    encoder = StateEncoder(hash_buckets=1 << 20, extra_features=("concept_id",))
+    rows = {encoder.encode({"affective_state": "confused", "concept_id": f"c{n}"}) for n in range(200)}
+    assert len(rows) == 200
+    assert encoder.extra_hash("confused") == 0 and StateEncoder().extra_hash({"concept_id": "c1"}) == 0
+
+
+def test_build_context_hour_is_utc_unless_offset():
+    when = datetime(2024, 1, 1, 22, 30)
+    log = [{"is_correct": False}, {"is_correct": True}, {}]
+    assert build_context("confused", log, when=when) == {
+        "affective_state": "confused", "concept_level": None, "errors": 1, "hour": 22, "skill_level": None
+    }
+    assert build_context("confused", when=when, utc_offset=timedelta(hours=5, minutes=30))["hour"] == 4
+    assert build_context("confused", when=when, utc_offset=timedelta(hours=-23))["hour"] == 23
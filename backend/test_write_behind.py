@@ -0,0 +1,73 @@
+import threading
+from collections import deque
+
+from flask import Flask
+
+from conftest import add_learner
+from models import Interaction
+from modules.interaction_logger import InteractionLogger
+from modules.write_behind import WriteBehindQueue
+
+
+def test_pending_until_written_then_forgotten():
+    written = []
+    release = threading.Event()
+
+    def write_group(by_learner):
+        release.wait(5)
+        written.extend(item["n"] for items in by_learner.values() for item in items)
+
+    writer = WriteBehindQueue(Flask(__name__), write_group, max_batch=3).start()
+    for n in range(10):
+        assert writer.enqueue(f"u{n % 2}", {"n": n})
+    assert [item["n"] for item in writer.pending_for("u0")] == [0, 2, 4, 6, 8]
+    release.set()
+    assert writer.flush(timeout=5)
+    writer.close()
+    assert sorted(written) == list(range(10))
+    assert writer.pending_for("u0") == [] and writer.pending_for("u1") == []
+    assert writer.stats["enqueued"] == writer.stats["flushed"] == 10
+
+
+def test_concurrent_enqueues_are_all_counted():
+    writer = WriteBehindQueue(Flask(__name__), lambda by_learner: None, max_batch=50).start()
+
+    def produce(t):
+        for n in range(500):
+            writer.enqueue(f"u{n % 7}", {"t": t, "n": n})
+
+    threads = [threading.Thread(target=produce, args=(t,)) for t in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert writer.flush(timeout=10)
+    writer.close()
+    assert writer.stats["enqueued"] == writer.stats["flushed"] == 4000
+    assert all(not writer.pending_for(f"u{n}") for n in range(7))
+
+
+def test_forget_out_of_order():
+    writer = WriteBehindQueue(Flask(__name__), lambda by_learner: None)
+    items = [{"n": n} for n in range(5)]
+    writer._pending["u"] = deque(items)
+    writer._forget("u", [items[1], items[0]]) # Prefix, in either order
+    writer._forget("u", [items[3]])
+    assert writer.pending_for("u") == [items[2], items[4]]
+    writer._forget("u", [{"n": 2}]) # Equal but not the same item: kept
+    assert writer.pending_for("u") == [items[2], items[4]]
+    writer._forget("u", [items[4], items[2]])
+    assert "u" not in writer._pending
+
+
+def test_logger_write_behind_reads_its_own_writes(app, lp_manager):
+    logger = InteractionLogger(lp_manager)
+    add_learner(lp_manager, "u1")
+    writer = logger.enable_write_behind(app)
+    for n in range(20):
+        logger.log_interaction("u1", {"concept_id": "c", "action": "submit_answer", "is_correct": n % 2 == 0})
+        assert len(lp_manager.get_learner("u1")["interaction_log"]) == n + 1
+    assert writer.flush(timeout=10)
+    writer.close()
+    assert Interaction.query.count() == 20
+    assert lp_manager.get_interaction_stats("u1")["incorrect_count"] == 10
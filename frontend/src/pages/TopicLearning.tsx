@@ -28,6 +28,8 @@ interface QuizEvaluation {
     summary: string;
     next_steps: string;
     results: QuizResultDetail[];
+    evaluation_id?: string;
+    explanations_pending?: boolean;
 }
 
 const TopicLearning: React.FC = () => {
@@ -38,6 +40,8 @@ const TopicLearning: React.FC = () => {
     const [loading, setLoading] = useState(false);
 
     const [content, setContent] = useState('');
+    // Server-side id of the lesson; quiz and evaluate send this instead of the text
+    const [contentId, setContentId] = useState<string | null>(null);
     const [quiz, setQuiz] = useState<QuizQuestion[]>([]);
     const [currentQuestionIndex, setCurrentQuestionIndex] = useState(0);
     const [answers, setAnswers] = useState<Record<number, string>>({});
@@ -64,16 +68,46 @@ const TopicLearning: React.FC = () => {
         if (!topic) return;
         setLoading(true);
         try {
-            const res = await fetch('http://localhost:5000/api/tutor/content', {
+            // Stream the lesson (server-sent events) and render it as it arrives
+            const res = await fetch('http://localhost:5000/api/tutor/content/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ topic })
             });
-            const data = await res.json();
-            if (!data.content) {
+            if (!res.ok || !res.body) {
+                throw new Error(`Stream request failed: ${res.status}`);
+            }
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let received = '';
+            setContent('');
+            setContentId(null);
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const events = buffer.split('\n\n');
+                buffer = events.pop() || '';
+                for (const raw of events) {
+                    const event = raw.match(/^event: (.*)$/m)?.[1];
+                    const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || '{}');
+                    if (event === 'error') {
+                        received += (received ? '\n\n' : '') + data.message;
+                    } else if (event === 'done') {
+                        setContentId(data.content_id || null);
+                    } else if (data.delta) {
+                        received += data.delta;
+                    }
+                    setContent(received);
+                    if (received) {
+                        setStage('reading');
+                        setLoading(false);
+                    }
+                }
+            }
+            if (!received) {
                 setContent("Error: No content received from server.");
-            } else {
-                setContent(data.content);
             }
             setStage('reading');
         } catch (err) {
@@ -90,7 +124,7 @@ const TopicLearning: React.FC = () => {
             const res = await fetch('http://localhost:5000/api/tutor/quiz', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ content })
+                body: JSON.stringify(contentId ? { content_id: contentId } : { content })
             });
             const data = await res.json();
             setQuiz(data.quiz);
@@ -116,16 +150,41 @@ const TopicLearning: React.FC = () => {
         }
     };
 
+    // Scores are graded instantly; explanations are filled in once generated
+    const pollExplanations = async (evaluationId: string, attempts = 10) => {
+        for (let i = 0; i < attempts; i++) {
+            await new Promise(resolve => setTimeout(resolve, 1500));
+            try {
+                const res = await fetch(`http://localhost:5000/api/tutor/evaluations/${evaluationId}`);
+                if (!res.ok) return;
+                const data = await res.json();
+                if (!data.feedback.explanations_pending) {
+                    setEvaluation(data.feedback);
+                    return;
+                }
+            } catch (err) {
+                console.error(err);
+                return;
+            }
+        }
+    };
+
     const handleSubmitQuiz = async () => {
         setLoading(true);
         try {
             const res = await fetch('http://localhost:5000/api/tutor/evaluate', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ content, user_answers: answers, quiz_questions: quiz })
+                // The server knows the lesson's quiz, so only the answers go along with its id
+                body: JSON.stringify(contentId
+                    ? { content_id: contentId, user_answers: answers }
+                    : { content, user_answers: answers, quiz_questions: quiz })
             });
             const data = await res.json();
             setEvaluation(data.feedback);
+            if (data.feedback.explanations_pending) {
+                pollExplanations(data.feedback.evaluation_id);
+            }
 
             // Log progress if passed (70%)
             if (data.feedback.score / data.feedback.total >= 0.7) {
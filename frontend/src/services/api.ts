@@ -27,6 +27,7 @@ export const studyPlanService = {
 
 export const interactionService = {
     log: (data: any) => api.post('/interactions', data),
+    logBatch: (interactions: any[]) => api.post('/interactions/batch', { interactions }),
 };
 
 export default api;